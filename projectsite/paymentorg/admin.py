@@ -1,4 +1,7 @@
+from decimal import Decimal
+
 from django.contrib import admin
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
 from django.utils.html import format_html
 from django.utils import timezone
 from django.contrib import messages
@@ -7,7 +10,8 @@ from django.contrib.auth.models import User
 from .models import (
     Student, Officer, Organization, FeeType,
     PaymentRequest, Payment, Receipt,
-    ActivityLog, AcademicYearConfig, Course, College, UserProfile
+    ActivityLog, AcademicYearConfig, Course, College, UserProfile,
+    StudentFeeLedger, Job, EmailOutbox, ORSequence, OrgDailyCollection
 )
 
 # custom user admin to show profiles
@@ -161,25 +165,42 @@ class OrganizationAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # one subquery per column instead of an aggregate per row; totals come from the daily rollup
+        collections = OrgDailyCollection.objects.filter(organization=OuterRef('pk')).order_by().values('organization')
+        net = Sum(OrgDailyCollection.net_expression())
+        fees = FeeType.objects.filter(organization=OuterRef('pk'), is_active=True).order_by().values('organization')
+        pending = PaymentRequest.objects.filter(organization=OuterRef('pk'), status='PENDING').order_by().values('organization')
+        return super().get_queryset(request).annotate(
+            total_collected=Subquery(collections.annotate(total=net).values('total')),
+            today_collected=Subquery(collections.filter(date=timezone.localdate()).annotate(total=net).values('total')),
+            active_fees_count=Subquery(fees.annotate(count=Count('id')).values('count')),
+            pending_requests_count=Subquery(pending.annotate(count=Count('id')).values('count')),
+        )
+
     def active_fees_count_display(self, obj):
-        return obj.get_active_fees_count()
+        return obj.active_fees_count or 0
     active_fees_count_display.short_description = 'Active Fees'
+    active_fees_count_display.admin_order_field = 'active_fees_count'
     
     def total_collected_display(self, obj):
-        total = obj.get_total_collected()
+        total = obj.total_collected or Decimal('0.00')
         return format_html('<b>₱{}</b>', f'{total:.2f}')
     total_collected_display.short_description = 'Total Collected (Net)'
+    total_collected_display.admin_order_field = 'total_collected'
     
     def today_collection_display(self, obj):
-        total = obj.get_today_collection()
+        total = obj.today_collected or Decimal('0.00')
         return format_html('₱{}', f'{total:.2f}')
     today_collection_display.short_description = 'Today Collected (Net)'
+    today_collection_display.admin_order_field = 'today_collected'
     
     def pending_requests_display(self, obj):
-        count = obj.get_pending_requests_count()
+        count = obj.pending_requests_count or 0
         color = 'orange' if count > 0 else 'green'
         return format_html('<span style="color: {};">{}</span>', color, count)
     pending_requests_display.short_description = 'Pending Requests'
+    pending_requests_display.admin_order_field = 'pending_requests_count'
 
 @admin.register(FeeType)
 class FeeTypeAdmin(admin.ModelAdmin):
@@ -260,7 +281,10 @@ class PaymentRequestAdmin(admin.ModelAdmin):
     status_display.short_description = 'Status'
     
     def mark_as_cancelled_action(self, request, queryset):
-        updated = queryset.filter(status='PENDING').update(status='CANCELLED')
+        pending = queryset.filter(status='PENDING')
+        request_ids = list(pending.values_list('request_id', flat=True))
+        updated = pending.update(status='CANCELLED')
+        PaymentRequest.forget_cached_statuses(request_ids)
         self.message_user(request, f"{updated} payment requests marked as CANCELLED.", messages.SUCCESS)
     mark_as_cancelled_action.short_description = "Mark selected as CANCELLED"
     
@@ -302,6 +326,7 @@ class ReceiptAdmin(admin.ModelAdmin):
     search_fields = ('or_number', 'payment__student__student_id_number')
     readonly_fields = [f.name for f in Receipt._meta.fields] 
     list_per_page = 50
+    actions = ['queue_receipt_emails_action']
     
     def payment_info(self, obj):
         if obj.payment and obj.payment.student:
@@ -309,6 +334,13 @@ class ReceiptAdmin(admin.ModelAdmin):
         return "N/A"
     payment_info.short_description = 'Payment'
 
+    def queue_receipt_emails_action(self, request, queryset):
+        receipt_ids = list(queryset.values_list('id', flat=True))
+        # Single attempt: a retry would queue duplicate emails for receipts already queued
+        job = Job.enqueue('RECEIPT_EMAILS', payload={'receipt_ids': receipt_ids}, created_by=request.user, max_attempts=1)
+        self.message_user(request, f"Queued {len(receipt_ids)} receipt email(s) as job {job.job_id}.", messages.SUCCESS)
+    queue_receipt_emails_action.short_description = "Send receipt emails in the background"
+
     def has_add_permission(self, request):
         return False
 
@@ -353,4 +385,175 @@ class AcademicYearConfigAdmin(admin.ModelAdmin):
             config.save() 
             self.message_user(request, f"{config} has been set as the current period.", messages.SUCCESS)
     
-    set_as_current.short_description = "Set selected period as current"
\ No newline at end of file
+    set_as_current.short_description = "Set selected period as current"
+
+
+@admin.register(StudentFeeLedger)
+class StudentFeeLedgerAdmin(admin.ModelAdmin):
+    list_display = ('student', 'fee_type', 'amount', 'status_display', 'payment', 'pending_request', 'updated_at')
+    list_display_links = ('student',)
+    list_filter = ('status', 'fee_type__organization', 'fee_type__academic_year', 'fee_type__semester')
+    search_fields = ('student__student_id_number', 'student__last_name', 'fee_type__name')
+    list_select_related = ('student', 'fee_type', 'fee_type__organization', 'payment', 'pending_request', 'pending_request__student', 'pending_request__fee_type')
+    readonly_fields = [f.name for f in StudentFeeLedger._meta.fields]
+    list_per_page = 100
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def status_display(self, obj):
+        color_map = {
+            'UNPAID': 'red',
+            'PENDING': 'orange',
+            'PAID': 'green',
+        }
+        return format_html(
+            '<span style="color: {};"><b>{}</b></span>',
+            color_map.get(obj.status, 'black'),
+            obj.get_status_display()
+        )
+    status_display.short_description = 'Status'
+
+
+@admin.register(ORSequence)
+class ORSequenceAdmin(admin.ModelAdmin):
+    list_display = ('organization', 'academic_year', 'next_number', 'gap_summary', 'updated_at')
+    list_filter = ('academic_year',)
+    search_fields = ('organization__code', 'organization__name')
+    list_select_related = ('organization',)
+    readonly_fields = [f.name for f in ORSequence._meta.fields] + ['gap_ranges']
+
+    def get_queryset(self, request):
+        # serials are unique and start at 1, so count/max give the missing total per row
+        return super().get_queryset(request).annotate(
+            issued_count=Count('payments', filter=Q(payments__or_serial__isnull=False)),
+            highest_serial=Max('payments__or_serial'),
+        )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def gap_summary(self, obj):
+        missing = (obj.highest_serial or 0) - obj.issued_count
+        if not missing:
+            return format_html('<span style="color: green;">{} issued, no gaps</span>', obj.issued_count)
+        return format_html(
+            '<span style="color: red;"><b>{} missing</b></span>; {} issued',
+            missing, obj.issued_count
+        )
+    gap_summary.short_description = 'Gaps'
+
+    # detail page only: find_gaps() loads every issued serial of the series
+    def gap_ranges(self, obj):
+        report = obj.find_gaps()
+        ranges = [f"{first}-{last}" if first != last else str(first) for first, last in report['gaps']]
+        tail = report['unissued_tail']
+        return format_html(
+            '{}<br>Reserved, not issued yet: {}',
+            ', '.join(ranges) or 'None',
+            f"{tail[0]}-{tail[1]}" if tail else 'None'
+        )
+    gap_ranges.short_description = 'Missing serials'
+
+
+@admin.register(OrgDailyCollection)
+class OrgDailyCollectionAdmin(admin.ModelAdmin):
+    list_display = ('date', 'organization', 'payment_method', 'payment_count', 'amount_total', 'void_count', 'void_total', 'net_total')
+    list_filter = ('payment_method', 'date')
+    search_fields = ('organization__code', 'organization__name')
+    date_hierarchy = 'date'
+    list_select_related = ('organization',)
+    readonly_fields = [f.name for f in OrgDailyCollection._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def net_total(self, obj):
+        return format_html('<b>₱{}</b>', f'{obj.net_total:.2f}')
+    net_total.short_description = 'Net (₱)'
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'kind', 'status_display', 'progress_display', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_display_links = ('job_id',)
+    list_filter = ('kind', 'status', 'created_at')
+    search_fields = ('job_id', 'created_by__username', 'error')
+    list_select_related = ('created_by',)
+    readonly_fields = [f.name for f in Job._meta.fields]
+    list_per_page = 50
+    actions = ['requeue_action']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def status_display(self, obj):
+        color_map = {
+            'QUEUED': 'gray',
+            'RUNNING': 'orange',
+            'SUCCEEDED': 'green',
+            'FAILED': 'red',
+        }
+        return format_html(
+            '<span style="color: {};"><b>{}</b></span>',
+            color_map.get(obj.status, 'black'),
+            obj.get_status_display()
+        )
+    status_display.short_description = 'Status'
+    
+    def progress_display(self, obj):
+        if not obj.progress_total:
+            return '-'
+        return f"{obj.progress_current}/{obj.progress_total} ({obj.get_progress_percent()}%)"
+    progress_display.short_description = 'Progress'
+    
+    def requeue_action(self, request, queryset):
+        updated = queryset.filter(status='FAILED').update(
+            status='QUEUED', attempts=0, claimed_by='', error='', finished_at=None
+        )
+        self.message_user(request, f"{updated} failed job(s) requeued.", messages.SUCCESS)
+    requeue_action.short_description = "Requeue selected failed jobs"
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status_display', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_display_links = ('to_email', 'subject')
+    list_filter = ('status', 'created_at')
+    search_fields = ('to_email', 'subject', 'receipt__or_number')
+    readonly_fields = [f.name for f in EmailOutbox._meta.fields]
+    list_per_page = 50
+    actions = ['retry_now_action']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def status_display(self, obj):
+        color_map = {
+            'PENDING': 'orange',
+            'SENDING': 'blue',
+            'SENT': 'green',
+            'FAILED': 'red',
+        }
+        return format_html(
+            '<span style="color: {};"><b>{}</b></span>',
+            color_map.get(obj.status, 'black'),
+            obj.get_status_display()
+        )
+    status_display.short_description = 'Status'
+    
+    def retry_now_action(self, request, queryset):
+        updated = queryset.filter(status__in=['PENDING', 'FAILED']).update(
+            status='PENDING', attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} email(s) scheduled for immediate delivery.", messages.SUCCESS)
+    retry_now_action.short_description = "Retry selected emails now"
@@ -0,0 +1,101 @@
+"""
+Officer dashboard snapshot.
+
+Everything the officer dashboard shows for one organization (collection
+totals from the OrgDailyCollection rollup, pending count, recent payments,
+bulk postings and activity) is computed together with related rows joined
+in, and cached for DASHBOARD_SNAPSHOT_CACHE_TIMEOUT seconds. A booth refreshing the dashboard
+after every payment then costs one cache read; saving a payment, request or
+posting drops the organization's snapshot (see the receivers in models.py),
+so the next load recomputes it.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import ActivityLog, BulkPaymentPosting, Officer, OrgDailyCollection, Payment, PaymentRequest
+
+# snapshot of all organizations, shown to superusers without an officer profile
+SYSTEM_WIDE = 'all'
+
+RECENT_PAYMENTS = 20
+RECENT_POSTINGS = 20
+RECENT_ACTIVITY = 15
+
+
+def snapshot_cache_key(organization_id):
+    # the date keeps "today's collection" from carrying over midnight
+    return f'paymentorg:dashboard:{organization_id or SYSTEM_WIDE}:{timezone.localdate().isoformat()}'
+
+
+def invalidate_dashboard_snapshots(organization_ids):
+    """Drop the snapshots of these organizations (and the system-wide one) once the transaction commits"""
+    keys = [snapshot_cache_key(organization_id) for organization_id in set(organization_ids)]
+    keys.append(snapshot_cache_key(None))
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class DashboardSnapshot:
+    """Officer KPIs for one organization, or for all of them when `organization` is None"""
+
+    def __init__(self, organization=None):
+        self.organization_id = organization.pk if organization else None
+        scope = {'organization_id': self.organization_id} if organization else {}
+        today = timezone.localdate()
+
+        net = OrgDailyCollection.net_expression()
+        totals = OrgDailyCollection.objects.filter(**scope).aggregate(
+            total=Sum(net),
+            today=Sum(net, filter=Q(date=today)),
+        )
+        self.total_collected = totals['total'] or Decimal('0.00')
+        self.today_collections = totals['today'] or Decimal('0.00')
+        self.pending_requests_count = PaymentRequest.objects.filter(status='PENDING', **scope).count()
+
+        self.posted_requests = list(
+            BulkPaymentPosting.objects.filter(**scope)
+            .select_related('fee_type', 'posted_by')
+            .order_by('-created_at')[:RECENT_POSTINGS]
+        )
+        self.recent_payments = list(
+            Payment.objects.filter(status='COMPLETED', **scope)
+            .select_related('student', 'processed_by__user')
+            .order_by('-created_at')[:RECENT_PAYMENTS]
+        )
+
+        activity = ActivityLog.objects.all()
+        if organization:
+            # officers of this organization, or payments/requests belonging to it
+            activity = activity.filter(
+                Q(user_id__in=Officer.objects.filter(organization=organization).values('user_id')) |
+                Q(payment__organization=organization) |
+                Q(payment_request__organization=organization)
+            )
+        self.recent_activity_logs = list(
+            activity.select_related('user', 'payment').order_by('-created_at')[:RECENT_ACTIVITY]
+        )
+        self.computed_at = timezone.now()
+
+    @classmethod
+    def get(cls, organization=None):
+        """The cached snapshot, computed if missing or expired"""
+        key = snapshot_cache_key(organization.pk if organization else None)
+        snapshot = cache.get(key)
+        if snapshot is None:
+            snapshot = cls(organization)
+            cache.set(key, snapshot, getattr(settings, 'DASHBOARD_SNAPSHOT_CACHE_TIMEOUT', 10))
+        return snapshot
+
+    def as_context(self):
+        return {
+            'total_collected_system': self.total_collected,
+            'today_collections': self.today_collections,
+            'pending_requests_count': self.pending_requests_count,
+            'posted_requests': self.posted_requests,
+            'recent_payments': self.recent_payments,
+            'recent_activity_logs': self.recent_activity_logs,
+        }
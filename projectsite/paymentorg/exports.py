@@ -0,0 +1,296 @@
+"""
+Constant-memory export writers. Each takes a header and an iterable of rows
+(lists of plain values) and yields bytes chunks suitable for a
+StreamingHttpResponse or for writing to a file. The payment export's
+queryset and row builder, shared by ExportPaymentsView and the
+PAYMENT_EXPORT job, are at the bottom.
+"""
+import csv
+import zipfile
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from .models import Payment
+
+# Rows are buffered into chunks of roughly this many bytes before being yielded
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class DrainableBuffer:
+    """Write-only file object whose contents are taken out with drain()"""
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+class _TextBuffer:
+    """csv.writer target collecting text lines"""
+    def __init__(self):
+        self.lines = []
+        self.size = 0
+
+    def write(self, line):
+        self.lines.append(line)
+        self.size += len(line)
+
+    def drain(self):
+        data = ''.join(self.lines).encode('utf-8')
+        self.lines = []
+        self.size = 0
+        return data
+
+
+def stream_csv(header, rows):
+    buffer = _TextBuffer()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.size >= STREAM_CHUNK_BYTES:
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip-compress a stream of bytes chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(ref, value):
+    if value is None or value == '':
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    if isinstance(value, datetime):
+        value = value.strftime('%Y-%m-%d %H:%M:%S')
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def _xlsx_row(number, values, columns):
+    cells = ''.join(_xlsx_cell(f'{column}{number}', value) for column, value in zip(columns, values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def stream_xlsx(header, rows, sheet_name='Sheet1'):
+    """
+    Minimal single-sheet XLSX (inline strings, no styles) written with zipfile
+    onto a drainable buffer, so the worksheet is never held in memory.
+    """
+    columns = [_column_letter(index) for index in range(len(header))]
+    output = DrainableBuffer()
+    with zipfile.ZipFile(output, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(sheet_name=escape(sheet_name)))
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        yield output.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(1, header, columns).encode('utf-8'))
+            for number, row in enumerate(rows, start=2):
+                sheet.write(_xlsx_row(number, row, columns).encode('utf-8'))
+                if output.size >= STREAM_CHUNK_BYTES:
+                    yield output.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield output.drain()
+
+
+# format -> (writer, content type, file extension)
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv', 'csv'),
+    'xlsx': (
+        stream_xlsx,
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'xlsx',
+    ),
+}
+
+
+# Query-string filters accepted by the payment export
+PAYMENT_EXPORT_FILTERS = ['status', 'is_void', 'date_from', 'date_to', 'semester']
+
+PAYMENT_EXPORT_HEADER = [
+    'OR Number',
+    'Date',
+    'Student ID',
+    'Student Name',
+    'Organization',
+    'Fee Type',
+    'Semester',
+    'Academic Year',
+    'Amount',
+    'Amount Received',
+    'Change Given',
+    'Status',
+    'Is Void',
+    'Payment Method',
+    'Processed By',
+]
+
+# Columns fetched with values_list() so exports never build model instances
+PAYMENT_EXPORT_FIELDS = [
+    'or_number',
+    'created_at',
+    'student__student_id_number',
+    'student__first_name',
+    'student__middle_name',
+    'student__last_name',
+    'organization__name',
+    'fee_type__name',
+    'fee_type__semester',
+    'fee_type__academic_year',
+    'amount',
+    'amount_received',
+    'change_given',
+    'status',
+    'is_void',
+    'payment_method',
+    'processed_by_id',
+    'processed_by__user__first_name',
+    'processed_by__user__last_name',
+]
+
+
+def get_export_payments_queryset(user, filters):
+    """Payments visible to `user` filtered like PaymentListView (filters: dict or QueryDict)"""
+    # Build queryset with same filters as PaymentListView
+    queryset = Payment.objects.all()
+    
+    # Filter by organization if officer
+    if hasattr(user, 'officer_profile'):
+        accessible_org_ids = user.officer_profile.organization.get_accessible_organization_ids()
+        queryset = queryset.filter(organization_id__in=accessible_org_ids)
+    
+    # Apply filters
+    status_filter = filters.get('status')
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    
+    void_filter = filters.get('is_void')
+    if void_filter == 'true':
+        queryset = queryset.filter(is_void=True)
+    elif void_filter == 'false':
+        queryset = queryset.filter(is_void=False)
+    
+    date_from = filters.get('date_from')
+    date_to = filters.get('date_to')
+    if date_from:
+        queryset = queryset.filter(created_at__date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(created_at__date__lte=date_to)
+    
+    semester_filter = filters.get('semester')
+    if semester_filter:
+        queryset = queryset.filter(fee_type__semester=semester_filter)
+    
+    return queryset.order_by('-created_at')
+
+
+def iter_payment_export_rows(queryset, chunk_size=2000):
+    """Yield PAYMENT_EXPORT_HEADER rows from a server-side cursor over projected columns"""
+    method_labels = dict(Payment._meta.get_field('payment_method').choices)
+    rows = queryset.values_list(*PAYMENT_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for (or_number, created_at, student_id_number, first_name, middle_name, last_name,
+         organization_name, fee_name, semester, academic_year, amount, amount_received,
+         change_given, status, is_void, payment_method, processed_by_id,
+         processed_by_first_name, processed_by_last_name) in rows:
+        # Same formats as Student.get_full_name() / Officer.get_full_name()
+        if middle_name:
+            student_name = f"{first_name} {middle_name[0]}. {last_name}"
+        else:
+            student_name = f"{first_name} {last_name}"
+        if processed_by_id:
+            processed_by = f"{processed_by_first_name} {processed_by_last_name}"
+        else:
+            processed_by = 'N/A'
+        yield [
+            or_number,
+            created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            student_id_number,
+            student_name,
+            organization_name,
+            fee_name,
+            semester,
+            academic_year,
+            amount,
+            amount_received,
+            change_given,
+            status,
+            'Yes' if is_void else 'No',
+            method_labels.get(payment_method, payment_method),
+            processed_by,
+        ]
@@ -0,0 +1,121 @@
+import logging
+import os
+import traceback
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .exports import EXPORT_FORMATS, PAYMENT_EXPORT_HEADER, get_export_payments_queryset, gzip_stream, iter_payment_export_rows
+from .models import (
+    BulkPaymentPosting, EmailOutbox, FeeType, Job, Organization, Receipt, get_bulk_posting_students,
+)
+
+logger = logging.getLogger(__name__)
+
+# kind -> handler(job) returning the JSON-serializable result
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def get_job_results_storage():
+    """Where job output files (e.g. CSV exports) are written"""
+    return FileSystemStorage(location=settings.JOB_RESULTS_DIR)
+
+
+def run_job(job):
+    """Execute a claimed job and record its outcome; never raises"""
+    handler = JOB_HANDLERS.get(job.kind)
+    if handler is None:
+        job.attempts = job.max_attempts
+        job.mark_failed(f'No handler registered for job type {job.kind}')
+        return job
+    try:
+        result = handler(job)
+    except Exception:
+        logger.error(f'Job {job.job_id} ({job.kind}) failed', exc_info=True)
+        job.mark_failed(traceback.format_exc(limit=5))
+    else:
+        job.mark_succeeded(result)
+    return job
+
+
+@job_handler('BULK_POSTING')
+def run_bulk_posting(job):
+    payload = job.payload
+    organization = Organization.objects.get(pk=payload['organization_id'])
+    fee_type = FeeType.objects.get(pk=payload['fee_type_id'])
+    students = get_bulk_posting_students(organization, payload['applicable_year_level'])
+
+    result = BulkPaymentPosting.post_to_students(
+        students,
+        organization=organization,
+        fee_type=fee_type,
+        amount=fee_type.amount,
+        expires_at=parse_datetime(payload['expires_at']),
+        posted_by=job.created_by,
+        notes=payload.get('notes', ''),
+        ip_address=payload.get('ip_address'),
+        progress=job.set_progress,
+    )
+    return {
+        'posting_id': result['posting'].id if result['posting'] else None,
+        'created': result['created'],
+        'skipped': result['skipped'],
+        'failed': result['failed'],
+    }
+
+
+@job_handler('PAYMENT_EXPORT')
+def run_payment_export(job):
+    if job.created_by is None:
+        raise ValueError('Export job has no owner to scope payments to')
+    queryset = get_export_payments_queryset(job.created_by, job.payload.get('filters', {}))
+    job.set_progress(0, queryset.count())
+
+    rows = [0]
+
+    def counted(iterable):
+        for row in iterable:
+            yield row
+            rows[0] += 1
+            if rows[0] % 1000 == 0:
+                job.set_progress(rows[0])
+
+    writer, _, extension = EXPORT_FORMATS[job.payload.get('format', 'csv')]
+    stream = writer(PAYMENT_EXPORT_HEADER, counted(iter_payment_export_rows(queryset)))
+    if job.payload.get('compress'):
+        stream = gzip_stream(stream)
+        extension = f'{extension}.gz'
+
+    storage = get_job_results_storage()
+    os.makedirs(storage.location, exist_ok=True)
+    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+    filename = storage.get_available_name(f'payments_export_{timestamp}_{job.job_id}.{extension}')
+    with storage.open(filename, 'wb') as output:
+        for chunk in stream:
+            output.write(chunk)
+    return {'file': filename, 'rows': rows[0]}
+
+
+@job_handler('RECEIPT_EMAILS')
+def run_receipt_emails(job):
+    """Fan receipts out into EmailOutbox; dispatch_emails does the sending"""
+    receipt_ids = job.payload.get('receipt_ids', [])
+    job.set_progress(0, len(receipt_ids))
+
+    queued = 0
+    receipts = Receipt.objects.filter(id__in=receipt_ids).select_related('payment__student').order_by('id')
+    for start in range(0, len(receipt_ids), 500):
+        batch = list(receipts.filter(id__in=receipt_ids[start:start + 500]))
+        EmailOutbox.queue_receipts(batch)
+        queued += len(batch)
+        job.set_progress(queued)
+    return {'queued': queued}
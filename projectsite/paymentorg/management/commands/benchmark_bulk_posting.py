@@ -0,0 +1,153 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from paymentorg.models import (
+    BulkPaymentPosting,
+    College,
+    Course,
+    FeeType,
+    Organization,
+    PaymentRequest,
+    Student,
+)
+
+
+class RollbackBenchmark(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time BulkPaymentPosting.post_to_students against synthetic student populations "
+        "(created and rolled back inside a transaction)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--students",
+            type=int,
+            nargs="+",
+            default=[1000, 10000, 50000],
+            help="Population sizes to benchmark (default: 1000 10000 50000)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=None, help="Override BULK_POSTING_CHUNK_SIZE")
+        parser.add_argument(
+            "--legacy-limit",
+            type=int,
+            default=1000,
+            help="Also time the old one-create-per-student loop for populations up to this size (default: 1000)",
+        )
+
+    def build_population(self, size):
+        college = College.objects.create(name="Benchmark College", code="BENCHCOL")
+        course = Course.objects.create(
+            name="Benchmark Program", code="BENCHPRG", college=college, program_type="COMPUTER_SCIENCE"
+        )
+        organization = Organization.objects.create(
+            name="Benchmark Organization",
+            code="BENCHORG",
+            department=college.name,
+            hierarchy_level="COLLEGE",
+            fee_tier="TIER_2",
+            contact_email="bench@example.com",
+            booth_location="N/A",
+        )
+        fee_type = FeeType.objects.create(
+            organization=organization,
+            name="Benchmark Fee",
+            amount=Decimal("100.00"),
+            semester="1st Semester",
+            academic_year="2099-2100",
+            applicable_year_levels="All",
+        )
+
+        password = make_password(None)
+        users = User.objects.bulk_create(
+            [User(username=f"bench{i:06d}", password=password) for i in range(size)],
+            batch_size=1000,
+        )
+        Student.objects.bulk_create(
+            [
+                Student(
+                    user=user,
+                    student_id_number=f"B{i:07d}",
+                    first_name="Bench",
+                    last_name=f"Student {i}",
+                    course=course,
+                    year_level=(i % 4) + 1,
+                    college=college,
+                    email=f"bench{i:06d}@example.com",
+                )
+                for i, user in enumerate(users)
+            ],
+            batch_size=1000,
+        )
+        students = Student.objects.filter(is_active=True, college=college)
+        return students, organization, fee_type
+
+    def legacy_post(self, students, organization, fee_type, expires_at):
+        """The previous per-student PaymentRequest.objects.create loop"""
+        for student in students:
+            PaymentRequest.objects.create(
+                student=student,
+                organization=organization,
+                fee_type=fee_type,
+                amount=fee_type.amount,
+                payment_method="CASH",
+                status="PENDING",
+                expires_at=expires_at,
+                qr_signature="",
+            )
+
+    def run(self, label, func):
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f"  {label:<26} {elapsed:>8.2f} s  {queries[0]:>7} queries")
+        return result
+
+    def benchmark(self, size, chunk_size, legacy_limit):
+        expires_at = timezone.now() + timedelta(days=30)
+        try:
+            with transaction.atomic():
+                students, organization, fee_type = self.build_population(size)
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{size} students"))
+
+                if size <= legacy_limit:
+                    sid = transaction.savepoint()
+                    self.run("legacy per-row create", lambda: self.legacy_post(
+                        students, organization, fee_type, expires_at
+                    ))
+                    transaction.savepoint_rollback(sid)
+
+                post = lambda: BulkPaymentPosting.post_to_students(  # noqa: E731
+                    students, organization, fee_type, fee_type.amount, expires_at, chunk_size=chunk_size
+                )
+                first = self.run("bulk post", post)
+                again = self.run("bulk post (re-run)", post)
+                self.stdout.write(
+                    f"  created={first['created']} skipped={first['skipped']} failed={first['failed']}; "
+                    f"re-run created={again['created']} skipped={again['skipped']}"
+                )
+                raise RollbackBenchmark
+        except RollbackBenchmark:
+            pass
+
+    def handle(self, *args, **options):
+        for size in options["students"]:
+            self.benchmark(max(1, size), options["chunk_size"], options["legacy_limit"])
+        self.stdout.write(self.style.SUCCESS("Benchmark finished; all generated data was rolled back"))
@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from paymentorg.models import Organization, OrganizationClosure
+
+
+class RollbackBenchmark(Exception):
+    pass
+
+
+def legacy_accessible_ids(organization):
+    """The previous recursive child_organizations walk (one query per node)"""
+    ids = [organization.id]
+    for child in organization.child_organizations.all():
+        ids.extend(legacy_accessible_ids(child))
+    return ids
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the recursive organization walk against the closure-table lookup "
+        "on a temporary hierarchy (rolled back afterwards)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--depth", type=int, default=4, help="Levels below the root (default: 4)")
+        parser.add_argument("--fanout", type=int, default=3, help="Children per organization (default: 3)")
+        parser.add_argument("--repeat", type=int, default=20, help="Lookups per strategy (default: 20)")
+
+    def measure(self, label, func, repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                result = func()
+            elapsed = (time.perf_counter() - started) * 1000 / repeat
+        queries = len(ctx.captured_queries) / repeat
+        self.stdout.write(f"  {label:<22} {queries:>8.1f} queries  {elapsed:>8.2f} ms/lookup  ({len(result)} orgs)")
+        return result
+
+    def build_tree(self, depth, fanout):
+        counter = [0]
+
+        def make(parent, level):
+            counter[0] += 1
+            org = Organization.objects.create(
+                name=f"Benchmark Org {counter[0]}",
+                code=f"BENCH{counter[0]}",
+                department="Benchmark",
+                hierarchy_level="COLLEGE" if parent is None else "PROGRAM",
+                parent_organization=parent,
+                contact_email="bench@example.com",
+                booth_location="N/A",
+            )
+            if level < depth:
+                for _ in range(fanout):
+                    make(org, level + 1)
+            return org
+
+        return make(None, 0), counter[0]
+
+    def handle(self, *args, **options):
+        depth = max(1, options["depth"])
+        fanout = max(1, options["fanout"])
+        repeat = max(1, options["repeat"])
+
+        try:
+            with transaction.atomic():
+                root, total = self.build_tree(depth, fanout)
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"Organization hierarchy: depth={depth} fanout={fanout} ({total} orgs)"
+                ))
+
+                legacy = self.measure("recursive walk", lambda: legacy_accessible_ids(root), repeat)
+                OrganizationClosure.invalidate_cache()
+                closure = self.measure("closure (cold cache)", lambda: (
+                    OrganizationClosure.invalidate_cache(), root.get_accessible_organization_ids()
+                )[1], repeat)
+                self.measure("closure (warm cache)", root.get_accessible_organization_ids, repeat)
+
+                if sorted(legacy) == sorted(closure):
+                    self.stdout.write(self.style.SUCCESS("Results match"))
+                else:
+                    self.stdout.write(self.style.ERROR("Results differ between strategies"))
+                raise RollbackBenchmark
+        except RollbackBenchmark:
+            pass
+        OrganizationClosure.invalidate_cache()
@@ -0,0 +1,230 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from paymentorg.models import PaymentRequest
+from paymentorg.status_events import broker, make_event
+
+
+class QueryCounter:
+    """execute_wrapper counting queries on every connection, including other threads'"""
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def attach(self, sender, connection, **kwargs):
+        # Fires again whenever a thread's connection reconnects
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        connection_created.connect(self.attach)
+        self.attach(None, connection)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.attach)
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+
+def close_connection():
+    connection.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test payment status delivery for N students waiting at the booth: "
+        "2-second polling vs ETag polling vs long-poll vs SSE (ASGI)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--waiters", type=int, default=500, help="Concurrent waiting students (default: 500)")
+        parser.add_argument("--window", type=int, default=10, help="Seconds of waiting to simulate (default: 10)")
+        parser.add_argument("--interval", type=float, default=2.0, help="Legacy poll interval in seconds (default: 2)")
+        parser.add_argument("--threads", type=int, default=16, help="Server threads for the polling runs (default: 16)")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        waiters = max(1, options["waiters"])
+        window = max(1, options["window"])
+        self.interval = max(0.1, options["interval"])
+        self.threads = max(1, options["threads"])
+
+        requests = list(
+            PaymentRequest.objects.filter(status="PENDING").select_related("student__user")[:waiters]
+        )
+        if not requests:
+            raise CommandError("No pending payment requests; run generate_load_dataset or create some first.")
+        self.targets = [requests[i % len(requests)] for i in range(waiters)]
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{waiters} waiters on {len(requests)} pending request(s), {window}s of waiting"
+        ))
+        self.stdout.write(
+            f"  {'mode':<16}{'HTTP reqs':>10}{'req/s':>9}{'DB queries':>12}{'queries/s':>11}"
+            f"{'notify p50':>12}{'notify p99':>12}"
+        )
+
+        clients = self.login_clients(Client)
+        try:
+            self.report("poll (2s)", window, *self.run_polling(clients, window, conditional=False))
+            self.report("poll + ETag", window, *self.run_polling(clients, window, conditional=True))
+            self.report("long-poll", window, *self.run_long_poll(clients, window))
+        finally:
+            self.logout_clients(clients)
+
+        self.report("SSE (ASGI)", window, *asyncio.run(self.run_sse(window)))
+        self.stdout.write(f"  * polling delivers on the next poll: {self.interval / 2:.1f}s on average")
+
+    def report(self, label, window, requests, queries, latencies, capacity=None):
+        if latencies:
+            p50, p99 = f"{percentile(latencies, 50) * 1000:.0f} ms", f"{percentile(latencies, 99) * 1000:.0f} ms"
+        else:
+            p50 = p99 = "*"
+        self.stdout.write(
+            f"  {label:<16}{requests:>10}{requests / window:>9.1f}{queries:>12}{queries / window:>11.1f}"
+            f"{p50:>12}{p99:>12}"
+        )
+        if capacity:
+            self.stdout.write(f"  {'':<16}(server handled these at {capacity:.0f} req/s on {self.threads} threads)")
+
+    def login_clients(self, client_class):
+        clients = []
+        for payment_request in self.targets:
+            client = client_class()
+            client.force_login(payment_request.student.user)
+            clients.append(client)
+        return clients
+
+    def logout_clients(self, clients):
+        for client in clients:
+            client.logout()
+
+    def run_polling(self, clients, window, conditional):
+        """Replay `window` seconds of every waiter polling the status API as fast as the server allows"""
+        polls = max(1, int(window / self.interval))
+        etags = {}
+
+        def poll(index):
+            client, payment_request = clients[index], self.targets[index]
+            url = reverse("api_request_status", args=[payment_request.request_id])
+            headers = {"If-None-Match": etags[index]} if conditional and index in etags else {}
+            response = client.get(url, headers=headers, secure=True)
+            if response.status_code == 200:
+                etags[index] = response.get("ETag")
+            connection.close()
+
+        jobs = [index for _ in range(polls) for index in range(len(clients))]
+        with QueryCounter() as counter, ThreadPoolExecutor(self.threads) as executor:
+            started = time.perf_counter()
+            list(executor.map(poll, jobs))
+            elapsed = time.perf_counter() - started
+        return len(jobs), counter.count, [], len(jobs) / elapsed
+
+    def run_long_poll(self, clients, window):
+        """One request per waiter held open on the broker until its request is published"""
+        received = {}
+        requests = {}
+        paid = threading.Event()
+
+        def wait(index):
+            client, payment_request = clients[index], self.targets[index]
+            url = reverse("api_request_status", args=[payment_request.request_id])
+            etag = client.get(url, secure=True).get("ETag")
+            requests[index] = 1
+            # Like the browser: re-issue the long-poll whenever the server's wait runs out
+            while not paid.is_set():
+                client.get(f"{url}?wait={settings.PAYMENT_STATUS_LONGPOLL_MAX_WAIT}", headers={"If-None-Match": etag}, secure=True)
+                requests[index] += 1
+            received[index] = time.perf_counter()
+            connection.close()
+
+        with QueryCounter() as counter:
+            threads = [threading.Thread(target=wait, args=(index,)) for index in range(len(clients))]
+            for thread in threads:
+                thread.start()
+            self.wait_for_waiters(len(clients), window)
+            time.sleep(window)
+            paid.set()
+            published = self.publish_all()
+            for thread in threads:
+                thread.join()
+        self.forget_all()
+        latencies = [received[index] - published[self.targets[index].request_id] for index in received]
+        return sum(requests.values()), counter.count, latencies
+
+    async def run_sse(self, window):
+        clients = []
+        for payment_request in self.targets:
+            client = AsyncClient()
+            await client.aforce_login(payment_request.student.user)
+            clients.append(client)
+
+        # Reconnect under the counter: ORM calls from async code share one worker thread
+        await sync_to_async(close_connection)()
+        received = {}
+
+        async def listen(index):
+            url = reverse("api_request_events", args=[self.targets[index].request_id])
+            response = await clients[index].get(url, secure=True)
+            async for chunk in response.streaming_content:
+                if b'"PAID"' in chunk:
+                    received[index] = time.perf_counter()
+                    break
+
+        with QueryCounter() as counter:
+            tasks = [asyncio.create_task(listen(index)) for index in range(len(clients))]
+            while broker.waiter_count() < len(clients):
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(window)
+            published = self.publish_all()
+            await asyncio.gather(*tasks)
+            queries = counter.count
+
+        self.forget_all()
+        for client in clients:
+            await client.alogout()
+        latencies = [received[index] - published[self.targets[index].request_id] for index in received]
+        return len(clients), queries, latencies
+
+    def wait_for_waiters(self, expected, timeout):
+        deadline = time.monotonic() + max(30, timeout)
+        while broker.waiter_count() < expected and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def publish_all(self):
+        """Simulate every request being paid, without touching the database"""
+        published = {}
+        for payment_request in self.targets:
+            if payment_request.request_id not in published:
+                published[payment_request.request_id] = time.perf_counter()
+                broker.publish(payment_request.request_id, make_event("PAID", payment_id=0))
+        return published
+
+    def forget_all(self):
+        for payment_request in self.targets:
+            broker.forget(payment_request.request_id)
@@ -0,0 +1,74 @@
+import itertools
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template.loader import get_template
+
+from paymentorg.models import Receipt
+from paymentorg.utils import (
+    RECEIPT_HTML_TEMPLATE,
+    RECEIPT_TEXT_TEMPLATE,
+    get_receipt_context,
+    get_receipt_for_render,
+    invalidate_receipt_render,
+    render_receipt_email,
+)
+
+
+class Command(BaseCommand):
+    help = "Measure receipt email renders per second: template only, cold (fetch + render) and cached."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=2000, help="Renders per scenario (default: 2000)")
+        parser.add_argument("--receipts", type=int, default=50, help="Distinct receipts to cycle through (default: 50)")
+
+    def measure(self, label, func, count):
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            started = time.perf_counter()
+            for _ in range(count):
+                func()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"  {label:<28} {count / elapsed:>10.0f} renders/s  {queries[0] / count:>5.2f} queries/render"
+        )
+
+    def handle(self, *args, **options):
+        count = max(1, options["count"])
+        receipts = list(Receipt.objects.order_by("-created_at")[:max(1, options["receipts"])])
+        if not receipts:
+            raise CommandError("No receipts to render; process a payment or run create_initial_data first.")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Rendering {count} receipt emails across {len(receipts)} receipt(s)"
+        ))
+
+        prefetched = itertools.cycle([get_receipt_for_render(receipt) for receipt in receipts])
+        text_template = get_template(RECEIPT_TEXT_TEMPLATE)
+        html_template = get_template(RECEIPT_HTML_TEMPLATE)
+
+        def template_only():
+            context = get_receipt_context(next(prefetched))
+            text_template.render(context)
+            html_template.render(context)
+
+        cold_receipts = itertools.cycle(receipts)
+
+        def cold():
+            receipt = next(cold_receipts)
+            invalidate_receipt_render(receipt.or_number)
+            render_receipt_email(receipt)
+
+        warm_receipts = itertools.cycle(receipts)
+        for receipt in receipts:
+            render_receipt_email(receipt)
+
+        self.measure("template render (prefetched)", template_only, count)
+        self.measure("cold: fetch + render + cache", cold, count)
+        self.measure("warm: cache hit", lambda: render_receipt_email(next(warm_receipts)), count)
@@ -0,0 +1,65 @@
+import hashlib
+import hmac
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from paymentorg import signing
+
+
+def legacy_create_signature(message_string):
+    """create_signature before signing.py: re-keys an HMAC from SECRET_KEY on every call"""
+    secret_key = getattr(settings, 'SECRET_KEY', 'default-insecure-key').encode('utf-8')
+    message = str(message_string).encode('utf-8')
+    return hmac.new(secret_key, message, hashlib.sha256).hexdigest()
+
+
+def legacy_process_check(message_string, provided_signature):
+    """ProcessPaymentRequestView before: one signature for the log line, one inside validate_signature"""
+    legacy_create_signature(message_string)
+    return hmac.compare_digest(legacy_create_signature(message_string), provided_signature)
+
+
+class Command(BaseCommand):
+    help = "Signatures and verifications per second: legacy per-call HMAC vs the precomputed per-purpose keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000, help="Payloads per scenario (default: 100000)")
+
+    def handle(self, *args, **options):
+        count = max(1, options["count"])
+        request_ids = [str(uuid.uuid4()) for _ in range(count)]
+        signer = signing.get_signer(signing.PAYMENT_REQUEST)
+        legacy_signatures = [legacy_create_signature(request_id) for request_id in request_ids]
+        signatures = [signer.sign(request_id) for request_id in request_ids]
+        pairs = list(zip(request_ids, signatures))
+        # a scanner batch mixes in some forged codes
+        forged = [(request_id, signature[:-4] + "0000") for request_id, signature in pairs]
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{count} payloads per scenario"))
+        self.measure("sign, legacy", count, lambda: [legacy_create_signature(r) for r in request_ids])
+        self.measure("sign, keyed", count, lambda: [signer.sign(r) for r in request_ids])
+        self.measure(
+            "verify, legacy view (2 HMACs)", count,
+            lambda: [legacy_process_check(r, s) for r, s in zip(request_ids, legacy_signatures)]
+        )
+        self.measure("verify, keyed", count, lambda: [signer.verify(r, s) for r, s in pairs])
+        self.measure("verify_many, keyed", count, lambda: signer.verify_many(pairs))
+        self.measure("verify_many, forged", count, lambda: signer.verify_many(forged), expect=False)
+        self.measure(
+            "verify_many, legacy QRs", count,
+            lambda: signer.verify_many(list(zip(request_ids, legacy_signatures))),
+            expect=bool(signer.legacy_keys)
+        )
+
+    def measure(self, label, count, run, expect=True):
+        started = time.perf_counter()
+        results = run()
+        elapsed = time.perf_counter() - started
+        if expect is not None and any(bool(result) != expect for result in results if isinstance(result, bool)):
+            self.stdout.write(self.style.ERROR(f"  {label}: unexpected verification result"))
+        self.stdout.write(
+            f"  {label:<30} {count / elapsed:>12,.0f} /s  {elapsed / count * 1e6:6.2f} us each"
+        )
@@ -0,0 +1,113 @@
+import itertools
+import time
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import JsonResponse
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import include, path, reverse
+from django.views import View
+
+from paymentorg.models import PaymentRequest
+
+
+class LegacyStatusAPI(LoginRequiredMixin, View):
+    """PaymentRequestStatusAPI before the cached status record, kept for comparison"""
+    def get(self, request, *args, **kwargs):
+        if not hasattr(request.user, 'student_profile'):
+            return JsonResponse({'status': 'NOT_STUDENT', 'error': 'User is not a student'}, status=403)
+        payment_request = PaymentRequest.objects.get(
+            request_id=self.kwargs['request_id'],
+            student=request.user.student_profile
+        )
+        if payment_request.status == 'PENDING' and payment_request.is_expired():
+            payment_request.status = 'EXPIRED'
+            payment_request.save()
+        data = {
+            'status': payment_request.status,
+            'is_expired': payment_request.is_expired(),
+            'time_remaining': payment_request.get_time_remaining(),
+        }
+        if payment_request.status == 'PAID' and hasattr(payment_request, 'payment'):
+            data['payment_id'] = payment_request.payment.id
+        return JsonResponse(data)
+
+
+# Served through the full middleware stack alongside the real routes
+urlpatterns = [
+    path('benchmark/legacy-status/<uuid:request_id>/', LegacyStatusAPI.as_view(), name='benchmark_legacy_status'),
+    path('', include('projectsite.urls')),
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = "Latency (p50/p99) and queries per request of the payment request status API, cached vs uncached vs legacy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=2000, help="Requests per scenario (default: 2000)")
+        parser.add_argument("--requests", type=int, default=50, help="Distinct payment requests to cycle through (default: 50)")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        count = max(1, options["count"])
+        requests = list(PaymentRequest.objects.select_related("student__user")[:max(1, options["requests"])])
+        if not requests:
+            raise CommandError("No payment requests; run generate_load_dataset or create some first.")
+
+        clients = {}
+        for payment_request in requests:
+            user = payment_request.student.user
+            if user.pk not in clients:
+                clients[user.pk] = Client()
+                clients[user.pk].force_login(user)
+        targets = [(clients[r.student.user_id], r.request_id) for r in requests]
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{count} status requests per scenario across {len(requests)} payment request(s)"
+        ))
+        try:
+            with override_settings(ROOT_URLCONF=__name__):
+                self.measure("legacy (full row + user)", targets, count, "benchmark_legacy_status")
+                self.measure("uncached (one values())", targets, count, "api_request_status", clear=True)
+                self.measure("cached record", targets, count, "api_request_status")
+                self.measure("cached, If-None-Match", targets, count, "api_request_status", conditional=True)
+        finally:
+            for client in clients.values():
+                client.logout()
+
+    def measure(self, label, targets, count, url_name, clear=False, conditional=False):
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        etags = {}
+        for client, request_id in targets:
+            response = client.get(reverse(url_name, args=[request_id]), secure=True)
+            etags[request_id] = response.get("ETag")
+
+        timings = []
+        cycle = itertools.cycle(targets)
+        with connection.execute_wrapper(count_queries):
+            for _ in range(count):
+                client, request_id = next(cycle)
+                if clear:
+                    cache.delete(PaymentRequest.status_cache_key(request_id))
+                headers = {"If-None-Match": etags[request_id]} if conditional else {}
+                started = time.perf_counter()
+                client.get(reverse(url_name, args=[request_id]), headers=headers, secure=True)
+                timings.append(time.perf_counter() - started)
+
+        self.stdout.write(
+            f"  {label:<26} p50 {percentile(timings, 50) * 1000:6.2f} ms  "
+            f"p99 {percentile(timings, 99) * 1000:6.2f} ms  {queries[0] / count:5.2f} queries/request"
+        )
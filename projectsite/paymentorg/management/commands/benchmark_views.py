@@ -0,0 +1,360 @@
+import gc
+import json
+import logging
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.urls import URLPattern, get_resolver, reverse
+from django.urls.converters import UUIDConverter
+from django.utils import timezone
+
+from paymentorg.models import (
+    AcademicYearConfig, BulkPaymentPosting, FeeType, Job, Officer, Organization, Payment,
+    PaymentRequest, Receipt, Student,
+)
+
+# URL names not driven: logout ends the session, the event stream holds the request open
+SKIPPED_URLS = {
+    'logout': 'ends the session',
+    'api_request_events': 'long-lived event stream',
+}
+
+# prefix -> which seeded user requests it; anything else is requested anonymously
+ROLE_PREFIXES = [
+    ('student/', 'student'),
+    ('api/request/', 'student'),
+    ('media/qr/', 'student'),
+    ('officer/', 'officer'),
+    ('api/officer/', 'officer'),
+    ('staff/', 'staff'),
+    ('api/staff/', 'staff'),
+    ('api/jobs/', 'staff'),
+    ('jobs/', 'staff'),
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def url_role(route):
+    for prefix, role in ROLE_PREFIXES:
+        if route.startswith(prefix):
+            return role
+    return 'anonymous'
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive every paymentorg URL in projectsite/urls.py through the test client against a seeded "
+        "throwaway database and record queries (cold and warm cache), p50/p95 latency and peak memory. "
+        "Writes the results to JSON and fails if query counts or p95 latency regress against the baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=200, help="Students to seed (default: 200)")
+        parser.add_argument("--orgs", type=int, default=7, help="Organizations to seed, at most 7 (default: 7)")
+        parser.add_argument("--fees", type=int, default=3, help="Fee types per organization (default: 3)")
+        parser.add_argument("--payments", type=int, default=100, help="Payments to settle (default: 100)")
+        parser.add_argument("--requests", type=int, default=2, help="Payment requests per student (default: 2)")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed for the dataset (default: 1)")
+        parser.add_argument("--repeat", type=int, default=20, help="Warm requests per URL (default: 20)")
+        parser.add_argument("--only", action="append", help="URL name to run (repeatable)")
+        parser.add_argument(
+            "--output", default=str(Path(settings.BASE_DIR) / "benchmarks" / "views_latest.json"),
+            help="Where to write the results (default: benchmarks/views_latest.json)"
+        )
+        parser.add_argument(
+            "--baseline", default=str(Path(settings.BASE_DIR) / "benchmarks" / "views_baseline.json"),
+            help="Baseline to compare against (default: benchmarks/views_baseline.json)"
+        )
+        parser.add_argument("--update-baseline", action="store_true", help="Write the results to the baseline instead of comparing")
+        parser.add_argument("--query-tolerance", type=int, default=0, help="Extra queries allowed per request (default: 0)")
+        parser.add_argument("--latency-tolerance", type=float, default=0.5, help="Allowed p95 growth as a fraction (default: 0.5)")
+        parser.add_argument("--retries", type=int, default=2, help="Re-runs of a URL whose p95 looks regressed (default: 2)")
+        parser.add_argument("--latency-slack-ms", type=float, default=5.0, help="p95 growth always allowed, for timer noise (default: 5)")
+
+    def handle(self, *args, **options):
+        scratch = tempfile.mkdtemp(prefix="benchmark_views_")
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+        try:
+            with override_settings(
+                MEDIA_ROOT=scratch,
+                JOB_RESULTS_DIR=str(Path(scratch) / "job_results"),
+                PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+                SENDGRID_API_KEY="",
+            ):
+                fixtures = self.seed(options)
+                # 404/405 responses are part of the results, not worth a log line each
+                logging.disable(logging.WARNING)
+                results = self.run(fixtures, options)
+                # compared while the database is still up, so suspect timings can be re-run
+                regressions = [] if options["update_baseline"] else self.compare(results, options)
+        finally:
+            logging.disable(logging.NOTSET)
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "dataset": {key: options[key] for key in ("students", "orgs", "fees", "payments", "requests", "seed")},
+                "repeat": options["repeat"],
+            },
+            "results": results,
+        }
+        target = Path(options["baseline"] if options["update_baseline"] else options["output"])
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        self.stdout.write(f"Results written to {target}")
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
+        if not options["update_baseline"] and Path(options["baseline"]).exists():
+            self.stdout.write(self.style.SUCCESS(f"OK: no status, query or p95 regressions against {options['baseline']}"))
+
+    def seed(self, options):
+        """Dataset from create_initial_data plus settled payments, a bulk posting and a finished export job"""
+        from allauth.socialaccount.models import SocialApp
+        from django.contrib.sites.models import Site
+
+        from paymentorg.jobs import run_job
+        from paymentorg.views import settle_payment_requests
+
+        # the login page renders the Google button, which needs a configured app (see setup_google_app.py)
+        site, _ = Site.objects.get_or_create(id=settings.SITE_ID, defaults={"domain": "testserver", "name": "UniPay"})
+        app = SocialApp.objects.create(provider="google", name="Google", client_id="benchmark", secret="benchmark")
+        app.sites.add(site)
+
+        random.seed(options["seed"])
+        started = time.perf_counter()
+        call_command(
+            "create_initial_data",
+            students=options["students"], orgs=options["orgs"], fees=options["fees"],
+            requests=options["requests"], stdout=StringIO(),
+        )
+
+        pending = list(
+            PaymentRequest.objects.filter(status="PENDING")
+            .select_related("student", "organization", "fee_type")
+            .order_by("student__student_id_number", "fee_type__name")
+        )
+        # keep a pending request for every organization so process/QR pages have something to show
+        to_settle = pending[:max(0, min(options["payments"], len(pending) - options["orgs"]))]
+        by_organization = {}
+        for payment_request in to_settle:
+            by_organization.setdefault(payment_request.organization_id, []).append(payment_request)
+        officers = {officer.organization_id: officer for officer in Officer.objects.filter(user__username__startswith="officer_")}
+        for organization_id, payment_requests in by_organization.items():
+            with transaction.atomic():
+                settle_payment_requests(payment_requests, officers[organization_id])
+
+        # the pages are requested by the owner of one pending request and an officer of its organization
+        payment_request = PaymentRequest.objects.filter(status="PENDING").select_related(
+            "student__user", "organization"
+        ).order_by("created_at").first()
+        organization = payment_request.organization
+        officer = Officer.objects.select_related("user").get(user__username=f"officer_{organization.code.lower()}")
+        staff = Officer.objects.select_related("user").get(user__username="superofficer")
+        fee_type = FeeType.objects.filter(organization=organization).order_by("pk").first()
+
+        BulkPaymentPosting.post_to_students(
+            Student.objects.all(), organization=organization, fee_type=fee_type,
+            amount=fee_type.amount, expires_at=timezone.now(), posted_by=officer.user,
+        )
+        job = Job.enqueue("PAYMENT_EXPORT", payload={"filters": {}, "format": "csv"}, created_by=staff.user)
+        job.status = "RUNNING"
+        job.save(update_fields=["status"])
+        run_job(job)
+
+        payment = Payment.objects.filter(organization=organization).order_by("pk").first() or Payment.objects.order_by("pk").first()
+        fixtures = {
+            "users": {"student": payment_request.student.user, "officer": officer.user, "staff": staff.user},
+            "payment_request": payment_request,
+            "fee_type": fee_type,
+            "organization": organization,
+            "job": job,
+            "objects": {
+                AcademicYearConfig: AcademicYearConfig.objects.order_by("pk").first(),
+                BulkPaymentPosting: BulkPaymentPosting.objects.filter(organization=organization).first(),
+                FeeType: fee_type,
+                Officer: officer,
+                Organization: organization,
+                Payment: payment,
+                PaymentRequest: payment_request,
+                Receipt: Receipt.objects.filter(payment=payment).first(),
+                Student: payment_request.student,
+            },
+        }
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Seeded {Student.objects.count()} students, {Organization.objects.count()} organizations, "
+            f"{FeeType.objects.count()} fees, {PaymentRequest.objects.count()} requests, "
+            f"{Payment.objects.count()} payments in {time.perf_counter() - started:.1f}s"
+        ))
+        return fixtures
+
+    def url_for(self, pattern, fixtures):
+        """The URL to request for `pattern`, or None when the seeded data cannot fill it in"""
+        from paymentorg.qr import get_qr_url, payment_request_qr_payload
+
+        payment_request = fixtures["payment_request"]
+        if pattern.name == "qr_image":
+            return get_qr_url(payment_request_qr_payload(payment_request))
+        view_class = getattr(pattern.callback, "view_class", None)
+        kwargs = {}
+        for name in pattern.pattern.converters:
+            if name == "request_id":
+                kwargs[name] = payment_request.request_id
+            elif name == "signature":
+                kwargs[name] = payment_request.qr_signature
+            elif name == "fee_id":
+                kwargs[name] = fixtures["fee_type"].pk
+            elif name == "job_id":
+                kwargs[name] = fixtures["job"].job_id
+            elif name == "code":
+                kwargs[name] = fixtures["organization"].code
+            elif name == "pk":
+                instance = fixtures["objects"].get(getattr(view_class, "model", None))
+                if instance is None:
+                    return None
+                # payment requests are addressed by their UUID
+                uuid_route = isinstance(pattern.pattern.converters[name], UUIDConverter)
+                kwargs[name] = instance.request_id if uuid_route else instance.pk
+            else:
+                return None
+        return reverse(pattern.name, kwargs=kwargs)
+
+    def run(self, fixtures, options):
+        # a view that raises is recorded as a 500, not the end of the run
+        clients = {"anonymous": Client(raise_request_exception=False)}
+        for role, user in fixtures["users"].items():
+            clients[role] = Client(raise_request_exception=False)
+            clients[role].force_login(user)
+
+        repeat = max(1, options["repeat"])
+        results = {}
+        self.targets = {}
+        self.stdout.write(f"{'url':<34}{'role':<10}{'status':>7}{'cold q':>8}{'warm q':>8}{'p50 ms':>9}{'p95 ms':>9}{'peak KiB':>10}")
+        for pattern in get_resolver().url_patterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            if options["only"] and pattern.name not in options["only"]:
+                continue
+            if pattern.name in SKIPPED_URLS:
+                self.stdout.write(f"{pattern.name:<34}skipped: {SKIPPED_URLS[pattern.name]}")
+                continue
+            url = self.url_for(pattern, fixtures)
+            if url is None:
+                self.stdout.write(f"{pattern.name:<34}skipped: no seeded object for {pattern.pattern}")
+                continue
+            role = url_role(str(pattern.pattern).lstrip("^"))
+            client = clients[role]
+
+            # request_started clears the query log, so each capture starts from an empty
+            # one and is counted before the next request clears it again
+            cache.clear()
+            reset_queries()
+            with CaptureQueriesContext(connection) as cold:
+                response = client.get(url, secure=True)
+            queries_cold = len(cold.captured_queries)
+            timings, queries_warm = self.time_requests(client, url, repeat)
+            tracemalloc.start()
+            client.get(url, secure=True)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            result = {
+                "path": url,
+                "role": role,
+                "status": response.status_code,
+                "queries_cold": queries_cold,
+                "queries_warm": queries_warm,
+                "p50_ms": round(percentile(timings, 50), 2),
+                "p95_ms": round(percentile(timings, 95), 2),
+                "peak_kib": round(peak / 1024, 1),
+            }
+            results[pattern.name] = result
+            self.targets[pattern.name] = (client, url)
+            self.stdout.write(
+                f"{pattern.name:<34}{role:<10}{result['status']:>7}{result['queries_cold']:>8}{result['queries_warm']:>8}"
+                f"{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['peak_kib']:>10.1f}"
+            )
+        return results
+
+    def time_requests(self, client, url, repeat):
+        """Wall-clock milliseconds of `repeat` warm requests, and the query count of the last one"""
+        timings = []
+        # like timeit: a collection pause belongs to whichever request triggers it, not to that view
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                reset_queries()
+                with CaptureQueriesContext(connection) as warm:
+                    started = time.perf_counter()
+                    client.get(url, secure=True)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries_warm = len(warm.captured_queries)
+        finally:
+            gc.enable()
+        return timings, queries_warm
+
+    def compare(self, results, options):
+        path = Path(options["baseline"])
+        if not path.exists():
+            self.stdout.write(self.style.WARNING(f"No baseline at {path}; run with --update-baseline to create one."))
+            return []
+        baseline = json.loads(path.read_text())["results"]
+
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                self.stdout.write(f"  new: {name}")
+                continue
+            # a fixed view (e.g. 500 -> 200) is not a regression
+            if result["status"] != before["status"] and result["status"] >= 400:
+                regressions.append(f"{name}: status {before['status']} -> {result['status']}")
+            for key in ("queries_cold", "queries_warm"):
+                if result[key] > before[key] + options["query_tolerance"]:
+                    regressions.append(f"{name}: {key} {before[key]} -> {result[key]}")
+            allowed = before["p95_ms"] * (1 + options["latency_tolerance"]) + options["latency_slack_ms"]
+            # a slow p95 may be another process on the machine; it has to show up again to count,
+            # and since noise only ever adds time the fastest re-run is kept
+            for _ in range(options["retries"] if result["p95_ms"] > allowed else 0):
+                client, url = self.targets[name]
+                timings, _ = self.time_requests(client, url, max(1, options["repeat"]))
+                result["p50_ms"] = min(result["p50_ms"], round(percentile(timings, 50), 2))
+                result["p95_ms"] = min(result["p95_ms"], round(percentile(timings, 95), 2))
+                if result["p95_ms"] <= allowed:
+                    self.stdout.write(f"  {name}: p95 back within {allowed:.2f}ms on re-run")
+                    break
+            if result["p95_ms"] > allowed:
+                regressions.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms (allowed {allowed:.2f}ms)")
+        if not options["only"]:
+            for name in baseline.keys() - results.keys():
+                self.stdout.write(f"  no longer measured: {name}")
+
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(f"  {regression}"))
+        return regressions
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MANIFEST_NAME = "js/precache-manifest.js"
+MANIFEST_HEADER = "// Generated by `python manage.py build_precache_manifest`; do not edit.\n"
+
+# Served by the service worker itself, never precached
+SKIPPED = {"js/service-worker.js", MANIFEST_NAME}
+PRECACHE_EXTENSIONS = {".css", ".js", ".png", ".svg", ".ico", ".woff", ".woff2", ".webp"}
+
+
+def file_revision(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(64 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+class Command(BaseCommand):
+    help = (
+        "Write static/js/precache-manifest.js: the static files (with content hashes) and "
+        "pinned CDN assets the service worker precaches. Re-run after changing static files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Fail if the manifest on disk is out of date")
+
+    def collect_entries(self, static_root):
+        entries = []
+        skipped_large = []
+        size = 0
+        for path in sorted(static_root.rglob("*")):
+            relative = path.relative_to(static_root).as_posix()
+            if not path.is_file() or relative in SKIPPED or path.suffix.lower() not in PRECACHE_EXTENSIONS:
+                continue
+            if path.stat().st_size > settings.PWA_PRECACHE_MAX_BYTES:
+                skipped_large.append(relative)
+                continue
+            entries.append({"url": settings.STATIC_URL + quote(relative), "revision": file_revision(path)})
+            size += path.stat().st_size
+        # Pinned CDN URLs never change content, so the URL itself is the revision
+        for url in settings.PWA_PRECACHE_EXTERNAL_URLS:
+            entries.append({"url": url, "revision": None})
+        return entries, skipped_large, size
+
+    def handle(self, *args, **options):
+        static_root = Path(settings.STATICFILES_DIRS[0])
+        entries, skipped_large, size = self.collect_entries(static_root)
+        version = hashlib.sha256(json.dumps(entries, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        content = MANIFEST_HEADER + "self.UNIPAY_PRECACHE = " + json.dumps(
+            {"version": version, "entries": entries}, indent=2
+        ) + ";\n"
+
+        manifest_path = static_root / MANIFEST_NAME
+        current = manifest_path.read_text(encoding="utf-8") if manifest_path.exists() else ""
+        if options["check"]:
+            if current != content:
+                raise CommandError("Precache manifest is out of date; run build_precache_manifest")
+            self.stdout.write(self.style.SUCCESS(f"Precache manifest is up to date (version {version})"))
+            return
+
+        if current != content:
+            os.makedirs(manifest_path.parent, exist_ok=True)
+            manifest_path.write_text(content, encoding="utf-8")
+        local = [entry for entry in entries if entry["revision"]]
+        self.stdout.write(self.style.SUCCESS(
+            f"Precache manifest {version}: {len(local)} static files ({size / 1024:.0f} KB), "
+            f"{len(entries) - len(local)} CDN assets -> {manifest_path}"
+        ))
+        for relative in skipped_large:
+            self.stdout.write(f"  not precached (over {settings.PWA_PRECACHE_MAX_BYTES // 1024} KB): {relative}")
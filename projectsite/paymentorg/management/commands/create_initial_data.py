@@ -1,10 +1,7 @@
 from datetime import timedelta
-import hashlib
-import hmac
 from decimal import Decimal
 from random import choice, randint
 
-from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
 from django.utils import timezone
@@ -22,6 +19,7 @@ from paymentorg.models import (
     Student,
     UserProfile,
 )
+from paymentorg import signing
 
 
 class Command(BaseCommand):
@@ -302,9 +300,7 @@ class Command(BaseCommand):
                 if created:
                     request_count += 1
                 if not pr.qr_signature:
-                    secret = getattr(settings, "SECRET_KEY", "default-insecure-key").encode("utf-8")
-                    message = str(pr.request_id).encode("utf-8")
-                    pr.qr_signature = hmac.new(secret, message, hashlib.sha256).hexdigest()
+                    pr.qr_signature = signing.sign(signing.PAYMENT_REQUEST, pr.request_id)
                     pr.save(update_fields=["qr_signature"])
         self.stdout.write(self.style.SUCCESS(f"Payment requests created: {request_count}"))
 
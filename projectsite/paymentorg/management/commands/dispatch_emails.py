@@ -0,0 +1,48 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from paymentorg.models import EmailOutbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued EmailOutbox messages in batches over a reused mail connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50, help="Emails per connection (default: 50)")
+        parser.add_argument("--loop", action="store_true", help="Keep polling the outbox instead of exiting when it is empty")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls with --loop (default: 5)")
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=10,
+            help="Release emails stuck in SENDING for this many minutes (default: 10)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+
+        released = EmailOutbox.release_stale(timedelta(minutes=options["stale_after"]))
+        if released:
+            self.stdout.write(f"Released {released} email(s) left in SENDING")
+
+        totals = {"sent": 0, "retrying": 0, "failed": 0}
+        while True:
+            close_old_connections()
+            counts = EmailOutbox.dispatch(batch_size=batch_size)
+            for key, value in counts.items():
+                totals[key] += value
+            if any(counts.values()):
+                self.stdout.write(
+                    f"  batch: {counts['sent']} sent, {counts['retrying']} retrying, {counts['failed']} failed"
+                )
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(max(0.1, options["interval"]))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Outbox dispatched: {totals['sent']} sent, {totals['retrying']} retrying, {totals['failed']} failed"
+        ))
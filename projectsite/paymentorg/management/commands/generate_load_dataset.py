@@ -0,0 +1,497 @@
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from paymentorg import signing
+from paymentorg.models import (
+    AcademicYearConfig, ActivityLog, College, Course, FeeType, Officer, Organization, OrganizationClosure,
+    ORSequence, OrgDailyCollection, Payment, PaymentRequest, Receipt, Student, StudentFeeLedger,
+    StudentSearchTerm, UserProfile,
+)
+
+# (value, weight) tables; the shapes follow a typical College of Sciences enrollment
+PROGRAM_WEIGHTS = [
+    ('COMPUTER_SCIENCE', 28),
+    ('INFORMATION_TECHNOLOGY', 26),
+    ('MEDICAL_BIOLOGY', 20),
+    ('ENVIRONMENTAL_SCIENCE', 14),
+    ('MARINE_BIOLOGY', 12),
+]
+YEAR_LEVEL_WEIGHTS = [(1, 30), (2, 26), (3, 22), (4, 19), (5, 3)]
+PAYMENT_METHOD_WEIGHTS = [('CASH', 70), ('GCASH', 22), ('BANK', 8)]
+FEE_AMOUNT_WEIGHTS = [(50, 10), (75, 8), (100, 20), (150, 18), (200, 16), (250, 10), (300, 10), (500, 8)]
+# requests of the running semester are still being paid; older ones have settled
+CURRENT_STATUS_WEIGHTS = [('PAID', 62), ('PENDING', 28), ('CANCELLED', 6), ('EXPIRED', 4)]
+PAST_STATUS_WEIGHTS = [('PAID', 88), ('CANCELLED', 7), ('EXPIRED', 5)]
+
+COURSES = {
+    'MEDICAL_BIOLOGY': ('BSBIO', 'Bachelor of Science in Biology'),
+    'MARINE_BIOLOGY': ('BSMBIO', 'Bachelor of Science in Marine Biology'),
+    'COMPUTER_SCIENCE': ('BSCS', 'Bachelor of Science in Computer Science'),
+    'ENVIRONMENTAL_SCIENCE': ('BSES', 'Bachelor of Science in Environmental Science'),
+    'INFORMATION_TECHNOLOGY': ('BSIT', 'Bachelor of Science in Information Technology'),
+}
+FEE_NAMES = [
+    'Membership Fee', 'Publication Fee', 'Assembly Fee', 'Org Shirt', 'Sports Fest Fee',
+    'Seminar Fee', 'Outreach Fee', 'Acquaintance Party Fee',
+]
+OFFICER_ROLES = ['Treasurer', 'Auditor', 'President', 'Finance Officer']
+
+# (semester, first day, last day) relative to the first calendar year of the academic year
+SEMESTER_WINDOWS = [
+    ('1st Semester', (0, 8, 1), (0, 12, 15)),
+    ('2nd Semester', (1, 1, 8), (1, 5, 31)),
+    ('Summer', (1, 6, 10), (1, 7, 25)),
+]
+
+DATASET_MODELS = [
+    User, UserProfile, Organization, Officer, FeeType, ORSequence, Student,
+    PaymentRequest, Payment, Receipt, ActivityLog,
+]
+
+
+def weighted(rng, table, k=1):
+    values, weights = zip(*table)
+    picks = rng.choices(values, weights=weights, k=k)
+    return picks[0] if k == 1 else picks
+
+
+def academic_year_starting(year):
+    return f"{year}-{year + 1}"
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at we set, so rows spread over the generated years"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large synthetic dataset for load and scaling tests: organizations with a hierarchy, "
+        "officers, thousands of fee types over several academic years, students spread over programs and "
+        "year levels, and their payment requests, payments, receipts and activity logs. Rows are written "
+        "with bulk_create in per-chunk transactions from a fixed seed, so the same options give the same data. "
+        "--students 100000 --requests 10 produces about a million payment requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=10000, help="Students to create (default: 10000)")
+        parser.add_argument("--orgs", type=int, default=40, help="Organizations to create (default: 40)")
+        parser.add_argument("--fees", type=int, default=3, help="Fee types per organization per semester (default: 3)")
+        parser.add_argument("--academic-years", type=int, default=4, help="Academic years of history, ending with the current one (default: 4)")
+        parser.add_argument("--requests", type=int, default=8, help="Average payment requests per student (default: 8)")
+        parser.add_argument("--officers", type=int, default=3, help="Officers per organization (default: 3)")
+        parser.add_argument("--void-rate", type=float, default=0.01, help="Share of payments voided (default: 0.01)")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Students generated per transaction (default: 2000)")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+        parser.add_argument(
+            "--prefix", default="LD",
+            help="Prefix of generated organization codes, usernames and student IDs (default: LD)"
+        )
+        parser.add_argument(
+            "--with-ledger", action="store_true",
+            help="Also fill StudentFeeLedger batch by batch (several times slower); otherwise run rebuild_fee_ledger afterwards"
+        )
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"].upper()
+        if not prefix.isalnum() or len(prefix) > 6:
+            raise CommandError("--prefix must be at most 6 letters or digits.")
+        if Organization.objects.filter(code__startswith=f"{prefix}-").exists():
+            raise CommandError(
+                f"A dataset with prefix {prefix} already exists; use another --prefix or a fresh database."
+            )
+        self.prefix = prefix
+        self.rng = random.Random(options["seed"])
+        self.now = timezone.now()
+        self.counts = dict.fromkeys((model._meta.verbose_name_plural for model in DATASET_MODELS), 0)
+        self.counts[StudentSearchTerm._meta.verbose_name_plural] = 0
+        if options["with_ledger"]:
+            self.counts[StudentFeeLedger._meta.verbose_name_plural] = 0
+        started = time.perf_counter()
+
+        self.periods, self.current_period = self.build_periods(options["academic_years"])
+        self.password = make_password("password123")
+        with explicit_timestamps(*DATASET_MODELS):
+            with transaction.atomic():
+                self.create_reference_data(options)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"Generating {options['students']} students in batches of {options['batch_size']}"
+            ))
+            self.create_students(options, started)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Updating derived tables"))
+        with transaction.atomic():
+            for sequence in self.sequences.values():
+                sequence.next_number = self.or_serials[sequence.pk] + 1
+            ORSequence.objects.bulk_update(self.sequences.values(), ["next_number"], batch_size=500)
+            created, updated, deleted = OrgDailyCollection.rebuild(
+                organization_ids=[organization.pk for organization in self.organizations]
+            )
+            self.stdout.write(f"  daily collections: {created} rows")
+            self.stdout.write(f"  organization closure: {OrganizationClosure.rebuild()} rows")
+
+        elapsed = time.perf_counter() - started
+        total = sum(self.counts.values())
+        for name, count in self.counts.items():
+            self.stdout.write(f"  {name:<22}{count:>12,}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)"
+        ))
+        if not options["with_ledger"]:
+            self.stdout.write("The fee ledger was not filled; run rebuild_fee_ledger before measuring student pages.")
+
+    def build_periods(self, academic_years):
+        """(academic_year, semester, start, end, years_ago) of every semester that has begun, oldest first"""
+        current = AcademicYearConfig.get_current()
+        if current:
+            current_key = (current.academic_year, current.semester)
+            last_year = int(current.academic_year.split("-")[0])
+        else:
+            today = timezone.localdate()
+            last_year = today.year if today.month >= 8 else today.year - 1
+            current_key = None
+
+        tz = timezone.get_current_timezone()
+        periods = []
+        for year in range(last_year - max(1, academic_years) + 1, last_year + 1):
+            for semester, (start_offset, *start), (end_offset, *end) in SEMESTER_WINDOWS:
+                start_at = datetime(year + start_offset, *start, 8, tzinfo=tz)
+                end_at = min(datetime(year + end_offset, *end, 17, tzinfo=tz), self.now)
+                if start_at < self.now:
+                    periods.append((academic_year_starting(year), semester, start_at, end_at, last_year - year))
+        if current_key is None or current_key not in {period[:2] for period in periods}:
+            current_key = periods[-1][:2]
+        return periods, current_key
+
+    def stamp(self, obj, created_at, updated_at=None):
+        obj.created_at = created_at
+        obj.updated_at = updated_at or created_at
+        return obj
+
+    def random_time(self, start, end):
+        return start + timedelta(seconds=self.rng.uniform(0, max(0.0, (end - start).total_seconds())))
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=1000)
+        self.counts[model._meta.verbose_name_plural] += len(objects)
+        return objects
+
+    def create_reference_data(self, options):
+        rng = self.rng
+        college, _ = College.objects.get_or_create(
+            code="COS",
+            defaults={"name": "College of Sciences", "description": "College of Sciences - Primary focus of the system"},
+        )
+        self.courses = {}
+        for program_type, (code, name) in COURSES.items():
+            course = Course.objects.filter(program_type=program_type, college=college).order_by("pk").first()
+            if course is None:
+                course = Course.objects.create(code=code, name=name, college=college, program_type=program_type)
+            self.courses[program_type] = course
+        self.college = college
+
+        # a college-level council on top; every tenth organization is another college-wide (tier 2) club,
+        # the rest are program organizations spread evenly over the five programs
+        first_start = self.periods[0][2]
+        organizations = []
+        programs = [program for program, _ in PROGRAM_WEIGHTS]
+        for index in range(max(1, options["orgs"])):
+            code = f"{self.prefix}-{index:04d}"
+            if index == 0:
+                tier, level, program, name = "TIER_2", "COLLEGE", "ALL", f"{self.prefix} College Student Council"
+            elif index % 10 == 0:
+                tier, level, program, name = "TIER_2", "CLUB", "ALL", f"{self.prefix} Sciences Club {index:04d}"
+            else:
+                program = programs[index % len(programs)]
+                tier, level = "TIER_1", "PROGRAM"
+                name = f"{self.prefix} {COURSES[program][0]} Society {index:04d}"
+            organizations.append(self.stamp(Organization(
+                code=code,
+                name=name,
+                hierarchy_level=level,
+                department=college.name if tier == "TIER_2" else COURSES[program][1],
+                fee_tier=tier,
+                program_affiliation=program,
+                description="Generated load-test organization",
+                contact_email=f"{code.lower()}@load.example.com",
+                contact_phone="0917-000-0000",
+                booth_location=rng.choice(["Main Building", "Science Complex", "Library Lobby", "Covered Court"]),
+            ), first_start))
+        self.bulk_create(Organization, organizations)
+        Organization.objects.filter(pk__in=[organization.pk for organization in organizations[1:]]).update(
+            parent_organization=organizations[0]
+        )
+        self.organizations = organizations
+
+        users, profiles, officers = [], [], []
+        for organization in organizations:
+            for index in range(max(1, options["officers"])):
+                username = f"{organization.code.lower()}_officer{index + 1}"
+                users.append(User(
+                    username=username,
+                    email=f"{username}@load.example.com",
+                    first_name=OFFICER_ROLES[index % len(OFFICER_ROLES)],
+                    last_name=organization.code,
+                    password=self.password,
+                    is_staff=True,
+                    date_joined=first_start,
+                ))
+        self.bulk_create(User, users)
+        per_org = max(1, options["officers"])
+        for index, user in enumerate(users):
+            organization = organizations[index // per_org]
+            head = index % per_org == 0
+            profiles.append(self.stamp(UserProfile(user=user, is_officer=True), first_start))
+            officers.append(self.stamp(Officer(
+                user=user,
+                organization=organization,
+                role=OFFICER_ROLES[index % per_org % len(OFFICER_ROLES)],
+                can_process_payments=True,
+                can_void_payments=head,
+                can_generate_reports=head,
+            ), first_start))
+        self.bulk_create(UserProfile, profiles)
+        self.bulk_create(Officer, officers)
+        self.officers = {}
+        for officer in officers:
+            self.officers.setdefault(officer.organization_id, []).append(officer)
+
+        # fees of the running semester are open; earlier ones are closed (inactive)
+        fees_per_org = max(1, options["fees"])
+        fee_types = []
+        for academic_year, semester, start_at, end_at, _ in self.periods:
+            is_current = (academic_year, semester) == self.current_period
+            for organization in organizations:
+                count = fees_per_org if semester != "Summer" else int(rng.random() < 0.3)
+                for index in range(count):
+                    name = FEE_NAMES[index % len(FEE_NAMES)]
+                    if index >= len(FEE_NAMES):
+                        name = f"{name} {index // len(FEE_NAMES) + 1}"
+                    # most fees apply to everyone; orientation and graduation fees to one year level
+                    levels = rng.choices(["All", "1", "4"], weights=[85, 10, 5])[0]
+                    fee_types.append(self.stamp(FeeType(
+                        organization=organization,
+                        name=name,
+                        amount=Decimal(weighted(rng, FEE_AMOUNT_WEIGHTS)),
+                        description="Generated load-test fee",
+                        academic_year=academic_year,
+                        semester=semester,
+                        applicable_year_levels=levels,
+                        deadline=(end_at + timedelta(days=14)).date(),
+                        is_active=is_current,
+                    ), start_at))
+        self.bulk_create(FeeType, fee_types)
+
+        # candidate fees per (program, period index): the program's own organizations plus college-wide ones
+        period_index = {period[:2]: index for index, period in enumerate(self.periods)}
+        self.fee_candidates = {}
+        organization_by_id = {organization.pk: organization for organization in organizations}
+        for fee in fee_types:
+            organization = organization_by_id[fee.organization_id]
+            index = period_index[(fee.academic_year, fee.semester)]
+            targets = programs if organization.fee_tier == "TIER_2" else [organization.program_affiliation]
+            for program in targets:
+                self.fee_candidates.setdefault((program, index), []).append(fee)
+        self.organization_by_id = organization_by_id
+
+        self.sequences = {}
+        academic_years = sorted({period[0] for period in self.periods})
+        sequences = [
+            self.stamp(ORSequence(organization=organization, academic_year=academic_year), first_start)
+            for organization in organizations for academic_year in academic_years
+        ]
+        self.bulk_create(ORSequence, sequences)
+        for sequence in sequences:
+            self.sequences[(sequence.organization_id, sequence.academic_year)] = sequence
+        self.or_serials = {sequence.pk: 0 for sequence in sequences}
+
+    def create_students(self, options, started):
+        total = max(0, options["students"])
+        batch_size = max(1, options["batch_size"])
+        for start in range(0, total, batch_size):
+            with transaction.atomic():
+                students = self.create_student_batch(start, min(start + batch_size, total))
+                self.create_payment_history(students, options)
+                # bulk_create skips the post_save that indexes a student for search
+                created, _ = StudentSearchTerm.rebuild(student_ids=[student.pk for student in students])
+                self.counts[StudentSearchTerm._meta.verbose_name_plural] += created
+                if options["with_ledger"]:
+                    created, _, _ = StudentFeeLedger.rebuild(student_ids=[student.pk for student in students])
+                    self.counts[StudentFeeLedger._meta.verbose_name_plural] += created
+            elapsed = time.perf_counter() - started
+            rows = sum(self.counts.values())
+            self.stdout.write(
+                f"  {min(start + batch_size, total):>8}/{total} students  {rows:>12,} rows  {rows / elapsed:>9,.0f} rows/s"
+            )
+
+    def create_student_batch(self, first, last):
+        rng = self.rng
+        users, levels, programs = [], [], []
+        for number in range(first, last):
+            username = f"{self.prefix.lower()}_student{number + 1:06d}"
+            level = weighted(rng, YEAR_LEVEL_WEIGHTS)
+            # joined when the academic year they entered began, or with the oldest generated one
+            entered = next(period[2] for period in self.periods if period[4] < level)
+            users.append(User(
+                username=username,
+                email=f"{username}@load.example.com",
+                first_name=f"Student{number + 1}",
+                last_name=self.prefix.title(),
+                password=self.password,
+                date_joined=entered,
+            ))
+            levels.append(level)
+            programs.append(weighted(rng, PROGRAM_WEIGHTS))
+        self.bulk_create(User, users)
+        self.bulk_create(UserProfile, [
+            self.stamp(UserProfile(user=user, is_officer=False), user.date_joined) for user in users
+        ])
+        students = []
+        for user, level, program, number in zip(users, levels, programs, range(first, last)):
+            student = self.stamp(Student(
+                user=user,
+                student_id_number=f"{self.prefix}-{number + 1:07d}",
+                first_name=user.first_name,
+                last_name=user.last_name,
+                middle_name=rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ"),
+                email=user.email,
+                phone_number=f"0917-{rng.randint(0, 999):03d}-{rng.randint(0, 9999):04d}",
+                course=self.courses[program],
+                year_level=level,
+                college=self.college,
+            ), user.date_joined)
+            student.program = program
+            students.append(student)
+        return self.bulk_create(Student, students)
+
+    def create_payment_history(self, students, options):
+        rng = self.rng
+        mean = max(0, options["requests"])
+        requests = []
+        for student in students:
+            # a student only has fees from the years since they enrolled, at the year level they had then
+            candidates = [
+                (index, fee)
+                for index, period in enumerate(self.periods) if period[4] < student.year_level
+                for fee in self.fee_candidates.get((student.program, index), ())
+                if fee.applies_to_year_level(student.year_level - period[4])
+            ]
+            count = min(len(candidates), int(rng.triangular(0, 2 * mean, mean) + 0.5))
+            for index, fee in rng.sample(candidates, count):
+                academic_year, semester, start_at, end_at, _ = self.periods[index]
+                current = (academic_year, semester) == self.current_period
+                status = weighted(rng, CURRENT_STATUS_WEIGHTS if current else PAST_STATUS_WEIGHTS)
+                created_at = self.random_time(start_at, end_at)
+                request_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+                payment_request = self.stamp(PaymentRequest(
+                    request_id=request_id,
+                    student=student,
+                    organization_id=fee.organization_id,
+                    fee_type=fee,
+                    amount=fee.amount,
+                    payment_method=weighted(rng, PAYMENT_METHOD_WEIGHTS),
+                    status=status,
+                    qr_signature=signing.sign(signing.PAYMENT_REQUEST, request_id),
+                    expires_at=created_at + timedelta(minutes=30),
+                ), created_at)
+                if status == "PAID":
+                    payment_request.paid_at = min(created_at + timedelta(hours=rng.expovariate(1 / 18)), self.now)
+                    payment_request.updated_at = payment_request.paid_at
+                elif status != "PENDING":
+                    payment_request.updated_at = min(created_at + timedelta(days=rng.uniform(1, 30)), self.now)
+                requests.append(payment_request)
+        self.bulk_create(PaymentRequest, requests)
+
+        payments, logs = [], []
+        for payment_request in requests:
+            logs.append(self.stamp(ActivityLog(
+                user_id=payment_request.student.user_id,
+                action="qr_generated",
+                description=(
+                    f"Student {payment_request.student.student_id_number} generated QR for {payment_request.fee_type.name}"
+                ),
+                payment_request=payment_request,
+                ip_address=f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            ), payment_request.created_at))
+            if payment_request.status != "PAID":
+                continue
+            organization = self.organization_by_id[payment_request.organization_id]
+            sequence = self.sequences[(organization.pk, payment_request.fee_type.academic_year)]
+            self.or_serials[sequence.pk] += 1
+            serial = self.or_serials[sequence.pk]
+            amount = payment_request.amount
+            # cash is often handed over in round bills; e-wallet and bank transfers are exact
+            if payment_request.payment_method == "CASH" and rng.random() < 0.4:
+                amount_received = (amount // 100 + 1) * 100
+            else:
+                amount_received = amount
+            payment = self.stamp(Payment(
+                payment_request=payment_request,
+                student=payment_request.student,
+                organization=organization,
+                fee_type=payment_request.fee_type,
+                amount=amount,
+                amount_received=amount_received,
+                change_given=amount_received - amount,
+                or_number=ORSequence.format_or_number(organization.code, sequence.academic_year, serial),
+                or_sequence=sequence,
+                or_serial=serial,
+                payment_method=payment_request.payment_method,
+                processed_by=rng.choice(self.officers[organization.pk]),
+            ), payment_request.paid_at)
+            if rng.random() < options["void_rate"]:
+                payment.status = "VOID"
+                payment.is_void = True
+                payment.void_reason = "Generated void"
+                payment.voided_by = payment.processed_by
+                payment.voided_at = min(payment.created_at + timedelta(hours=rng.uniform(0.1, 48)), self.now)
+                payment.updated_at = payment.voided_at
+            payments.append(payment)
+        self.bulk_create(Payment, payments)
+
+        receipts = []
+        for payment in payments:
+            receipts.append(self.stamp(Receipt(
+                payment=payment,
+                or_number=payment.or_number,
+                verification_signature=signing.sign(signing.RECEIPT, payment.or_number),
+                email_sent=True,
+                email_sent_at=payment.created_at + timedelta(seconds=rng.uniform(5, 120)),
+            ), payment.created_at))
+            logs.append(self.stamp(ActivityLog(
+                user_id=payment.processed_by.user_id,
+                action="payment_processed",
+                description=f"Processed payment OR#{payment.or_number} for {payment.student.student_id_number}.",
+                payment=payment,
+            ), payment.created_at))
+            if payment.is_void:
+                logs.append(self.stamp(ActivityLog(
+                    user_id=payment.voided_by.user_id,
+                    action="payment_voided",
+                    description=f"Voided payment OR#{payment.or_number}. Reason: {payment.void_reason}",
+                    payment=payment,
+                ), payment.voided_at))
+        self.bulk_create(Receipt, receipts)
+        self.bulk_create(ActivityLog, logs)
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from paymentorg.models import ORSequence
+
+
+def format_range(first, last):
+    return str(first) if first == last else f"{first}-{last}"
+
+
+class Command(BaseCommand):
+    help = (
+        "List missing serials in each organization's OR number series: gaps below the "
+        "highest issued receipt, and the reserved-but-unissued tail."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organization", help="Organization code")
+        parser.add_argument("--academic-year", help="e.g. 2025-2026")
+        parser.add_argument(
+            "--fail-on-gaps", action="store_true",
+            help="Exit with an error if any series has gaps below its highest issued serial"
+        )
+
+    def handle(self, *args, **options):
+        sequences = ORSequence.objects.select_related("organization")
+        if options["organization"]:
+            sequences = sequences.filter(organization__code=options["organization"])
+        if options["academic_year"]:
+            sequences = sequences.filter(academic_year=options["academic_year"])
+
+        with_gaps = 0
+        for sequence in sequences:
+            report = sequence.find_gaps()
+            missing = sum(last - first + 1 for first, last in report["gaps"])
+            code = sequence.organization.code
+            heading = f"{code} {sequence.academic_year}: {report['issued']} issued, next unreserved {sequence.next_number}"
+            if missing:
+                with_gaps += 1
+                self.stdout.write(self.style.WARNING(f"{heading}, {missing} missing"))
+                for first, last in report["gaps"]:
+                    self.stdout.write(
+                        f"  missing {format_range(first, last)}  "
+                        f"({ORSequence.format_or_number(code, sequence.academic_year, first)}"
+                        f"{'' if first == last else ' ...'})"
+                    )
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{heading}, no gaps"))
+            if report["unissued_tail"]:
+                first, last = report["unissued_tail"]
+                self.stdout.write(
+                    f"  reserved, not issued yet: {format_range(first, last)} "
+                    f"(held by running workers, or left over from a restart)"
+                )
+
+        if options["fail_on_gaps"] and with_gaps:
+            raise CommandError(f"{with_gaps} OR series with gaps")
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from paymentorg import signing
+from paymentorg.models import BulkPaymentPosting, PaymentRequest, Receipt
+from paymentorg.qr import QR_FORMATS, get_qr_image, payment_request_qr_payload
+
+
+class Command(BaseCommand):
+    help = (
+        "Draw QR images for pending payment requests (e.g. right after a bulk posting) "
+        "so students' QR pages are served straight from the image cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posting", type=int, help="Only requests for this bulk posting's fee")
+        parser.add_argument("--fee-type", type=int, help="Only requests for this fee type id")
+        parser.add_argument(
+            "--format",
+            action="append",
+            choices=sorted(QR_FORMATS),
+            help="Image format(s) to draw (default: png)",
+        )
+        parser.add_argument("--receipts", action="store_true", help="Also backfill missing receipt QR images")
+
+    def handle(self, *args, **options):
+        formats = options["format"] or ["png"]
+        requests = PaymentRequest.objects.filter(status="PENDING")
+
+        if options["posting"]:
+            try:
+                posting = BulkPaymentPosting.objects.get(pk=options["posting"])
+            except BulkPaymentPosting.DoesNotExist:
+                raise CommandError(f"Bulk posting {options['posting']} does not exist")
+            requests = requests.filter(fee_type_id=posting.fee_type_id, created_at__gte=posting.created_at)
+        if options["fee_type"]:
+            requests = requests.filter(fee_type_id=options["fee_type"])
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Pre-generating payment request QR codes"))
+        start = time.perf_counter()
+        count = 0
+        for request_id, signature in requests.values_list("request_id", "qr_signature").iterator(chunk_size=2000):
+            # Requests without a signature get the one the QR page will assign on first view
+            signature = signature or signing.sign(signing.PAYMENT_REQUEST, request_id)
+            payload = payment_request_qr_payload(PaymentRequest(request_id=request_id), signature)
+            for fmt in formats:
+                get_qr_image(payload, fmt)
+            count += 1
+            if count % 500 == 0:
+                self.stdout.write(f"  {count} requests...")
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"QR codes ready for {count} payment requests in {elapsed:.1f}s"))
+
+        if options["receipts"]:
+            attached = 0
+            for receipt in Receipt.objects.filter(Q(receipt_qr="") | Q(receipt_qr__isnull=True)).iterator(chunk_size=500):
+                receipt.attach_qr_image()
+                attached += 1
+            self.stdout.write(self.style.SUCCESS(f"Receipt QR codes attached: {attached}"))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from paymentorg.models import Organization, OrgDailyCollection
+
+
+class Command(BaseCommand):
+    help = "Backfill or repair the OrgDailyCollection rollup from Payment."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--organization",
+            action="append",
+            dest="organization_codes",
+            help="Organization code to rebuild (repeatable). Rebuilds every organization when omitted.",
+        )
+        parser.add_argument("--since", help="Only rebuild days from this date on (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        organizations = Organization.objects.order_by("code")
+        if options.get("organization_codes"):
+            organizations = organizations.filter(code__in=options["organization_codes"])
+        since = None
+        if options["since"]:
+            since = parse_date(options["since"])
+            if since is None:
+                raise CommandError(f"Invalid date: {options['since']}")
+
+        totals = [0, 0, 0]
+        for organization in organizations:
+            with transaction.atomic():
+                counts = OrgDailyCollection.rebuild(organization_ids=[organization.id], since=since)
+            totals = [total + count for total, count in zip(totals, counts)]
+            if any(counts):
+                self.stdout.write(f"  {organization.code}: {counts[0]} created, {counts[1]} updated, {counts[2]} deleted")
+
+        created, updated, deleted = totals
+        self.stdout.write(self.style.SUCCESS(
+            f"Daily collections rebuilt: {created} created, {updated} updated, {deleted} deleted"
+        ))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from paymentorg.models import Student, StudentFeeLedger
+
+
+class Command(BaseCommand):
+    help = "Backfill or repair the StudentFeeLedger table from FeeType, Payment and PaymentRequest."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Students per batch (default: 1000)")
+        parser.add_argument(
+            "--student",
+            action="append",
+            dest="student_ids",
+            help="Student ID number to rebuild (repeatable). Rebuilds everyone when omitted.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+
+        students = Student.objects.order_by("id")
+        if options.get("student_ids"):
+            students = students.filter(student_id_number__in=options["student_ids"])
+        student_ids = list(students.values_list("id", flat=True))
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Rebuilding fee ledger for {len(student_ids)} students"))
+
+        totals = [0, 0, 0]
+        for start in range(0, len(student_ids), batch_size):
+            batch = student_ids[start:start + batch_size]
+            with transaction.atomic():
+                counts = StudentFeeLedger.rebuild(student_ids=batch)
+            totals = [total + count for total, count in zip(totals, counts)]
+            self.stdout.write(f"  {min(start + batch_size, len(student_ids))}/{len(student_ids)} students")
+
+        created, updated, deleted = totals
+        self.stdout.write(self.style.SUCCESS(
+            f"Fee ledger rebuilt: {created} created, {updated} updated, {deleted} deleted"
+        ))
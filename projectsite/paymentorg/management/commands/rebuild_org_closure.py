@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from paymentorg.models import OrganizationClosure
+
+
+class Command(BaseCommand):
+    help = "Rebuild the OrganizationClosure table from Organization.parent_organization."
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.MIGRATE_HEADING("Rebuilding organization hierarchy closure"))
+        with transaction.atomic():
+            rows = OrganizationClosure.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Organization closure rebuilt: {rows} rows"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from paymentorg.models import Student, StudentSearchTerm
+
+
+class Command(BaseCommand):
+    help = "Backfill or repair the StudentSearchTerm index used by the student list search."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Students per batch (default: 1000)")
+        parser.add_argument(
+            "--student",
+            action="append",
+            dest="student_ids",
+            help="Student ID number to rebuild (repeatable). Rebuilds everyone when omitted.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+
+        students = Student.objects.order_by("id")
+        if options.get("student_ids"):
+            students = students.filter(student_id_number__in=options["student_ids"])
+        student_ids = list(students.values_list("id", flat=True))
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Rebuilding search terms for {len(student_ids)} students"))
+
+        created = deleted = 0
+        for start in range(0, len(student_ids), batch_size):
+            batch = student_ids[start:start + batch_size]
+            with transaction.atomic():
+                batch_created, batch_deleted = StudentSearchTerm.rebuild(student_ids=batch)
+            created += batch_created
+            deleted += batch_deleted
+            self.stdout.write(f"  {min(start + batch_size, len(student_ids))}/{len(student_ids)} students")
+
+        self.stdout.write(self.style.SUCCESS(f"Search terms rebuilt: {created} created, {deleted} deleted"))
@@ -0,0 +1,82 @@
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from paymentorg.jobs import run_job
+from paymentorg.models import Job
+
+
+def execute(job):
+    """Thread-pool entry point: run one job on this thread's own DB connection"""
+    try:
+        return run_job(job)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Process queued background jobs (bulk postings, exports, receipt emails)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=2, help="Jobs run concurrently (default: 2)")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between queue polls when idle (default: 2)")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty instead of polling forever")
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=15,
+            help="Requeue RUNNING jobs with no progress for this many minutes (default: 15)",
+        )
+
+    def handle(self, *args, **options):
+        threads = max(1, options["threads"])
+        poll_interval = max(0.1, options["poll_interval"])
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        requeued, failed = Job.requeue_stale(timedelta(minutes=options["stale_after"]))
+        if requeued or failed:
+            self.stdout.write(f"Recovered stale jobs: {requeued} requeued, {failed} failed")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Job worker {worker_id} started with {threads} thread(s)"))
+
+        running = set()
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="unipay-job") as executor:
+            try:
+                while True:
+                    close_old_connections()
+                    free = threads - len(running)
+                    if free > 0:
+                        for job in Job.claim(worker_id, limit=free):
+                            self.stdout.write(f"  started {job.get_kind_display()} {job.job_id}")
+                            running.add(executor.submit(execute, job))
+
+                    if not running:
+                        if options["once"]:
+                            break
+                        time.sleep(poll_interval)
+                        continue
+
+                    done, running = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.report(future.result())
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping; waiting for running jobs to finish...")
+                for future in running:
+                    self.report(future.result())
+
+        self.stdout.write(self.style.SUCCESS("Job worker stopped"))
+
+    def report(self, job):
+        if job.status == "SUCCEEDED":
+            self.stdout.write(self.style.SUCCESS(f"  finished {job.get_kind_display()} {job.job_id}: {job.result}"))
+        elif job.status == "QUEUED":
+            self.stdout.write(self.style.WARNING(
+                f"  {job.get_kind_display()} {job.job_id} failed (attempt {job.attempts}/{job.max_attempts}), requeued"
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(f"  {job.get_kind_display()} {job.job_id} failed: {job.error.strip().splitlines()[-1]}"))
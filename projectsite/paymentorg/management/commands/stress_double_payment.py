@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from paymentorg.models import Officer, Payment, PaymentRequest
+from paymentorg.views import create_signature
+
+
+def test_host():
+    return next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')), 'localhost')
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency test for payment processing: N officers submit the same pending QR at once. "
+        "Exactly one must record a payment and the rest must get a clean 'already paid' result. "
+        "Settles real pending requests, so run it against a scratch or development database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent submissions per request (default: 8)")
+        parser.add_argument("--requests", type=int, default=3, help="Pending requests to hammer (default: 3)")
+
+    def handle(self, *args, **options):
+        threads = max(2, options["threads"])
+        targets = []
+        for payment_request in PaymentRequest.objects.filter(status="PENDING").select_related("organization").order_by("created_at"):
+            officers = list(Officer.objects.filter(organization=payment_request.organization, user__is_active=True).select_related("user"))
+            if officers:
+                targets.append((payment_request, officers))
+            if len(targets) >= options["requests"]:
+                break
+        if not targets:
+            raise CommandError("No pending requests with an officer in their organization.")
+
+        host = test_host()
+        failures = []
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{connection.vendor}: {threads} concurrent submissions per request"))
+        for payment_request, officers in targets:
+            url = reverse("officer_process_payment", args=[payment_request.request_id, create_signature(str(payment_request.request_id))])
+            data = {"amount_received": str(payment_request.amount), "payment_method": "CASH", "notes": "stress_double_payment"}
+            clients = []
+            for index in range(threads):
+                client = Client(HTTP_HOST=host, raise_request_exception=False)
+                client.force_login(officers[index % len(officers)].user)
+                clients.append(client)
+
+            outcomes = Counter()
+            outcomes_lock = threading.Lock()
+            barrier = threading.Barrier(threads)
+
+            def submit(client):
+                barrier.wait()
+                try:
+                    response = client.post(url, data, secure=True)
+                    if response.status_code != 302:
+                        outcome = f"HTTP {response.status_code}"
+                    else:
+                        levels = {message.level_tag for message in response.wsgi_request._messages}
+                        if "success" in levels:
+                            outcome = "paid"
+                        elif any("already" in message.message for message in response.wsgi_request._messages):
+                            outcome = "already paid"
+                        else:
+                            outcome = "redirect without result"
+                except Exception as error:
+                    outcome = type(error).__name__
+                finally:
+                    connection.close()
+                with outcomes_lock:
+                    outcomes[outcome] += 1
+
+            started = time.perf_counter()
+            pool = [threading.Thread(target=submit, args=(client,)) for client in clients]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            payment_request.refresh_from_db(fields=["status"])
+            payments = Payment.objects.filter(payment_request=payment_request).count()
+            summary = ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items()))
+            self.stdout.write(f"  {payment_request.request_id}  {summary}  -> {payments} payment(s), {payment_request.status}  {elapsed:.2f}s")
+            if outcomes["paid"] != 1 or outcomes["already paid"] != threads - 1 or payments != 1 or payment_request.status != "PAID":
+                failures.append(str(payment_request.request_id))
+
+        if failures:
+            raise CommandError(f"Double-payment check failed for {len(failures)} request(s): {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("  OK: one payment per request and a clean 'already paid' for every other submission"))
@@ -0,0 +1,111 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.test.utils import override_settings
+
+from paymentorg.models import ORSequence, Organization
+from paymentorg.or_numbers import ORNumberAllocator
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency test for the OR number allocator: many threads across several simulated "
+        "workers allocate from one series, some transactions roll back, and every committed "
+        "serial must be unique. Runs against the configured default database (SQLite or Postgres)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16, help="Concurrent threads (default: 16)")
+        parser.add_argument("--workers", type=int, default=4, help="Allocator instances, i.e. processes (default: 4)")
+        parser.add_argument("--per-thread", type=int, default=200, help="Receipts per thread (default: 200)")
+        parser.add_argument("--block-size", type=int, help="Override OR_NUMBER_BLOCK_SIZE")
+        parser.add_argument("--rollback-rate", type=float, default=0.05, help="Share of transactions rolled back (default: 0.05)")
+        parser.add_argument("--keep", action="store_true", help="Keep the test series instead of deleting it")
+
+    def handle(self, *args, **options):
+        organization = Organization.objects.order_by("pk").first()
+        if organization is None:
+            raise CommandError("No organizations; run create_initial_data first.")
+        academic_year = f"stress-{int(time.time()) % 100000}"
+        workers = [ORNumberAllocator() for _ in range(max(1, options["workers"]))]
+        threads = max(1, options["threads"])
+        per_thread = max(1, options["per_thread"])
+        rollback_rate = options["rollback_rate"]
+
+        committed, rolled_back, lock_errors = [], [], [0]
+        results_lock = threading.Lock()
+
+        def run(index):
+            allocator = workers[index % len(workers)]
+            rng = random.Random(index)
+            done = 0
+            while done < per_thread:
+                serials = []
+                try:
+                    with transaction.atomic():
+                        serials = [serial for _, serial, _ in allocator.allocate(organization, academic_year=academic_year)]
+                        if rng.random() < rollback_rate:
+                            raise Rollback
+                except Rollback:
+                    with results_lock:
+                        rolled_back.extend(serials)
+                    continue
+                except OperationalError:
+                    # SQLite "database is locked" when two writers collide; the real booth would retry too
+                    with results_lock:
+                        lock_errors[0] += 1
+                    continue
+                with results_lock:
+                    committed.extend(serials)
+                done += 1
+            connection.close()
+
+        overrides = {"OR_NUMBER_BLOCK_SIZE": options["block_size"]} if options["block_size"] else {}
+        with override_settings(**overrides):
+            started = time.perf_counter()
+            pool = [threading.Thread(target=run, args=(index,)) for index in range(threads)]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        sequence = ORSequence.objects.get(organization=organization, academic_year=academic_year)
+        reserved = sequence.next_number - 1
+        unused = sum(
+            end - start
+            for allocator in workers
+            for blocks in allocator._blocks.values()
+            for start, end in blocks
+        )
+        duplicates = len(committed) - len(set(committed))
+        out_of_range = [serial for serial in committed if not 1 <= serial <= reserved]
+        # every reserved serial is committed, lost to a rollback, or still held by a worker
+        accounted = len(set(committed)) + len(set(rolled_back) - set(committed)) + unused
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{connection.vendor}: {threads} threads on {len(workers)} worker(s), "
+            f"block size {options['block_size'] or 'default'}"
+        ))
+        self.stdout.write(f"  committed receipts   {len(committed)} in {elapsed:.2f}s ({len(committed) / elapsed:.0f}/s)")
+        self.stdout.write(f"  rolled back          {len(rolled_back)}")
+        self.stdout.write(f"  lock errors retried  {lock_errors[0]}")
+        self.stdout.write(f"  serials reserved     {reserved}")
+        self.stdout.write(f"  unused in blocks     {unused}")
+        self.stdout.write(f"  duplicates           {duplicates}")
+
+        if not options["keep"]:
+            sequence.delete()
+        if duplicates or out_of_range or accounted != reserved:
+            raise CommandError(
+                f"Allocator check failed: {duplicates} duplicate(s), {len(out_of_range)} out of range, "
+                f"{accounted} of {reserved} reserved serials accounted for"
+            )
+        self.stdout.write(self.style.SUCCESS("  OK: committed serials are unique and every reserved serial is accounted for"))
@@ -0,0 +1,283 @@
+"""
+Payment lifecycle metrics in the Prometheus text format.
+
+Counters and histograms are declared at the bottom of this module and
+updated from the hot paths: QR generation, signature checks, payment
+processing, receipt creation, email sending and bulk posting. An update
+only adds to a dict under a lock.
+
+Every METRICS_FLUSH_INTERVAL seconds a background thread (and a scrape,
+and exit) adds what the process recorded since its last flush to
+METRICS_FILE, a SQLite file shared by all worker processes, so a scrape of
+any worker sees the totals of all of them. Requests never wait on the file. Without METRICS_FILE the totals stay in
+the process. Served to staff (or a scraper with METRICS_TOKEN) at
+/api/staff/metrics/; e.g. booth throughput per organization is
+rate(unipay_payments_total[5m]) * 60 and p95 processing time is
+histogram_quantile(0.95, rate(unipay_payment_processing_seconds_bucket[5m])).
+"""
+import atexit
+import hmac
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds; the defaults suit a request, the others a signature check and a bulk posting
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005)
+SLOW_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    """Metric declarations plus the samples recorded by this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.metrics = {}
+        # (sample name, ((label, value), ...)) -> amount added since the last flush
+        self._pending = {}
+        # running totals when there is no shared file
+        self._totals = {}
+        # pid of the process whose flusher thread is running (threads do not survive a fork)
+        self._flusher_pid = None
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add(self, samples):
+        """Add ((sample name, labels), amount) pairs; the flusher thread writes them out"""
+        with self._lock:
+            pending = self._pending
+            for key, amount in samples:
+                pending[key] = pending.get(key, 0) + amount
+        if self._flusher_pid != os.getpid():
+            self._start_flusher()
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher_pid == os.getpid() or not getattr(settings, 'METRICS_FILE', ''):
+                # without a shared file, samples are only moved to the totals at scrape time
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_periodically, name='metrics-flusher', daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 5))
+            try:
+                self.flush()
+            except Exception:
+                logger.warning('Metrics flush failed', exc_info=True)
+
+    def flush(self):
+        """Move pending samples into the shared file (or this process's totals)"""
+        # one flusher at a time; a thread that finds one running leaves its samples for the next flush
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            path = getattr(settings, 'METRICS_FILE', '')
+            if not path:
+                with self._lock:
+                    for key, amount in pending.items():
+                        self._totals[key] = self._totals.get(key, 0) + amount
+                return
+            try:
+                with self._connect(path) as db:
+                    db.executemany(
+                        'INSERT INTO samples (name, labels, value) VALUES (?, ?, ?) '
+                        'ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value',
+                        [(name, json.dumps(labels), amount) for (name, labels), amount in pending.items()]
+                    )
+            except sqlite3.Error:
+                logger.warning(f'Could not write metrics to {path}; keeping them for the next flush', exc_info=True)
+                with self._lock:
+                    for key, amount in pending.items():
+                        self._pending[key] = self._pending.get(key, 0) + amount
+        finally:
+            self._flush_lock.release()
+
+    @staticmethod
+    def _connect(path):
+        db = sqlite3.connect(path, timeout=5)
+        db.execute('CREATE TABLE IF NOT EXISTS samples (name TEXT, labels TEXT, value REAL, PRIMARY KEY (name, labels))')
+        return db
+
+    def collect(self):
+        """Totals across processes: {(sample name, labels): value}"""
+        self.flush()
+        path = getattr(settings, 'METRICS_FILE', '')
+        if not path:
+            with self._lock:
+                return dict(self._totals)
+        db = self._connect(path)
+        try:
+            return {
+                (name, tuple(tuple(pair) for pair in json.loads(labels))): value
+                for name, labels, value in db.execute('SELECT name, labels, value FROM samples')
+            }
+        finally:
+            db.close()
+
+    def render(self):
+        """Prometheus text exposition of every registered metric"""
+        by_metric = {}
+        for (sample, labels), value in self.collect().items():
+            by_metric.setdefault(sample, []).append((labels, value))
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for sample in metric.sample_names():
+                for labels, value in sorted(by_metric.get(sample, ()), key=metric.sort_key):
+                    label_text = ','.join(f'{label}="{_escape(value)}"' for label, value in labels)
+                    lines.append(f'{sample}{{{label_text}}} {_format_value(value)}' if label_text else f'{sample} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} takes labels {self.labelnames}, got {tuple(labels)}')
+        return tuple((label, str(labels[label])) for label in self.labelnames)
+
+    def sample_names(self):
+        return [self.name]
+
+    def sort_key(self, item):
+        return item[0]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        registry.add([((self.name, self._labels(labels)), amount)])
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        # buckets are stored cumulative, so totals from several processes simply add up
+        samples = [
+            ((f'{self.name}_bucket', labels + (('le', _format_value(bound)),)), 1)
+            for bound in self.buckets if value <= bound
+        ]
+        samples.append(((f'{self.name}_sum', labels), value))
+        samples.append(((f'{self.name}_count', labels), 1))
+        registry.add(samples)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def sample_names(self):
+        return [f'{self.name}_bucket', f'{self.name}_sum', f'{self.name}_count']
+
+    def sort_key(self, item):
+        # buckets in ascending order within each label set
+        labels = item[0]
+        if labels and labels[-1][0] == 'le':
+            return labels[:-1], float(labels[-1][1].replace('+Inf', 'inf'))
+        return labels, 0.0
+
+
+def token_matches(authorization):
+    """True when the Authorization header carries METRICS_TOKEN as a bearer token"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    scheme, _, provided = authorization.partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(provided.strip(), token)
+
+
+QR_GENERATED = Counter(
+    'unipay_qr_generated_total', 'Payment QR codes generated by students', ['organization']
+)
+QR_RENDER_SECONDS = Histogram(
+    'unipay_qr_render_seconds', 'Time to draw and store a QR image that was not cached yet', ['format']
+)
+SIGNATURE_CHECKS = Counter(
+    'unipay_signature_checks_total', 'QR and receipt signature verifications', ['purpose', 'result']
+)
+SIGNATURE_CHECK_SECONDS = Histogram(
+    'unipay_signature_check_seconds', 'Time to verify one signature', ['purpose'],
+    buckets=FAST_BUCKETS
+)
+SIGNATURE_BATCH_CHECK_SECONDS = Histogram(
+    'unipay_signature_batch_check_seconds', 'Time to verify a batch of signatures (rapid scan, offline sync)',
+    ['purpose'], buckets=FAST_BUCKETS
+)
+PAYMENTS = Counter(
+    'unipay_payments_total', 'Payments recorded', ['organization', 'method', 'channel']
+)
+PAYMENT_PROCESSING_SECONDS = Histogram(
+    'unipay_payment_processing_seconds',
+    'Time to record a payment with its receipt (booth, offline), or one rapid-scan batch',
+    ['organization', 'channel']
+)
+RECEIPTS = Counter(
+    'unipay_receipts_created_total', 'Receipts created', ['organization']
+)
+RECEIPT_CREATION_SECONDS = Histogram(
+    'unipay_receipt_creation_seconds', 'Time to create a receipt (or a rapid-scan batch of them) and its QR'
+)
+EMAILS = Counter(
+    'unipay_emails_total', 'Receipt emails handed to the mail backend, by outcome', ['result']
+)
+EMAIL_SEND_SECONDS = Histogram(
+    'unipay_email_send_seconds', 'Time to send one email over an open connection'
+)
+BULK_POSTING_REQUESTS = Counter(
+    'unipay_bulk_posting_requests_total', 'Students reached by bulk postings, by outcome', ['organization', 'result']
+)
+BULK_POSTING_SECONDS = Histogram(
+    'unipay_bulk_posting_seconds', 'Time to post a fee to students in bulk', ['organization'], buckets=SLOW_BUCKETS
+)
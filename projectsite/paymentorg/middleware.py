@@ -0,0 +1,68 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .models import begin_current_period_memo, end_current_period_memo
+from .sql_profiling import QueryRecorder, profile_buffer, server_timing
+
+logger = logging.getLogger(__name__)
+
+
+class CurrentPeriodMiddleware:
+    """
+    Memoize AcademicYearConfig.get_current() for the duration of a request,
+    so views, models and forms resolve the current period at most once.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = begin_current_period_memo()
+        try:
+            return self.get_response(request)
+        finally:
+            end_current_period_memo(token)
+
+
+class SQLProfilingMiddleware:
+    """
+    Record query count, DB time and repeated statements of each request
+    (see paymentorg/sql_profiling.py). Disabled unless SQL_PROFILING_ENABLED
+    is set, in which case Django drops it from the middleware chain.
+    Every sampled request goes to the ring buffer; the Server-Timing header
+    (DB time and call sites) is only sent to staff users.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'SQL_PROFILING_SAMPLE_RATE', 1.0)
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        profile = recorder.profile(request, response, time.perf_counter() - started)
+        profile_buffer.add(profile)
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            timing = server_timing(profile)
+            if response.has_header('Server-Timing'):
+                timing = f"{response['Server-Timing']}, {timing}"
+            response['Server-Timing'] = timing
+        if profile['n_plus_one']:
+            worst = profile['repeated'][0]
+            logger.warning(
+                f"Possible N+1 in {profile['method']} {profile['path']}: {worst['count']}x at {worst['site']}: "
+                f"{worst['sql']}"
+            )
+        return response
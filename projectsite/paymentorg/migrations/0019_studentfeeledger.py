@@ -0,0 +1,86 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_fee_ledger(apps, schema_editor):
+    Student = apps.get_model('paymentorg', 'Student')
+    FeeType = apps.get_model('paymentorg', 'FeeType')
+    Payment = apps.get_model('paymentorg', 'Payment')
+    PaymentRequest = apps.get_model('paymentorg', 'PaymentRequest')
+    StudentFeeLedger = apps.get_model('paymentorg', 'StudentFeeLedger')
+
+    tier1_fees = {}
+    tier2_fees = []
+    for fee in FeeType.objects.filter(is_active=True).select_related('organization'):
+        if fee.organization.fee_tier == 'TIER_1':
+            tier1_fees.setdefault(fee.organization.program_affiliation, []).append(fee)
+        elif fee.organization.fee_tier == 'TIER_2':
+            tier2_fees.append(fee)
+
+    # Latest payment / pending request per (student, fee) wins
+    payment_map = {
+        (student_id, fee_type_id): payment_id
+        for student_id, fee_type_id, payment_id in
+        Payment.objects.filter(status='COMPLETED', is_void=False)
+        .order_by('created_at').values_list('student_id', 'fee_type_id', 'id')
+    }
+    pending_map = {
+        (student_id, fee_type_id): request_id
+        for student_id, fee_type_id, request_id in
+        PaymentRequest.objects.filter(status='PENDING')
+        .order_by('created_at').values_list('student_id', 'fee_type_id', 'id')
+    }
+
+    rows = []
+    for student in Student.objects.exclude(course__isnull=True).select_related('course'):
+        for fee in tier1_fees.get(student.course.program_type, []) + tier2_fees:
+            levels = (fee.applicable_year_levels or '').lower()
+            if levels != 'all' and str(student.year_level) not in levels:
+                continue
+            key = (student.id, fee.id)
+            payment_id = payment_map.get(key)
+            pending_id = pending_map.get(key)
+            rows.append(StudentFeeLedger(
+                student_id=student.id,
+                fee_type_id=fee.id,
+                status='PAID' if payment_id else 'PENDING' if pending_id else 'UNPAID',
+                amount=fee.amount,
+                payment_id=payment_id,
+                pending_request_id=pending_id,
+            ))
+    StudentFeeLedger.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paymentorg', '0018_add_profile_picture'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentFeeLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Is Active')),
+                ('status', models.CharField(choices=[('UNPAID', 'Unpaid'), ('PENDING', 'Pending'), ('PAID', 'Paid')], default='UNPAID', max_length=20, verbose_name='Status')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Amount (₱)')),
+                ('fee_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='paymentorg.feetype', verbose_name='Fee Type')),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='paymentorg.payment', verbose_name='Payment')),
+                ('pending_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='paymentorg.paymentrequest', verbose_name='Pending Request')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_ledger', to='paymentorg.student', verbose_name='Student')),
+            ],
+            options={
+                'verbose_name': 'Student Fee Ledger Entry',
+                'verbose_name_plural': 'Student Fee Ledger',
+                'ordering': ['student', 'fee_type'],
+                'indexes': [models.Index(fields=['student', 'status'], name='paymentorg__student_5a8a96_idx'), models.Index(fields=['fee_type', 'status'], name='paymentorg__fee_typ_6c3851_idx')],
+                'unique_together': {('student', 'fee_type')},
+            },
+        ),
+        migrations.RunPython(backfill_fee_ledger, migrations.RunPython.noop),
+    ]
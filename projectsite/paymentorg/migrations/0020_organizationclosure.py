@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_organization_closure(apps, schema_editor):
+    Organization = apps.get_model('paymentorg', 'Organization')
+    OrganizationClosure = apps.get_model('paymentorg', 'OrganizationClosure')
+
+    parents = dict(Organization.objects.values_list('id', 'parent_organization_id'))
+    rows = []
+    for organization_id in parents:
+        ancestor_id, depth, seen = organization_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append(OrganizationClosure(ancestor_id=ancestor_id, descendant_id=organization_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    OrganizationClosure.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paymentorg', '0019_studentfeeledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Is Active')),
+                ('depth', models.PositiveIntegerField(default=0, verbose_name='Depth')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='paymentorg.organization', verbose_name='Ancestor')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='paymentorg.organization', verbose_name='Descendant')),
+            ],
+            options={
+                'verbose_name': 'Organization Closure',
+                'verbose_name_plural': 'Organization Closure',
+                'ordering': ['ancestor', 'depth'],
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='paymentorg__ancesto_164d1e_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(backfill_organization_closure, migrations.RunPython.noop),
+    ]
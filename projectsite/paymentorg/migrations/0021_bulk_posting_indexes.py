@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paymentorg', '0020_organizationclosure'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['student', 'fee_type'], name='paymentorg__student_e7281c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentrequest',
+            index=models.Index(fields=['student', 'fee_type', 'status'], name='paymentorg__student_b47d08_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paymentorg', '0023_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='or_serial',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='OR Serial'),
+        ),
+        migrations.CreateModel(
+            name='ORSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Is Active')),
+                ('academic_year', models.CharField(help_text='e.g., 2024-2025', max_length=20, verbose_name='Academic Year')),
+                ('next_number', models.PositiveIntegerField(default=1, verbose_name='Next Unreserved Number')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='or_sequences', to='paymentorg.organization', verbose_name='Organization')),
+            ],
+            options={
+                'verbose_name': 'OR Sequence',
+                'verbose_name_plural': 'OR Sequences',
+                'ordering': ['organization__code', '-academic_year'],
+                'unique_together': {('organization', 'academic_year')},
+            },
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='or_sequence',
+            field=models.ForeignKey(blank=True, help_text='Blank for OR numbers issued before sequential numbering', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payments', to='paymentorg.orsequence', verbose_name='OR Sequence'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='payment',
+            unique_together={('or_sequence', 'or_serial')},
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:22
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_collections(apps, schema_editor):
+    Payment = apps.get_model('paymentorg', 'Payment')
+    OrgDailyCollection = apps.get_model('paymentorg', 'OrgDailyCollection')
+
+    void = Q(is_void=True)
+    rows = (
+        Payment.objects.annotate(day=TruncDate('created_at'))
+        .order_by()
+        .values('organization_id', 'day', 'payment_method')
+        .annotate(
+            payment_count=Count('id'),
+            amount_total=Sum('amount'),
+            void_count=Count('id', filter=void),
+            void_total=Sum('amount', filter=void),
+        )
+    )
+    OrgDailyCollection.objects.bulk_create([
+        OrgDailyCollection(
+            organization_id=row['organization_id'],
+            date=row['day'],
+            payment_method=row['payment_method'],
+            payment_count=row['payment_count'],
+            amount_total=row['amount_total'] or Decimal('0.00'),
+            void_count=row['void_count'],
+            void_total=row['void_total'] or Decimal('0.00'),
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paymentorg', '0024_orsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrgDailyCollection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Is Active')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='Payment Method')),
+                ('payment_count', models.PositiveIntegerField(default=0, verbose_name='Payments')),
+                ('amount_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Amount (₱)')),
+                ('void_count', models.PositiveIntegerField(default=0, verbose_name='Voided')),
+                ('void_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Voided Amount (₱)')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_collections', to='paymentorg.organization', verbose_name='Organization')),
+            ],
+            options={
+                'verbose_name': 'Daily Collection',
+                'verbose_name_plural': 'Daily Collections',
+                'ordering': ['-date', 'organization', 'payment_method'],
+                'indexes': [models.Index(fields=['date'], name='paymentorg__date_c456c8_idx')],
+                'unique_together': {('organization', 'date', 'payment_method')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_collections, migrations.RunPython.noop),
+    ]
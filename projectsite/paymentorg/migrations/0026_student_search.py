@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:54
+
+import django.db.models.deletion
+import re
+from django.db import migrations, models
+
+
+def backfill_student_search_terms(apps, schema_editor):
+    Student = apps.get_model('paymentorg', 'Student')
+    StudentSearchTerm = apps.get_model('paymentorg', 'StudentSearchTerm')
+
+    word = re.compile(r'[^\W_]+')
+    rows = []
+    for student in Student.objects.order_by().iterator(chunk_size=2000):
+        text = ' '.join(filter(None, [
+            student.student_id_number, student.first_name, student.middle_name, student.last_name, student.email,
+        ]))
+        rows.extend(
+            StudentSearchTerm(student_id=student.id, term=term)
+            for term in {term[:100] for term in word.findall(text.lower())}
+        )
+    StudentSearchTerm.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paymentorg', '0025_orgdailycollection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Is Active')),
+                ('term', models.CharField(max_length=100, verbose_name='Term')),
+            ],
+            options={
+                'verbose_name': 'Student Search Term',
+                'verbose_name_plural': 'Student Search Terms',
+                'ordering': ['term'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='paymentorg__last_na_7de412_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['course', 'last_name', 'first_name', 'id'], name='paymentorg__course__f0eac2_idx'),
+        ),
+        migrations.AddField(
+            model_name='studentsearchterm',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='paymentorg.student', verbose_name='Student'),
+        ),
+        migrations.AddIndex(
+            model_name='studentsearchterm',
+            index=models.Index(fields=['term', 'student'], name='paymentorg__term_f53cbe_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='studentsearchterm',
+            unique_together={('student', 'term')},
+        ),
+        migrations.RunPython(backfill_student_search_terms, migrations.RunPython.noop),
+    ]
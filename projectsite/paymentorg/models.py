@@ -2,10 +2,21 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from django.utils import timezone
+from django.core.cache import cache
+from django.conf import settings
+from datetime import timedelta
 from decimal import Decimal
+from contextvars import ContextVar
+import logging
+import re
+import threading
+import time
 import uuid
+from . import metrics
 from django.db.models import Sum
 
+logger = logging.getLogger(__name__)
+
 class BaseModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True,verbose_name="Created At")
     updated_at = models.DateTimeField(auto_now=True,verbose_name="Updated At")
@@ -15,6 +26,28 @@ class BaseModel(models.Model):
         abstract = True
         ordering = ['-created_at']
 
+
+class LedgerStateMixin:
+    """
+    Tracks the LEDGER_FIELDS a model had when loaded so the StudentFeeLedger
+    signals can skip saves that don't change who owes what.
+    """
+    LEDGER_FIELDS = []
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_ledger_state = instance.get_ledger_state()
+        return instance
+
+    def get_ledger_state(self):
+        """Values of LEDGER_FIELDS; deferred fields read as None so they count as changed"""
+        return tuple(self.__dict__.get(field) for field in self.LEDGER_FIELDS)
+
+    def ledger_state_changed(self):
+        """True when LEDGER_FIELDS differ from what was loaded (always True for new instances)"""
+        return self.get_ledger_state() != getattr(self, '_loaded_ledger_state', None)
+
 # ============================================
 # UNIFIED USER PROFILE EXTENSION
 # ============================================
@@ -69,7 +102,7 @@ class College(BaseModel):
     def __str__(self):
         return self.name
 
-class Course(BaseModel):
+class Course(LedgerStateMixin, BaseModel):
     """
     Academic programs/courses.
     System supports ONLY these 5 programs: Medical Biology, Marine Biology, 
@@ -96,6 +129,9 @@ class Course(BaseModel):
     )
     description = models.TextField(blank=True, verbose_name="Description")
 
+    # Decides which program-affiliated (tier 1) fees the course's students owe
+    LEDGER_FIELDS = ['program_type']
+
     class Meta:
         verbose_name = "Course/Program"
         verbose_name_plural = "Courses/Programs"
@@ -191,6 +227,11 @@ class Student(BaseModel):
         verbose_name = "Student"
         verbose_name_plural = "Students"
         ordering = ['last_name', 'first_name']
+        indexes = [
+            # keyset pagination of the student list, overall and within an organization's courses
+            models.Index(fields=['last_name', 'first_name', 'id']),
+            models.Index(fields=['course', 'last_name', 'first_name', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.student_id_number} - {self.get_full_name()}"
@@ -266,25 +307,21 @@ class Student(BaseModel):
         
         return all_fees
     
+    def get_fee_ledger(self):
+        """
+        Ledger rows for the current academic year: the same fees as
+        get_applicable_fees(), with their paid/pending status already resolved.
+        """
+        current_period = self._get_current_period()
+        if not current_period:
+            return StudentFeeLedger.objects.none()
+        return self.fee_ledger.filter(fee_type__academic_year=current_period.academic_year)
+    
     def get_total_outstanding_fees(self):
-        """Calculate total amount of outstanding (unpaid) fees"""
-        fees = self.get_applicable_fees()
-        total_outstanding = Decimal('0.00')
-        
-        # Check each fee individually to match by academic year and semester
-        for fee in fees:
-            # Check if this specific fee (by type, year, semester) has been paid
-            payment_exists = Payment.objects.filter(
-                student=self,
-                fee_type=fee,
-                status='COMPLETED',
-                is_void=False
-            ).exists()
-            
-            if not payment_exists:
-                total_outstanding += fee.amount
-        
-        return total_outstanding
+        """Calculate total amount of outstanding (unpaid) fees for the current academic year"""
+        # Read from the materialized ledger instead of checking each fee individually
+        total = self.get_fee_ledger().exclude(status='PAID').aggregate(total=Sum('amount'))
+        return total['total'] or Decimal('0.00')
     
     def get_tier1_fees(self):
         """Get Tier 1 (Program-specific) fees - all semesters for current academic year"""
@@ -325,13 +362,8 @@ class Student(BaseModel):
         )
     
     def _get_current_period(self):
-        """Helper method to get current academic period"""
-        try:
-            return AcademicYearConfig.objects.get(is_current=True)
-        except AcademicYearConfig.DoesNotExist:
-            return None
-        except AcademicYearConfig.MultipleObjectsReturned:
-            return AcademicYearConfig.objects.filter(is_current=True).order_by('-start_date').first()
+        """Helper method to get current academic period (cached)"""
+        return AcademicYearConfig.get_current()
 
 
 class Officer(BaseModel):
@@ -426,7 +458,7 @@ def unset_user_profile_officer(sender, instance, **kwargs):
 # ORGANIZATION & FEE MODELS
 # ============================================
 
-class Organization(BaseModel):
+class Organization(LedgerStateMixin, BaseModel):
     """
     Student organizations that collect fees.
     Supports two-tiered fee system:
@@ -530,6 +562,9 @@ class Organization(BaseModel):
         help_text="e.g., Ground Floor, Main Building"
     )
 
+    # Decide which students owe the organization's fees
+    LEDGER_FIELDS = ['fee_tier', 'program_affiliation']
+
     class Meta:
         verbose_name = "Organization"
         verbose_name_plural = "Organizations"
@@ -548,6 +583,44 @@ class Organization(BaseModel):
         if self.fee_tier == 'TIER_2' and self.program_affiliation and self.program_affiliation != 'ALL':
             # Tier 2 should typically be for all programs, but allow flexibility
             pass
+        if self.creates_hierarchy_cycle():
+            raise ValidationError({
+                'parent_organization': 'An organization cannot be placed under itself or one of its child organizations.'
+            })
+
+    def creates_hierarchy_cycle(self):
+        """Check if parent_organization is this org or one of its descendants"""
+        if not self.parent_organization_id or not self.pk:
+            return False
+        if self.parent_organization_id == self.pk:
+            return True
+        return OrganizationClosure.objects.filter(
+            ancestor_id=self.pk,
+            descendant_id=self.parent_organization_id
+        ).exists()
+
+    def save(self, *args, **kwargs):
+        """Reject hierarchy cycles and keep OrganizationClosure in sync with parent_organization"""
+        from django.core.exceptions import ValidationError
+        from django.db import transaction
+        
+        is_new = self.pk is None
+        old_parent_id = None
+        if not is_new:
+            old_parent_id = Organization.objects.filter(pk=self.pk).values_list(
+                'parent_organization_id', flat=True
+            ).first()
+        parent_changed = is_new or old_parent_id != self.parent_organization_id
+        
+        if parent_changed and self.creates_hierarchy_cycle():
+            raise ValidationError({
+                'parent_organization': 'An organization cannot be placed under itself or one of its child organizations.'
+            })
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if parent_changed:
+                OrganizationClosure.attach(self)
 
     def get_active_fees_count(self):
         """Get count of active fee types"""
@@ -555,40 +628,74 @@ class Organization(BaseModel):
 
     def get_total_collected(self):
         """Get total amount collected (excluding voided payments)"""
-        total = self.payments.filter(status='COMPLETED', is_void=False).aggregate(
-            total=models.Sum('amount')
-        )
-        return total['total'] or Decimal('0.00')
+        return OrgDailyCollection.net_collected(organization=self)
 
     def get_today_collection(self):
         """Get today's total collection (excluding voided payments)"""
-        today = timezone.now().date()
-        total = self.payments.filter(
-            status='COMPLETED',
-            is_void=False,
-            created_at__date=today
-        ).aggregate(total=models.Sum('amount'))
-        return total['total'] or Decimal('0.00')
+        return OrgDailyCollection.net_collected(organization=self, date=timezone.localdate())
 
     def get_pending_requests_count(self):
         """Get count of pending payment requests"""
         return self.payment_requests.filter(status='PENDING').count()
     
     def get_all_child_organizations(self):
-        """Get all child organizations recursively (for parent-level orgs)"""
-        children = list(self.child_organizations.all())
-        for child in list(self.child_organizations.all()):
-            children.extend(child.get_all_child_organizations())
-        return children
+        """Get all child organizations recursively (for parent-level orgs), nearest first"""
+        return list(
+            Organization.objects.filter(
+                ancestor_links__ancestor=self,
+                ancestor_links__depth__gt=0
+            ).order_by('ancestor_links__depth', 'name')
+        )
     
+    def get_member_filter(self):
+        """
+        Q over Student selecting the members of this organization and its
+        children, with the rules bulk posting uses: Tier 1 organizations take
+        the students of their program (Course.program_type), Tier 2
+        organizations the students whose college is named in `department`.
+        An organization matching neither (no program, unknown department)
+        adds no one, so the filter fails closed.
+        """
+        program_types, college_names = set(), set()
+        for fee_tier, program_affiliation, department in Organization.objects.filter(
+            id__in=self.get_accessible_organization_ids()
+        ).values_list('fee_tier', 'program_affiliation', 'department'):
+            if fee_tier == 'TIER_1':
+                if program_affiliation and program_affiliation != 'ALL':
+                    program_types.add(program_affiliation)
+            elif department:
+                college_names.add(department)
+        course_ids = list(Course.objects.filter(program_type__in=program_types).values_list('id', flat=True))
+        college_ids = list(College.objects.filter(name__in=college_names).values_list('id', flat=True))
+        return models.Q(course_id__in=course_ids) | models.Q(college_id__in=college_ids)
+
+    def get_member_students(self, queryset=None):
+        """Narrow `queryset` (all students by default) to this organization's members"""
+        if queryset is None:
+            queryset = Student.objects.all()
+        return queryset.filter(self.get_member_filter())
+
+    def has_member(self, student):
+        """Check if the student belongs to this organization or one of its children"""
+        return Student.objects.filter(self.get_member_filter(), pk=student.pk).exists()
+
     def get_accessible_organizations(self):
         """Get this organization and all its children (if any)"""
         return [self] + self.get_all_child_organizations()
     
     def get_accessible_organization_ids(self):
-        """Get list of organization IDs accessible from this org (self + children)"""
-        orgs = self.get_accessible_organizations()
-        return [org.id for org in orgs]
+        """Get list of organization IDs accessible from this org (self + children), cached"""
+        cache_key = OrganizationClosure.accessible_ids_cache_key(self.pk)
+        org_ids = cache.get(cache_key)
+        if org_ids is None:
+            org_ids = [self.pk] + list(
+                OrganizationClosure.objects.filter(
+                    ancestor_id=self.pk,
+                    depth__gt=0
+                ).order_by('depth').values_list('descendant_id', flat=True)
+            )
+            cache.set(cache_key, org_ids, getattr(settings, 'ORG_HIERARCHY_CACHE_TIMEOUT', 300))
+        return list(org_ids)
     
     def get_logo_path(self):
         """Get the static path to the organization logo"""
@@ -622,7 +729,102 @@ class Organization(BaseModel):
             return f"{settings.STATIC_URL}{logo_filename}"
 
 
-class FeeType(BaseModel):
+class OrganizationClosure(BaseModel):
+    """
+    Transitive closure of the organization hierarchy: one row per
+    (ancestor, descendant) pair including the depth-0 self row.
+    Maintained by Organization.save(); rebuild() repairs it from scratch.
+    """
+    ancestor = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='descendant_links',
+        verbose_name="Ancestor"
+    )
+    descendant = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='ancestor_links',
+        verbose_name="Descendant"
+    )
+    depth = models.PositiveIntegerField(default=0, verbose_name="Depth")
+
+    class Meta:
+        verbose_name = "Organization Closure"
+        verbose_name_plural = "Organization Closure"
+        ordering = ['ancestor', 'depth']
+        unique_together = ['ancestor', 'descendant']
+        indexes = [
+            models.Index(fields=['ancestor', 'depth']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+    VERSION_CACHE_KEY = 'paymentorg:org_hierarchy_version'
+
+    @classmethod
+    def accessible_ids_cache_key(cls, organization_id):
+        version = cache.get_or_set(cls.VERSION_CACHE_KEY, 1, None)
+        return f'paymentorg:org_accessible_ids:{version}:{organization_id}'
+
+    @classmethod
+    def invalidate_cache(cls):
+        """Invalidate every cached accessible_ids list by bumping the hierarchy version"""
+        try:
+            cache.incr(cls.VERSION_CACHE_KEY)
+        except ValueError:
+            cache.set(cls.VERSION_CACHE_KEY, 2, None)
+
+    @classmethod
+    def attach(cls, organization):
+        """(Re)link an organization and its subtree under its current parent"""
+        subtree = list(
+            cls.objects.filter(ancestor=organization).values_list('descendant_id', 'depth')
+        )
+        if not subtree:
+            cls.objects.create(ancestor=organization, descendant=organization, depth=0)
+            subtree = [(organization.pk, 0)]
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+
+        # Drop links from the old ancestors into the subtree
+        cls.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+
+        if organization.parent_organization_id:
+            parent_ancestors = cls.objects.filter(
+                descendant_id=organization.parent_organization_id
+            ).values_list('ancestor_id', 'depth')
+            cls.objects.bulk_create([
+                cls(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+                for ancestor_id, ancestor_depth in parent_ancestors
+                for descendant_id, depth in subtree
+            ], batch_size=500)
+        cls.invalidate_cache()
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute the whole closure from parent_organization; returns the row count"""
+        parents = dict(Organization.objects.values_list('id', 'parent_organization_id'))
+        rows = []
+        for organization_id in parents:
+            ancestor_id, depth, seen = organization_id, 0, set()
+            while ancestor_id is not None and ancestor_id not in seen:
+                seen.add(ancestor_id)
+                rows.append(cls(ancestor_id=ancestor_id, descendant_id=organization_id, depth=depth))
+                ancestor_id, depth = parents.get(ancestor_id), depth + 1
+        cls.objects.all().delete()
+        cls.objects.bulk_create(rows, batch_size=500)
+        cls.invalidate_cache()
+        return len(rows)
+
+
+@receiver(post_delete, sender=Organization)
+def rebuild_organization_closure(sender, instance, **kwargs):
+    """Children of a deleted org are re-parented to NULL without save(); rebuild the closure."""
+    OrganizationClosure.rebuild()
+
+
+class FeeType(LedgerStateMixin, BaseModel):
     """
     Types of fees collected by organizations
     """
@@ -698,6 +900,14 @@ class FeeType(BaseModel):
             return timezone.now().date() > self.deadline
         return False
 
+    def applies_to_year_level(self, year_level):
+        """Python equivalent of the applicable_year_levels filter in Student.get_applicable_fees"""
+        levels = (self.applicable_year_levels or '').lower()
+        return levels == 'all' or str(year_level).lower() in levels
+
+    # Fields that decide which students owe this fee and how much
+    LEDGER_FIELDS = ['organization_id', 'amount', 'applicable_year_levels', 'is_active']
+
 
 # ============================================
 # PAYMENT MODELS
@@ -808,6 +1018,7 @@ class PaymentRequest(BaseModel):
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['student', 'status']),
+            models.Index(fields=['student', 'fee_type', 'status']),
         ]
 
     def __str__(self):
@@ -822,16 +1033,103 @@ class PaymentRequest(BaseModel):
         """Expiration disabled: no-op."""
         return 0
 
-    def mark_as_paid(self):
-        """Update status to paid"""
+    def mark_as_paid(self, paid_at=None):
+        """
+        PENDING -> PAID as one conditional UPDATE; `paid_at` is the booth's time
+        for payments recorded offline. Returns False, changing nothing, when the
+        row is no longer PENDING (another officer got there first). The UPDATE
+        holds the row lock until commit, so concurrent callers wait for it and
+        then see the new status. The caller writes the status record once the
+        Payment exists (cache_status_on_commit).
+        """
+        paid_at = paid_at or timezone.now()
+        claimed = PaymentRequest.objects.filter(pk=self.pk, status='PENDING').update(
+            status='PAID',
+            paid_at=paid_at,
+            updated_at=timezone.now()
+        )
+        if not claimed:
+            return False
         self.status = 'PAID'
-        self.paid_at = timezone.now()
-        self.save()
+        self.paid_at = paid_at
+        return True
 
     def mark_as_cancelled(self):
         """Update status to cancelled"""
         self.status = 'CANCELLED'
         self.save()
+        self.cache_status_on_commit()
+
+    # Tiny per-request status record read by PaymentRequestStatusAPI
+    STATUS_CACHE_KEY = 'paymentorg:request_status:{}'
+
+    @classmethod
+    def status_cache_key(cls, request_id):
+        return cls.STATUS_CACHE_KEY.format(request_id)
+
+    @staticmethod
+    def status_cache_timeout(status):
+        """
+        PAID, CANCELLED and EXPIRED never change again and are cached long;
+        PENDING only briefly, since a per-process cache is not told when another
+        worker settles the request
+        """
+        if status == 'PENDING':
+            return settings.PAYMENT_REQUEST_PENDING_STATUS_CACHE_TIMEOUT
+        return settings.PAYMENT_REQUEST_STATUS_CACHE_TIMEOUT
+
+    @classmethod
+    def get_cached_status(cls, request_id):
+        """
+        {'status', 'user_id', 'payment_id'} for a request: from the cache, else
+        one values() query. Returns None if the request does not exist.
+        """
+        key = cls.status_cache_key(request_id)
+        record = cache.get(key)
+        if record is None:
+            row = cls.objects.filter(request_id=request_id).values(
+                'status', 'student__user_id', 'payment__id'
+            ).first()
+            if row is None:
+                return None
+            record = {'status': row['status'], 'user_id': row['student__user_id'], 'payment_id': row['payment__id']}
+            # add(), not set(): never overwrite a record written by a commit that raced this read
+            cache.add(key, record, cls.status_cache_timeout(record['status']))
+        return record
+
+    def cache_status_on_commit(self):
+        """Write this request's status record once the new status is committed"""
+        self.cache_statuses_on_commit([self])
+
+    @classmethod
+    def cache_statuses_on_commit(cls, payment_requests):
+        """Write the status records of several requests in one cache round-trip once committed"""
+        from django.db import transaction
+        # grouped by timeout so PENDING and settled records expire differently
+        records = {}
+        for payment_request in payment_requests:
+            try:
+                payment_id = payment_request.payment.id
+            except Payment.DoesNotExist:
+                payment_id = None
+            timeout = cls.status_cache_timeout(payment_request.status)
+            records.setdefault(timeout, {})[cls.status_cache_key(payment_request.request_id)] = {
+                'status': payment_request.status,
+                'user_id': payment_request.student.user_id,
+                'payment_id': payment_id,
+            }
+
+        def write():
+            for timeout, group in records.items():
+                cache.set_many(group, timeout)
+        transaction.on_commit(write)
+
+    @classmethod
+    def forget_cached_statuses(cls, request_ids):
+        """Drop status records after a queryset update() that bypassed save()"""
+        from django.db import transaction
+        keys = [cls.status_cache_key(request_id) for request_id in request_ids]
+        transaction.on_commit(lambda: cache.delete_many(keys))
 
     def get_time_remaining(self):
         """Get human-readable time remaining"""
@@ -840,6 +1138,77 @@ class PaymentRequest(BaseModel):
         return "Completed"
 
 
+class ORSequence(BaseModel):
+    """
+    Official receipt number series of one organization for one academic year.
+    next_number is the high-water mark of serials reserved in blocks by
+    paymentorg.or_numbers; serials at or above it have never been handed out.
+    """
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='or_sequences',
+        verbose_name="Organization"
+    )
+    academic_year = models.CharField(
+        max_length=20,
+        verbose_name="Academic Year",
+        help_text="e.g., 2024-2025"
+    )
+    next_number = models.PositiveIntegerField(
+        default=1,
+        verbose_name="Next Unreserved Number"
+    )
+
+    class Meta:
+        verbose_name = "OR Sequence"
+        verbose_name_plural = "OR Sequences"
+        ordering = ['organization__code', '-academic_year']
+        unique_together = ['organization', 'academic_year']
+
+    def __str__(self):
+        return f"{self.organization.code} {self.academic_year} (next {self.next_number})"
+
+    @staticmethod
+    def format_or_number(organization_code, academic_year, serial):
+        return f"OR-{organization_code}-{academic_year}-{serial:06d}"
+
+    @classmethod
+    def reserve_block(cls, sequence_id, size):
+        """
+        Move the high-water mark up by `size` with a conditional UPDATE and
+        return the first serial of the reserved block. Retries when another
+        worker reserved a block in between.
+        """
+        while True:
+            start = cls.objects.filter(pk=sequence_id).values_list('next_number', flat=True).get()
+            if cls.objects.filter(pk=sequence_id, next_number=start).update(
+                next_number=start + size,
+                updated_at=timezone.now()
+            ):
+                return start
+
+    def find_gaps(self):
+        """
+        Missing serials as (first, last) ranges, split into gaps below the
+        highest issued serial and the reserved-but-unissued tail (numbers
+        still held by running workers, or left over when one stopped).
+        """
+        issued = list(
+            self.payments.filter(or_serial__isnull=False)
+            .order_by('or_serial')
+            .values_list('or_serial', flat=True)
+        )
+        gaps = []
+        expected = 1
+        for serial in issued:
+            if serial > expected:
+                gaps.append((expected, serial - 1))
+            expected = serial + 1
+        tail = (expected, self.next_number - 1) if self.next_number > expected else None
+        return {'issued': len(issued), 'gaps': gaps, 'unissued_tail': tail}
+
+
 class Payment(BaseModel):
     """
     Actual payment record after cash is received
@@ -899,6 +1268,20 @@ class Payment(BaseModel):
         unique=True,
         verbose_name="Official Receipt Number"
     )
+    or_sequence = models.ForeignKey(
+        ORSequence,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='payments',
+        verbose_name="OR Sequence",
+        help_text="Blank for OR numbers issued before sequential numbering"
+    )
+    or_serial = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="OR Serial"
+    )
     
     # Payment Details
     payment_method = models.CharField(
@@ -962,9 +1345,11 @@ class Payment(BaseModel):
         verbose_name = "Payment"
         verbose_name_plural = "Payments"
         ordering = ['-created_at']
+        unique_together = ['or_sequence', 'or_serial']
         indexes = [
             models.Index(fields=['or_number']),
             models.Index(fields=['student']),
+            models.Index(fields=['student', 'fee_type']),
             models.Index(fields=['organization']),
             models.Index(fields=['status']),
             models.Index(fields=['created_at']),
@@ -981,12 +1366,15 @@ class Payment(BaseModel):
 
     def mark_as_void(self, officer, reason):
         """Mark payment as void"""
+        was_void = self.is_void
         self.status = 'VOID'
         self.is_void = True
         self.void_reason = reason
         self.voided_by = officer
         self.voided_at = timezone.now()
         self.save()
+        if not was_void:
+            OrgDailyCollection.record([self], voids_only=True)
 
 
 class Receipt(BaseModel):
@@ -1058,6 +1446,19 @@ class Receipt(BaseModel):
     def __str__(self):
         return f"Receipt OR#{self.or_number}"
 
+    def attach_qr_image(self):
+        """
+        Point receipt_qr at the cached verification QR image, drawing it if
+        needed. Called lazily by the receipt/payment detail pages (and by
+        pregenerate_qr_codes --receipts), not while the payment is recorded.
+        """
+        from .qr import get_qr_image, receipt_qr_payload
+        name = get_qr_image(receipt_qr_payload(self))
+        if self.receipt_qr.name != name:
+            Receipt.objects.filter(pk=self.pk).update(receipt_qr=name)
+            self.receipt_qr.name = name
+        return name
+
 
 # ============================================
 # ACTIVITY LOG MODEL
@@ -1127,6 +1528,37 @@ class ActivityLog(BaseModel):
 # ACADEMIC YEAR CONFIGURATION
 # ============================================
 
+CURRENT_PERIOD_CACHE_KEY = 'paymentorg:current_period'
+
+# Per-request memo (set up by CurrentPeriodMiddleware) and process-wide counters
+_current_period_memo = ContextVar('current_period_memo', default=None)
+_current_period_stats_lock = threading.Lock()
+_current_period_stats = {'request_hits': 0, 'cache_hits': 0, 'misses': 0}
+
+
+def _record_current_period_stat(name):
+    with _current_period_stats_lock:
+        _current_period_stats[name] += 1
+
+
+def get_current_period_cache_stats():
+    """Return hit/miss counters for AcademicYearConfig.get_current() in this process"""
+    with _current_period_stats_lock:
+        stats = dict(_current_period_stats)
+    lookups = sum(stats.values())
+    stats['hit_ratio'] = round((stats['request_hits'] + stats['cache_hits']) / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def begin_current_period_memo():
+    """Start request-scoped memoization of the current period; returns a token for end_current_period_memo"""
+    return _current_period_memo.set({})
+
+
+def end_current_period_memo(token):
+    _current_period_memo.reset(token)
+
+
 class AcademicYearConfig(BaseModel):
     """
     Configuration for academic year and semester
@@ -1177,11 +1609,120 @@ class AcademicYearConfig(BaseModel):
         else:
             super().save(*args, **kwargs)
 
+    @classmethod
+    def _load_current(cls):
+        try:
+            return cls.objects.get(is_current=True)
+        except cls.DoesNotExist:
+            return None
+        except cls.MultipleObjectsReturned:
+            return cls.objects.filter(is_current=True).order_by('-start_date').first()
+
+    @classmethod
+    def get_current(cls):
+        """
+        Get the current academic period.
+        Resolved once per request (memo), then from Django's cache framework,
+        and only then from the database. Invalidated on save/delete.
+        """
+        memo = _current_period_memo.get()
+        if memo is not None and 'period' in memo:
+            _record_current_period_stat('request_hits')
+            return memo['period']
+
+        # Stored wrapped in a tuple so a cached "no current period" is not a miss
+        cached = cache.get(CURRENT_PERIOD_CACHE_KEY)
+        if cached is not None:
+            _record_current_period_stat('cache_hits')
+            period = cached[0]
+        else:
+            _record_current_period_stat('misses')
+            period = cls._load_current()
+            cache.set(
+                CURRENT_PERIOD_CACHE_KEY,
+                (period,),
+                getattr(settings, 'CURRENT_PERIOD_CACHE_TIMEOUT', 300)
+            )
+
+        if memo is not None:
+            memo['period'] = period
+        return period
+
+    @classmethod
+    def invalidate_current_cache(cls):
+        """Drop the cached current period (shared cache and this request's memo)"""
+        cache.delete(CURRENT_PERIOD_CACHE_KEY)
+        memo = _current_period_memo.get()
+        if memo is not None:
+            memo.pop('period', None)
+
+
+@receiver(post_save, sender=AcademicYearConfig)
+@receiver(post_delete, sender=AcademicYearConfig)
+def invalidate_current_period_cache(sender, **kwargs):
+    """Invalidate now and again after commit so concurrent readers cannot re-cache the old period."""
+    from django.db import transaction
+    AcademicYearConfig.invalidate_current_cache()
+    transaction.on_commit(AcademicYearConfig.invalidate_current_cache)
+
 
 # ============================================
 # BULK PAYMENT POSTING
 # ============================================
 
+# affiliation helpers
+def normalize_program_affiliation(affiliation):
+    """Map organization program codes (e.g., ESSA, COMSCI, IT) to Course.program_type values.
+    Returns the canonical program_type or None if unknown.
+    """
+    if not affiliation:
+        return None
+    code = str(affiliation).strip().upper()
+    mapping = {
+        # Environmental Studies & Sciences Association
+        'ESSA': 'ENVIRONMENTAL_SCIENCE',
+        'ENVSCI': 'ENVIRONMENTAL_SCIENCE',
+        'ENVIRONMENTAL_SCIENCE': 'ENVIRONMENTAL_SCIENCE',
+        # Computer Science
+        'COMSCI': 'COMPUTER_SCIENCE',
+        'CS': 'COMPUTER_SCIENCE',
+        'COMPUTER_SCIENCE': 'COMPUTER_SCIENCE',
+        # Information Technology
+        'IT': 'INFORMATION_TECHNOLOGY',
+        
+        'INFORMATION_TECHNOLOGY': 'INFORMATION_TECHNOLOGY',
+        # Marine Biology
+        'MARBIO': 'MARINE_BIOLOGY',
+        'MARINE_BIOLOGY': 'MARINE_BIOLOGY',
+        # Medical Biology
+        'MEDBIO': 'MEDICAL_BIOLOGY',
+        'MEDICAL_BIOLOGY': 'MEDICAL_BIOLOGY',
+    }
+    return mapping.get(code)
+
+
+def get_bulk_posting_students(organization, applicable_year_level):
+    """Active students a bulk fee from `organization` should be posted to.
+    Program-level: only students whose course.program_type matches org.program_affiliation.
+    College-level: students in the same college/department.
+    """
+    students = Student.objects.filter(is_active=True)
+    if organization.hierarchy_level == 'PROGRAM':
+        program_type = normalize_program_affiliation(organization.program_affiliation)
+        if program_type:
+            students = students.filter(course__program_type=program_type)
+        else:
+            # If program affiliation is missing or unknown, avoid cross-program posting
+            students = students.none()
+    elif organization.hierarchy_level == 'COLLEGE':
+        # Match by college name to department string
+        students = students.filter(college__name=organization.department)
+
+    if applicable_year_level != 'All':
+        students = students.filter(year_level=applicable_year_level)
+    return students
+
+
 class BulkPaymentPosting(BaseModel):
     """
     Tracks bulk payment fee postings by officers
@@ -1232,3 +1773,1064 @@ class BulkPaymentPosting(BaseModel):
     
     def __str__(self):
         return f"{self.organization.name} - {self.fee_type.name} - ₱{self.amount}"
+
+    @classmethod
+    def post_to_students(cls, students, organization, fee_type, amount, expires_at,
+                         posted_by=None, notes='', chunk_size=None, ip_address=None, progress=None):
+        """
+        Create PENDING payment requests for every student in `students` who has
+        neither a completed payment nor a pending request for `fee_type`.
+        Eligible ids come from one NOT EXISTS query; rows are inserted with
+        bulk_create, one transaction per chunk so the write lock is released
+        between chunks (re-posting only fills in students that were missed).
+        `progress(done, total)` is called after each chunk when given.
+        Returns a dict with the posting and created/skipped/failed counts.
+        """
+        from django.db import transaction
+
+        started = time.perf_counter()
+        chunk_size = max(1, chunk_size or getattr(settings, 'BULK_POSTING_CHUNK_SIZE', 500))
+        # Checked against the source tables, not StudentFeeLedger: the ledger has no
+        # rows for inactive fees or students outside the fee's tier/year levels
+        paid = Payment.objects.filter(
+            student=models.OuterRef('pk'),
+            fee_type=fee_type,
+            status='COMPLETED',
+            is_void=False
+        )
+        pending = PaymentRequest.objects.filter(
+            student=models.OuterRef('pk'),
+            fee_type=fee_type,
+            status='PENDING'
+        )
+        students = students.order_by()
+        total = students.count()
+        eligible_ids = list(
+            students.filter(~models.Exists(paid), ~models.Exists(pending))
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+
+        created_count = 0
+        failed_count = 0
+        for start in range(0, len(eligible_ids), chunk_size):
+            chunk = eligible_ids[start:start + chunk_size]
+            try:
+                with transaction.atomic():
+                    # qr_signature stays empty until the student clicks "Generate QR"
+                    PaymentRequest.objects.bulk_create([
+                        PaymentRequest(
+                            student_id=student_id,
+                            organization=organization,
+                            fee_type=fee_type,
+                            amount=amount,
+                            payment_method='CASH',
+                            status='PENDING',
+                            expires_at=expires_at,
+                            qr_signature='',
+                            created_by=posted_by,
+                            notes=notes
+                        )
+                        for student_id in chunk
+                    ])
+                    # bulk_create skips post_save, so refresh the ledger explicitly
+                    StudentFeeLedger.rebuild(student_ids=chunk, fee_type_ids=[fee_type.id])
+                created_count += len(chunk)
+            except Exception as e:
+                logger.error(
+                    f'Bulk posting chunk of {len(chunk)} requests for {fee_type.name} failed: {str(e)}',
+                    exc_info=True
+                )
+                failed_count += len(chunk)
+            if progress:
+                progress(created_count + failed_count, len(eligible_ids))
+
+        posting = None
+        if created_count > 0:
+            posting = cls.objects.create(
+                organization=organization,
+                fee_type=fee_type,
+                amount=amount,
+                posted_by=posted_by,
+                student_count=created_count,
+                notes=notes
+            )
+
+        ActivityLog.objects.create(
+            user=posted_by,
+            action='bulk_payment_posted',
+            description=(
+                f'Posted bulk payment request for {fee_type.name} to {created_count} students in '
+                f'{organization.name} ({total - len(eligible_ids)} already paid or pending, '
+                f'{failed_count} failed).'
+            ),
+            ip_address=ip_address
+        )
+
+        for result, count in (('created', created_count), ('skipped', total - len(eligible_ids)), ('failed', failed_count)):
+            if count:
+                metrics.BULK_POSTING_REQUESTS.inc(count, organization=organization.code, result=result)
+        metrics.BULK_POSTING_SECONDS.observe(time.perf_counter() - started, organization=organization.code)
+
+        return {
+            'posting': posting,
+            'created': created_count,
+            'skipped': total - len(eligible_ids),
+            'failed': failed_count,
+        }
+
+
+# ============================================
+# STUDENT FEE LEDGER (DENORMALIZED)
+# ============================================
+
+class StudentFeeLedger(BaseModel):
+    """
+    Materialized fee status, one row per (student, applicable fee type).
+    Kept in sync by signals on Payment, PaymentRequest, FeeType and Student;
+    use the rebuild_fee_ledger command for backfill and drift repair.
+    Rows cover every active fee the student is eligible for; filter by
+    fee_type__academic_year to scope to a period.
+    """
+    STATUS_CHOICES = [
+        ('UNPAID', 'Unpaid'),
+        ('PENDING', 'Pending'),
+        ('PAID', 'Paid'),
+    ]
+
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='fee_ledger',
+        verbose_name="Student"
+    )
+
+    fee_type = models.ForeignKey(
+        FeeType,
+        on_delete=models.CASCADE,
+        related_name='ledger_entries',
+        verbose_name="Fee Type"
+    )
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='UNPAID',
+        verbose_name="Status"
+    )
+
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="Amount (₱)"
+    )
+
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Payment"
+    )
+
+    pending_request = models.ForeignKey(
+        PaymentRequest,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Pending Request"
+    )
+
+    class Meta:
+        verbose_name = "Student Fee Ledger Entry"
+        verbose_name_plural = "Student Fee Ledger"
+        ordering = ['student', 'fee_type']
+        unique_together = ['student', 'fee_type']
+        indexes = [
+            models.Index(fields=['student', 'status']),
+            models.Index(fields=['fee_type', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.fee_type_id} - {self.status}"
+
+    @classmethod
+    def rebuild(cls, student_ids=None, fee_type_ids=None):
+        """
+        Recompute ledger rows for the given students and/or fee types
+        (everything when both are None) and apply the difference.
+        Returns a (created, updated, deleted) tuple.
+        """
+        students = Student.objects.exclude(course__isnull=True).select_related('course')
+        fees = FeeType.objects.filter(is_active=True).select_related('organization')
+        payments = Payment.objects.filter(status='COMPLETED', is_void=False)
+        pending = PaymentRequest.objects.filter(status='PENDING')
+        existing = cls.objects.all()
+
+        if student_ids is not None:
+            students = students.filter(id__in=student_ids)
+            payments = payments.filter(student_id__in=student_ids)
+            pending = pending.filter(student_id__in=student_ids)
+            existing = existing.filter(student_id__in=student_ids)
+        if fee_type_ids is not None:
+            fees = fees.filter(id__in=fee_type_ids)
+            payments = payments.filter(fee_type_id__in=fee_type_ids)
+            pending = pending.filter(fee_type_id__in=fee_type_ids)
+            existing = existing.filter(fee_type_id__in=fee_type_ids)
+
+        # Group fees so each student is only checked against candidate fees
+        tier1_fees = {}
+        tier2_fees = []
+        for fee in fees:
+            if fee.organization.fee_tier == 'TIER_1':
+                tier1_fees.setdefault(fee.organization.program_affiliation, []).append(fee)
+            elif fee.organization.fee_tier == 'TIER_2':
+                tier2_fees.append(fee)
+
+        if student_ids is None and fee_type_ids is not None:
+            # Rebuilding a few fees: only visit students they can apply to.
+            # Rows of students outside this set are removed through `existing`.
+            fee_list = list(fees)
+            if not tier2_fees:
+                students = students.filter(course__program_type__in=list(tier1_fees))
+            if not fee_list:
+                students = students.none()
+            elif not any((fee.applicable_year_levels or '').lower() == 'all' for fee in fee_list):
+                year_levels = Student.objects.order_by().values_list('year_level', flat=True).distinct()
+                students = students.filter(year_level__in=[
+                    year_level for year_level in year_levels
+                    if any(fee.applies_to_year_level(year_level) for fee in fee_list)
+                ])
+
+        # Latest payment / pending request per (student, fee) wins, matching .first()
+        payment_map = {
+            (student_id, fee_type_id): payment_id
+            for student_id, fee_type_id, payment_id in
+            payments.order_by('created_at').values_list('student_id', 'fee_type_id', 'id')
+        }
+        pending_map = {
+            (student_id, fee_type_id): request_id
+            for student_id, fee_type_id, request_id in
+            pending.order_by('created_at').values_list('student_id', 'fee_type_id', 'id')
+        }
+
+        desired = {}
+        for student in students:
+            candidates = tier1_fees.get(student.course.program_type, []) + tier2_fees
+            for fee in candidates:
+                if not fee.applies_to_year_level(student.year_level):
+                    continue
+                key = (student.id, fee.id)
+                payment_id = payment_map.get(key)
+                pending_id = pending_map.get(key)
+                if payment_id:
+                    status = 'PAID'
+                elif pending_id:
+                    status = 'PENDING'
+                else:
+                    status = 'UNPAID'
+                desired[key] = (status, fee.amount, payment_id, pending_id)
+
+        to_create, to_update, to_delete = [], [], []
+        for entry in existing:
+            key = (entry.student_id, entry.fee_type_id)
+            values = desired.pop(key, None)
+            if values is None:
+                to_delete.append(entry.id)
+            elif values != (entry.status, entry.amount, entry.payment_id, entry.pending_request_id):
+                entry.status, entry.amount, entry.payment_id, entry.pending_request_id = values
+                to_update.append(entry)
+        for (student_id, fee_type_id), (status, amount, payment_id, pending_id) in desired.items():
+            to_create.append(cls(
+                student_id=student_id,
+                fee_type_id=fee_type_id,
+                status=status,
+                amount=amount,
+                payment_id=payment_id,
+                pending_request_id=pending_id,
+            ))
+
+        if to_delete:
+            cls.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            now = timezone.now()
+            for entry in to_update:
+                entry.updated_at = now
+            cls.objects.bulk_update(
+                to_update,
+                ['status', 'amount', 'payment', 'pending_request', 'updated_at'],
+                batch_size=500
+            )
+        if to_create:
+            cls.objects.bulk_create(to_create, batch_size=500)
+        return len(to_create), len(to_update), len(to_delete)
+
+
+class OrgDailyCollection(BaseModel):
+    """
+    Per organization, day and payment method: payments taken and how many of
+    them were later voided, bucketed by the local date the payment was made.
+    Net collection is amount_total - void_total. Maintained incrementally when
+    payments are created, voided (mark_as_void) or deleted; use the
+    rebuild_daily_collections command for backfill and drift repair (e.g.
+    after editing a payment's amount in the admin).
+    """
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='daily_collections',
+        verbose_name="Organization"
+    )
+
+    date = models.DateField(verbose_name="Date")
+
+    payment_method = models.CharField(max_length=20, verbose_name="Payment Method")
+
+    payment_count = models.PositiveIntegerField(default=0, verbose_name="Payments")
+
+    amount_total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="Amount (₱)"
+    )
+
+    void_count = models.PositiveIntegerField(default=0, verbose_name="Voided")
+
+    void_total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="Voided Amount (₱)"
+    )
+
+    class Meta:
+        verbose_name = "Daily Collection"
+        verbose_name_plural = "Daily Collections"
+        ordering = ['-date', 'organization', 'payment_method']
+        unique_together = ['organization', 'date', 'payment_method']
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.organization_id} - {self.date} - {self.payment_method}: ₱{self.net_total}"
+
+    @property
+    def net_total(self):
+        return self.amount_total - self.void_total
+
+    @staticmethod
+    def net_expression():
+        """amount_total - void_total, for Sum() over rollup rows"""
+        return models.ExpressionWrapper(
+            models.F('amount_total') - models.F('void_total'),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2)
+        )
+
+    @classmethod
+    def net_collected(cls, **filters):
+        """Net amount collected over the rollup rows matching `filters`"""
+        total = cls.objects.filter(**filters).aggregate(total=Sum(cls.net_expression()))['total']
+        return total or Decimal('0.00')
+
+    @classmethod
+    def _add(cls, key, payment_count, amount_total, void_count, void_total):
+        from django.db import IntegrityError, transaction
+        organization_id, date, payment_method = key
+        rows = cls.objects.filter(organization_id=organization_id, date=date, payment_method=payment_method)
+        changes = {
+            'payment_count': models.F('payment_count') + payment_count,
+            'amount_total': models.F('amount_total') + amount_total,
+            'void_count': models.F('void_count') + void_count,
+            'void_total': models.F('void_total') + void_total,
+            'updated_at': timezone.now(),
+        }
+        if rows.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    organization_id=organization_id,
+                    date=date,
+                    payment_method=payment_method,
+                    payment_count=payment_count,
+                    amount_total=amount_total,
+                    void_count=void_count,
+                    void_total=void_total
+                )
+        except IntegrityError:
+            # another booth opened the day's row in between
+            rows.update(**changes)
+
+    @classmethod
+    def record(cls, payments, sign=1, voids_only=False):
+        """
+        Add `payments` to their day's rows (sign=-1 takes them out again).
+        A voided payment counts in both the totals and the void columns;
+        `voids_only` records just the void of payments already counted.
+        """
+        deltas = {}
+        for payment in payments:
+            key = (payment.organization_id, timezone.localdate(payment.created_at), payment.payment_method)
+            delta = deltas.setdefault(key, [0, Decimal('0.00'), 0, Decimal('0.00')])
+            if not voids_only:
+                delta[0] += sign
+                delta[1] += sign * payment.amount
+            if payment.is_void:
+                delta[2] += sign
+                delta[3] += sign * payment.amount
+        for key, delta in deltas.items():
+            cls._add(key, *delta)
+
+    @classmethod
+    def rebuild(cls, organization_ids=None, since=None):
+        """
+        Recompute rollup rows from Payment for the given organizations and/or
+        days from `since` on (everything when both are None) and apply the
+        difference. Returns a (created, updated, deleted) tuple.
+        """
+        from django.db.models.functions import TruncDate
+        payments = Payment.objects.annotate(day=TruncDate('created_at'))
+        existing = cls.objects.all()
+        if organization_ids is not None:
+            payments = payments.filter(organization_id__in=organization_ids)
+            existing = existing.filter(organization_id__in=organization_ids)
+        if since is not None:
+            payments = payments.filter(day__gte=since)
+            existing = existing.filter(date__gte=since)
+
+        void = models.Q(is_void=True)
+        desired = {
+            (row['organization_id'], row['day'], row['payment_method']): (
+                row['payment_count'],
+                row['amount_total'] or Decimal('0.00'),
+                row['void_count'],
+                row['void_total'] or Decimal('0.00'),
+            )
+            for row in payments.order_by().values('organization_id', 'day', 'payment_method').annotate(
+                payment_count=models.Count('id'),
+                amount_total=Sum('amount'),
+                void_count=models.Count('id', filter=void),
+                void_total=Sum('amount', filter=void),
+            )
+        }
+
+        to_create, to_update, to_delete = [], [], []
+        for row in existing:
+            values = desired.pop((row.organization_id, row.date, row.payment_method), None)
+            if values is None:
+                to_delete.append(row.id)
+            elif values != (row.payment_count, row.amount_total, row.void_count, row.void_total):
+                row.payment_count, row.amount_total, row.void_count, row.void_total = values
+                to_update.append(row)
+        for (organization_id, date, payment_method), values in desired.items():
+            payment_count, amount_total, void_count, void_total = values
+            to_create.append(cls(
+                organization_id=organization_id,
+                date=date,
+                payment_method=payment_method,
+                payment_count=payment_count,
+                amount_total=amount_total,
+                void_count=void_count,
+                void_total=void_total,
+            ))
+
+        if to_delete:
+            cls.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            now = timezone.now()
+            for row in to_update:
+                row.updated_at = now
+            cls.objects.bulk_update(
+                to_update,
+                ['payment_count', 'amount_total', 'void_count', 'void_total', 'updated_at'],
+                batch_size=500
+            )
+        if to_create:
+            cls.objects.bulk_create(to_create, batch_size=500)
+        return len(to_create), len(to_update), len(to_delete)
+
+
+class StudentSearchTerm(BaseModel):
+    """
+    Search index for the student list: one row per lowercased word of a
+    student's ID number, names and email. A search word matches the terms it
+    is a prefix of, which is a range scan on the `term` index instead of a
+    LIKE '%...%' over every student. Kept in sync when a student is saved;
+    use the rebuild_student_search command after bulk imports or
+    queryset.update() calls.
+    """
+    WORD = re.compile(r'[^\W_]+')
+    MAX_TERM_LENGTH = 100
+    MAX_QUERY_WORDS = 5
+
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name="Student"
+    )
+
+    term = models.CharField(max_length=MAX_TERM_LENGTH, verbose_name="Term")
+
+    class Meta:
+        verbose_name = "Student Search Term"
+        verbose_name_plural = "Student Search Terms"
+        ordering = ['term']
+        unique_together = ['student', 'term']
+        indexes = [
+            # covers the prefix lookup so matching student ids come straight from the index
+            models.Index(fields=['term', 'student']),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.term}"
+
+    @classmethod
+    def words(cls, text):
+        """Lowercased words of `text`; '2025-10017' gives '2025' and '10017'"""
+        return [word[:cls.MAX_TERM_LENGTH] for word in cls.WORD.findall((text or '').lower())]
+
+    @classmethod
+    def terms_for(cls, student):
+        return set(cls.words(' '.join(filter(None, [
+            student.student_id_number,
+            student.first_name,
+            student.middle_name,
+            student.last_name,
+            student.email,
+        ]))))
+
+    @classmethod
+    def prefixed(cls, word):
+        # term >= word AND term < word + U+10FFFF is the prefix range, usable by the index
+        return cls.objects.filter(term__gte=word, term__lt=word + '\U0010ffff')
+
+    @classmethod
+    def search(cls, queryset, query):
+        """Narrow `queryset` to students with a term starting with every word of `query`"""
+        # the longest word is usually the most selective: it picks the candidates,
+        # the others are checked per candidate on the (student, term) index
+        words = sorted(set(cls.words(query)), key=len, reverse=True)[:cls.MAX_QUERY_WORDS]
+        if not words:
+            return queryset
+        queryset = queryset.filter(id__in=cls.prefixed(words[0]).values('student_id'))
+        for word in words[1:]:
+            queryset = queryset.filter(models.Exists(cls.prefixed(word).filter(student=models.OuterRef('pk'))))
+        return queryset
+
+    @classmethod
+    def rebuild(cls, student_ids=None):
+        """
+        Recompute the terms of the given students (everyone when None) and
+        apply the difference. Returns a (created, deleted) tuple.
+        """
+        students = Student.objects.only(
+            'student_id_number', 'first_name', 'middle_name', 'last_name', 'email'
+        ).order_by()
+        existing = cls.objects.order_by()
+        if student_ids is not None:
+            students = students.filter(id__in=student_ids)
+            existing = existing.filter(student_id__in=student_ids)
+
+        desired = {
+            (student.id, term)
+            for student in students.iterator(chunk_size=2000)
+            for term in cls.terms_for(student)
+        }
+        to_delete = []
+        for entry_id, student_id, term in existing.values_list('id', 'student_id', 'term').iterator(chunk_size=2000):
+            if (student_id, term) in desired:
+                desired.discard((student_id, term))
+            else:
+                to_delete.append(entry_id)
+
+        for start in range(0, len(to_delete), 500):
+            cls.objects.filter(id__in=to_delete[start:start + 500]).delete()
+        if desired:
+            cls.objects.bulk_create(
+                [cls(student_id=student_id, term=term) for student_id, term in desired],
+                batch_size=500
+            )
+        return len(desired), len(to_delete)
+
+
+# === Signals to keep StudentFeeLedger in sync ===
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=PaymentRequest)
+@receiver(post_delete, sender=PaymentRequest)
+def sync_fee_ledger_entry(sender, instance, **kwargs):
+    """Refresh the single (student, fee_type) ledger row touched by a payment or request."""
+    if kwargs.get('raw'):
+        return
+    StudentFeeLedger.rebuild(student_ids=[instance.student_id], fee_type_ids=[instance.fee_type_id])
+
+@receiver(post_save, sender=FeeType)
+def sync_fee_ledger_for_fee_type(sender, instance, raw=False, **kwargs):
+    """Add/remove ledger rows when a fee's amount, year levels or active flag change."""
+    if raw or not instance.ledger_state_changed():
+        return
+    StudentFeeLedger.rebuild(fee_type_ids=[instance.id])
+    instance._loaded_ledger_state = instance.get_ledger_state()
+
+@receiver(post_save, sender=Organization)
+def sync_fee_ledger_for_organization(sender, instance, created=False, raw=False, **kwargs):
+    """Rebuild the organization's fees when its tier or program affiliation change."""
+    if raw:
+        return
+    # a new organization has no fees yet, so only record its state
+    if not created and instance.ledger_state_changed():
+        fee_type_ids = list(instance.fee_types.values_list('id', flat=True))
+        if fee_type_ids:
+            StudentFeeLedger.rebuild(fee_type_ids=fee_type_ids)
+    instance._loaded_ledger_state = instance.get_ledger_state()
+
+@receiver(post_save, sender=Course)
+def sync_fee_ledger_for_course(sender, instance, created=False, raw=False, **kwargs):
+    """Rebuild the course's students when its program type changes."""
+    if raw:
+        return
+    # a new course has no students yet, so only record its state
+    if not created and instance.ledger_state_changed():
+        student_ids = list(instance.students.values_list('id', flat=True))
+        if student_ids:
+            StudentFeeLedger.rebuild(student_ids=student_ids)
+    instance._loaded_ledger_state = instance.get_ledger_state()
+
+@receiver(post_save, sender=Student)
+def sync_fee_ledger_for_student(sender, instance, raw=False, **kwargs):
+    """Recompute a student's ledger when course or year level change."""
+    if raw:
+        return
+    StudentFeeLedger.rebuild(student_ids=[instance.id])
+
+@receiver(post_save, sender=Student)
+def sync_student_search_terms(sender, instance, raw=False, **kwargs):
+    """Re-index a student's ID number, names and email for the student list search."""
+    if raw:
+        return
+    StudentSearchTerm.rebuild(student_ids=[instance.id])
+
+
+@receiver(post_save, sender=Payment)
+def add_daily_collection(sender, instance, created, raw=False, **kwargs):
+    """New payments go into their day's OrgDailyCollection row; voids are recorded by mark_as_void."""
+    if raw or not created:
+        return
+    OrgDailyCollection.record([instance])
+
+@receiver(post_delete, sender=Payment)
+def remove_daily_collection(sender, instance, **kwargs):
+    OrgDailyCollection.record([instance], sign=-1)
+
+
+@receiver(post_save, sender=PaymentRequest)
+@receiver(post_delete, sender=PaymentRequest)
+def invalidate_request_status(sender, instance, raw=False, **kwargs):
+    """Any other save (admin edits, etc.) drops the cached status record; mark_as_* rewrite it."""
+    if raw:
+        return
+    PaymentRequest.forget_cached_statuses([instance.request_id])
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=PaymentRequest)
+@receiver(post_delete, sender=PaymentRequest)
+@receiver(post_save, sender=BulkPaymentPosting)
+@receiver(post_delete, sender=BulkPaymentPosting)
+def invalidate_dashboard_snapshot(sender, instance, raw=False, **kwargs):
+    """Payments, requests and postings change the officer dashboard KPIs of their organization."""
+    if raw:
+        return
+    from .dashboard import invalidate_dashboard_snapshots
+    invalidate_dashboard_snapshots([instance.organization_id])
+
+
+@receiver(post_save, sender=Receipt)
+@receiver(post_delete, sender=Receipt)
+@receiver(post_save, sender=Payment)
+def invalidate_receipt_render(sender, instance, **kwargs):
+    """Drop the cached receipt email so the next render reflects the change."""
+    from .utils import invalidate_receipt_render as invalidate
+    if instance.or_number:
+        invalidate(instance.or_number)
+
+
+# ============================================
+# BACKGROUND JOBS
+# ============================================
+
+class Job(BaseModel):
+    """
+    DB-backed background job (bulk postings, exports, receipt emails).
+    Enqueued by views and executed by the `run_jobs` management command.
+    """
+    KIND_CHOICES = [
+        ('BULK_POSTING', 'Bulk Fee Posting'),
+        ('PAYMENT_EXPORT', 'Payment Export'),
+        ('RECEIPT_EMAILS', 'Receipt Emails'),
+    ]
+
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+
+    job_id = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+        verbose_name="Job ID"
+    )
+    kind = models.CharField(
+        max_length=30,
+        choices=KIND_CHOICES,
+        verbose_name="Job Type"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='QUEUED',
+        verbose_name="Status"
+    )
+    payload = models.JSONField(default=dict, blank=True, verbose_name="Payload")
+    result = models.JSONField(null=True, blank=True, verbose_name="Result")
+    error = models.TextField(blank=True, verbose_name="Error")
+
+    progress_current = models.PositiveIntegerField(default=0, verbose_name="Progress")
+    progress_total = models.PositiveIntegerField(default=0, verbose_name="Progress Total")
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name="Created By"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Attempts")
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name="Max Attempts")
+    claimed_by = models.CharField(max_length=100, blank=True, verbose_name="Worker")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Started At")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Finished At")
+
+    class Meta:
+        verbose_name = "Background Job"
+        verbose_name_plural = "Background Jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.job_id} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, kind, payload=None, created_by=None, max_attempts=3):
+        """Queue a job; it becomes visible to workers once the transaction commits"""
+        return cls.objects.create(
+            kind=kind,
+            payload=payload or {},
+            created_by=created_by,
+            max_attempts=max_attempts
+        )
+
+    @classmethod
+    def claim(cls, worker_id, limit=1):
+        """
+        Atomically move up to `limit` queued jobs to RUNNING for this worker.
+        Uses SELECT ... FOR UPDATE SKIP LOCKED where the backend supports it;
+        on SQLite (which ignores FOR UPDATE) the conditional UPDATE on
+        status='QUEUED' guarantees a job is only claimed by one worker.
+        """
+        from django.db import connection, transaction
+
+        claimed = []
+        with transaction.atomic():
+            candidates = cls.objects.filter(status='QUEUED').order_by('created_at')
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            for job_id in candidates.values_list('id', flat=True)[:limit]:
+                updated = cls.objects.filter(id=job_id, status='QUEUED').update(
+                    status='RUNNING',
+                    claimed_by=worker_id,
+                    attempts=models.F('attempts') + 1,
+                    started_at=timezone.now(),
+                    updated_at=timezone.now()
+                )
+                if updated:
+                    claimed.append(job_id)
+        return list(cls.objects.filter(id__in=claimed).order_by('created_at'))
+
+    @classmethod
+    def requeue_stale(cls, older_than):
+        """Return RUNNING jobs whose worker stopped reporting progress to the queue (or fail them)"""
+        cutoff = timezone.now() - older_than
+        stale = cls.objects.filter(status='RUNNING', updated_at__lt=cutoff)
+        failed = stale.filter(attempts__gte=models.F('max_attempts')).update(
+            status='FAILED',
+            error='Worker stopped responding',
+            finished_at=timezone.now(),
+            updated_at=timezone.now()
+        )
+        requeued = stale.update(status='QUEUED', claimed_by='', updated_at=timezone.now())
+        return requeued, failed
+
+    def set_progress(self, current, total=None):
+        """Record progress without touching other columns (also acts as a heartbeat)"""
+        self.progress_current = current
+        fields = {'progress_current': current, 'updated_at': timezone.now()}
+        if total is not None:
+            self.progress_total = total
+            fields['progress_total'] = total
+        Job.objects.filter(pk=self.pk).update(**fields)
+
+    def mark_succeeded(self, result=None):
+        self.status = 'SUCCEEDED'
+        self.result = result
+        self.finished_at = timezone.now()
+        if self.progress_total and self.progress_current < self.progress_total:
+            self.progress_current = self.progress_total
+        self.save(update_fields=['status', 'result', 'finished_at', 'progress_current', 'updated_at'])
+
+    def mark_failed(self, error):
+        """Requeue for another attempt, or fail permanently once attempts run out"""
+        self.error = error
+        if self.attempts < self.max_attempts:
+            self.status = 'QUEUED'
+            self.claimed_by = ''
+        else:
+            self.status = 'FAILED'
+            self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'error', 'claimed_by', 'finished_at', 'updated_at'])
+
+    def get_progress_percent(self):
+        if self.status == 'SUCCEEDED':
+            return 100
+        if not self.progress_total:
+            return 0
+        return min(100, int(self.progress_current * 100 / self.progress_total))
+
+    def to_dict(self):
+        return {
+            'job_id': str(self.job_id),
+            'kind': self.kind,
+            'status': self.status,
+            'progress_current': self.progress_current,
+            'progress_total': self.progress_total,
+            'progress_percent': self.get_progress_percent(),
+            'result': self.result,
+            'error': self.error if self.status == 'FAILED' else '',
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+# ============================================
+# EMAIL OUTBOX
+# ============================================
+
+class EmailOutbox(BaseModel):
+    """
+    Outgoing email queued inside the originating transaction (so it commits or
+    rolls back with it) and delivered by the `dispatch_emails` command, retried
+    with exponential backoff. Receipt emails are rendered when first sent.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    receipt = models.ForeignKey(
+        Receipt,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='outbox_emails',
+        verbose_name="Receipt"
+    )
+    to_email = models.EmailField(verbose_name="To")
+    from_email = models.CharField(max_length=255, verbose_name="From")
+    subject = models.CharField(max_length=255, verbose_name="Subject")
+    body_text = models.TextField(verbose_name="Plain Text Body")
+    body_html = models.TextField(blank=True, verbose_name="HTML Body")
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='PENDING',
+        verbose_name="Status"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Attempts")
+    max_attempts = models.PositiveIntegerField(default=6, verbose_name="Max Attempts")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Next Attempt At")
+    last_error = models.TextField(blank=True, verbose_name="Last Error")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Sent At")
+
+    class Meta:
+        verbose_name = "Outgoing Email"
+        verbose_name_plural = "Email Outbox"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} ({self.status})"
+
+    @classmethod
+    def queue_receipt(cls, receipt):
+        """Queue the receipt email for a receipt's student; see queue_receipts()"""
+        return cls.queue_receipts([receipt])[0]
+
+    @classmethod
+    def queue_receipts(cls, receipts):
+        """
+        Queue the emails of several receipts in one insert. Call it inside the
+        payment's transaction; the body is left for dispatch() to render, so
+        queueing never fails on rendering.
+        """
+        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'UniPay System <noreply@unipay.com>')
+        return cls.objects.bulk_create([
+            cls(
+                receipt=receipt,
+                to_email=receipt.payment.student.email,
+                from_email=from_email,
+                subject=f'Payment Receipt - OR#{receipt.or_number}'
+            )
+            for receipt in receipts
+        ], batch_size=500)
+
+    def render(self):
+        """Render a queued receipt email's bodies (once; retries reuse them)"""
+        from .utils import build_receipt_email, get_receipt_for_render
+
+        if self.body_text or not self.receipt_id:
+            return
+        receipt = get_receipt_for_render(Receipt(pk=self.receipt_id))
+        self.subject, self.body_text, self.body_html, self.from_email, self.to_email = build_receipt_email(
+            receipt, receipt.payment.student, prefetched=True
+        )
+        self.save(update_fields=['subject', 'body_text', 'body_html', 'from_email', 'to_email', 'updated_at'])
+
+    @classmethod
+    def claim_due(cls, limit):
+        """Move up to `limit` due PENDING emails to SENDING; returns the claimed rows"""
+        now = timezone.now()
+        due_ids = list(
+            cls.objects.filter(status='PENDING', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        claimed = [
+            email_id for email_id in due_ids
+            if cls.objects.filter(id=email_id, status='PENDING').update(
+                status='SENDING',
+                attempts=models.F('attempts') + 1,
+                updated_at=now
+            )
+        ]
+        return list(cls.objects.filter(id__in=claimed).order_by('next_attempt_at'))
+
+    @classmethod
+    def release_stale(cls, older_than):
+        """Return SENDING rows left behind by a crashed dispatcher to PENDING"""
+        cutoff = timezone.now() - older_than
+        return cls.objects.filter(status='SENDING', updated_at__lt=cutoff).update(
+            status='PENDING',
+            updated_at=timezone.now()
+        )
+
+    def get_retry_delay(self):
+        """Exponential backoff: base, 2x base, 4x base, ... capped at EMAIL_OUTBOX_MAX_RETRY_DELAY"""
+        base = getattr(settings, 'EMAIL_OUTBOX_RETRY_BASE_SECONDS', 60)
+        ceiling = getattr(settings, 'EMAIL_OUTBOX_MAX_RETRY_DELAY', 3600)
+        return timedelta(seconds=min(ceiling, base * 2 ** max(0, self.attempts - 1)))
+
+    def to_message(self, connection=None):
+        from django.core.mail import EmailMultiAlternatives
+
+        message = EmailMultiAlternatives(
+            self.subject, self.body_text, self.from_email, [self.to_email], connection=connection
+        )
+        if self.body_html:
+            message.attach_alternative(self.body_html, "text/html")
+        return message
+
+    def mark_sent(self):
+        now = timezone.now()
+        self.status = 'SENT'
+        self.sent_at = now
+        self.last_error = ''
+        self.save(update_fields=['status', 'sent_at', 'last_error', 'updated_at'])
+        if self.receipt_id:
+            Receipt.objects.filter(pk=self.receipt_id).update(email_sent=True, email_sent_at=now)
+
+    def mark_failed(self, error):
+        """Schedule a retry with backoff, or give up after max_attempts"""
+        self.last_error = error
+        if self.attempts >= self.max_attempts:
+            self.status = 'FAILED'
+        else:
+            self.status = 'PENDING'
+            self.next_attempt_at = timezone.now() + self.get_retry_delay()
+        self.save(update_fields=['status', 'last_error', 'next_attempt_at', 'updated_at'])
+
+    @classmethod
+    def dispatch(cls, batch_size=50, connection=None):
+        """
+        Send one batch of due emails over a single, reused backend connection.
+        Each message goes through its own send_messages() call on that
+        connection so a failure is attributed to the right row and earlier
+        messages are never sent twice.
+        Returns a dict with sent/retrying/failed counts.
+        """
+        from django.core.mail import get_connection
+
+        emails = cls.claim_due(batch_size)
+        counts = {'sent': 0, 'retrying': 0, 'failed': 0}
+        if not emails:
+            return counts
+
+        connection = connection or get_connection(fail_silently=False)
+        results = []
+        try:
+            connection.open()
+        except Exception as e:
+            logger.warning('Could not open email connection', exc_info=True)
+            results = [(email, str(e) or e.__class__.__name__) for email in emails]
+        else:
+            try:
+                for email in emails:
+                    try:
+                        email.render()
+                        with metrics.EMAIL_SEND_SECONDS.time():
+                            connection.send_messages([email.to_message(connection)])
+                        results.append((email, None))
+                    except Exception as e:
+                        results.append((email, str(e) or e.__class__.__name__))
+            finally:
+                connection.close()
+
+        for email, error in results:
+            if error is None:
+                email.mark_sent()
+                counts['sent'] += 1
+            else:
+                email.mark_failed(error)
+                counts['failed' if email.status == 'FAILED' else 'retrying'] += 1
+        for result, count in counts.items():
+            if count:
+                metrics.EMAILS.inc(count, result=result)
+        return counts
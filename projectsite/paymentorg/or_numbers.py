@@ -0,0 +1,115 @@
+"""
+Sequential official receipt numbers.
+
+Each organization has one ORSequence per academic year. A worker reserves
+OR_NUMBER_BLOCK_SIZE serials at a time with a conditional UPDATE on the
+sequence row and hands them out from memory, so booths contend for the row
+once per block rather than once per receipt.
+
+The rest of a block reserved inside a transaction joins the shared pool
+through transaction.on_commit; if the transaction (or the savepoint that
+reserved it) rolls back, Django discards the callback and the reservation is
+undone with it. Serials issued by a transaction that rolled back, and
+whatever is left of a worker's blocks when it stops, are the gaps listed by
+ORSequence.find_gaps() and or_gap_report.
+"""
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AcademicYearConfig, ORSequence
+
+
+def current_academic_year():
+    period = AcademicYearConfig.get_current()
+    if period is None:
+        return str(timezone.now().year)
+    return period.academic_year
+
+
+class ORNumberAllocator:
+    """Per-process pool of reserved OR serials, shared by threads once committed"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # sequence id -> list of [next, end) ranges, committed and free for any thread
+        self._blocks = {}
+        # (organization id, academic year) -> sequence id, once the row is committed
+        self._sequence_ids = {}
+
+    def _release(self, sequence_id, block):
+        with self._lock:
+            self._blocks.setdefault(sequence_id, []).append(block)
+
+    def get_sequence_id(self, organization, academic_year):
+        key = (organization.pk, academic_year)
+        sequence_id = self._sequence_ids.get(key)
+        if sequence_id is None:
+            sequence, created = ORSequence.objects.get_or_create(
+                organization=organization,
+                academic_year=academic_year
+            )
+            sequence_id = sequence.pk
+            # only remembered once the row is committed (immediately outside a transaction)
+            transaction.on_commit(lambda: self._sequence_ids.setdefault(key, sequence_id))
+        return sequence_id
+
+    def _take(self, sequence_id, count):
+        serials = []
+        with self._lock:
+            blocks = self._blocks.get(sequence_id, [])
+            while blocks and len(serials) < count:
+                block = blocks[0]
+                while block[0] < block[1] and len(serials) < count:
+                    serials.append(block[0])
+                    block[0] += 1
+                if block[0] >= block[1]:
+                    blocks.pop(0)
+        return serials
+
+    def _reserve(self, sequence_id, size, count):
+        """
+        Reserve a block of `size` and return its first `count` serials; the
+        rest is shared once the reservation commits (immediately outside a
+        transaction).
+        """
+        start = ORSequence.reserve_block(sequence_id, size)
+        serials = list(range(start, start + min(count, size)))
+        if count < size:
+            block = [start + count, start + size]
+            transaction.on_commit(lambda: self._release(sequence_id, block))
+        return serials
+
+    def allocate(self, organization, count=1, academic_year=None):
+        """
+        `count` OR numbers for `organization` as (sequence_id, serial, or_number)
+        tuples. Serials are unique within the series but only increasing per
+        worker, since each worker draws from its own blocks.
+        """
+        academic_year = academic_year or current_academic_year()
+        sequence_id = self.get_sequence_id(organization, academic_year)
+        block_size = max(1, settings.OR_NUMBER_BLOCK_SIZE)
+        serials = self._take(sequence_id, count)
+        if len(serials) < count:
+            needed = count - len(serials)
+            serials.extend(self._reserve(sequence_id, max(block_size, needed), needed))
+        return [
+            (sequence_id, serial, ORSequence.format_or_number(organization.code, academic_year, serial))
+            for serial in serials
+        ]
+
+    def reset(self):
+        """Forget every reserved block (their unused serials become gaps)"""
+        with self._lock:
+            self._blocks.clear()
+            self._sequence_ids.clear()
+
+
+allocator = ORNumberAllocator()
+
+
+def allocate_or_number(organization):
+    """(sequence_id, serial, or_number) for one receipt"""
+    return allocator.allocate(organization)[0]
@@ -0,0 +1,88 @@
+"""
+Server-side QR code images. Images are content-addressed: the file name is a
+hash of the payload and render settings, so a payload is only ever drawn once
+and the URL can be cached by browsers forever.
+"""
+import hashlib
+import io
+
+import qrcode
+import qrcode.image.svg
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .metrics import QR_RENDER_SECONDS
+
+# Bump when the render settings below change so old cached files are not reused
+QR_RENDER_VERSION = 1
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+
+QR_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+QR_CACHE_DIR = 'qr'
+
+# Cached images never change (the name is the content hash), so they can be cached for a year
+QR_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def payment_request_qr_payload(payment_request, signature=None):
+    """PAYMENT_REQUEST|<uuid>|<sig> as scanned at the booth"""
+    if signature is None:
+        signature = payment_request.qr_signature
+    return f"PAYMENT_REQUEST|{payment_request.request_id}|{signature}"
+
+
+def receipt_qr_payload(receipt):
+    """RECEIPT|<or_number>|<verification signature> for verifying a printed receipt"""
+    return f"RECEIPT|{receipt.or_number}|{receipt.verification_signature}"
+
+
+def get_qr_digest(payload, fmt):
+    key = f"{QR_RENDER_VERSION}|{QR_BOX_SIZE}|{QR_BORDER}|{fmt}|{payload}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def get_qr_path(digest, fmt):
+    """Storage path of a cached QR image, relative to MEDIA_ROOT"""
+    return f"{QR_CACHE_DIR}/{digest[:2]}/{digest}.{fmt}"
+
+
+def render_qr(payload, fmt='png'):
+    """Draw a QR code and return the encoded image bytes"""
+    qr = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=QR_BOX_SIZE,
+        border=QR_BORDER,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    if fmt == 'svg':
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill_color='black', back_color='white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def get_qr_image(payload, fmt='png'):
+    """Return the storage path of the QR image for `payload`, drawing it on first use"""
+    if fmt not in QR_FORMATS:
+        raise ValueError(f"Unsupported QR format: {fmt}")
+    path = get_qr_path(get_qr_digest(payload, fmt), fmt)
+    if not default_storage.exists(path):
+        with QR_RENDER_SECONDS.time(format=fmt):
+            saved = default_storage.save(path, ContentFile(render_qr(payload, fmt)))
+        if saved != path:
+            # Another process drew the same image concurrently; keep theirs
+            default_storage.delete(saved)
+    return path
+
+
+def get_qr_url(payload, fmt='png'):
+    """URL of the cached QR image for `payload` (served with immutable cache headers)"""
+    return default_storage.url(get_qr_image(payload, fmt))
@@ -0,0 +1,118 @@
+"""
+HMAC signatures for the payment request and receipt QR codes.
+
+Each purpose gets its own key, derived once per process from SECRET_KEY, so a
+receipt signature can never be passed off as a payment request signature. The
+keyed HMAC state is built once and copied per message instead of re-keying
+on every call.
+
+Signatures look like "<key id>.<hex digest>". Rotate by moving the old
+SECRET_KEY to SECRET_KEY_FALLBACKS: new signatures use the new key, and the key
+id tells verify() which key an existing signature was made with, so it never
+tries more than one. Bare hex digests from before key ids (HMAC of the message
+under SECRET_KEY, the same for every purpose) are still accepted while
+QR_SIGNING_ACCEPT_LEGACY is on.
+"""
+import hashlib
+import hmac
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .metrics import SIGNATURE_BATCH_CHECK_SECONDS, SIGNATURE_CHECK_SECONDS, SIGNATURE_CHECKS
+
+PAYMENT_REQUEST = 'payment-request'
+RECEIPT = 'receipt'
+
+KEY_ID_SEPARATOR = '.'
+
+
+def _secrets():
+    return [settings.SECRET_KEY, *getattr(settings, 'SECRET_KEY_FALLBACKS', [])]
+
+
+def _keyed(key):
+    return hmac.new(key, digestmod=hashlib.sha256)
+
+
+def _key_id(secret):
+    # Identifies the secret without revealing anything usable about it
+    return hmac.new(secret.encode('utf-8'), b'paymentorg.signing.key-id', hashlib.sha256).hexdigest()[:8]
+
+
+class Signer:
+    """Signs and verifies messages for one purpose"""
+
+    def __init__(self, purpose, secrets, accept_legacy=True):
+        self.purpose = purpose
+        # key id -> HMAC object already keyed for this purpose; the first is current
+        self.keys = {}
+        for secret in secrets:
+            derived = hmac.new(secret.encode('utf-8'), f'paymentorg.signing:{purpose}'.encode('utf-8'), hashlib.sha256)
+            self.keys.setdefault(_key_id(secret), _keyed(derived.digest()))
+        self.current_key_id = next(iter(self.keys))
+        self.legacy_keys = [_keyed(secret.encode('utf-8')) for secret in secrets] if accept_legacy else []
+
+    @staticmethod
+    def _digest(keyed, message):
+        mac = keyed.copy()
+        mac.update(str(message).encode('utf-8'))
+        return mac.hexdigest()
+
+    def sign(self, message):
+        return f'{self.current_key_id}{KEY_ID_SEPARATOR}{self._digest(self.keys[self.current_key_id], message)}'
+
+    def verify(self, message, signature):
+        """Constant-time check of `signature` for `message`; one HMAC per call"""
+        if not isinstance(signature, str):
+            return False
+        key_id, separator, digest = signature.partition(KEY_ID_SEPARATOR)
+        if separator:
+            keyed = self.keys.get(key_id)
+            return keyed is not None and hmac.compare_digest(self._digest(keyed, message), digest)
+        # Legacy bare digest: only the secrets still configured can have made it
+        return any(hmac.compare_digest(self._digest(keyed, message), signature) for keyed in self.legacy_keys)
+
+    def verify_many(self, items):
+        """verify() for a list of (message, signature) pairs; returns a list of booleans"""
+        verify = self.verify
+        return [verify(message, signature) for message, signature in items]
+
+
+@lru_cache(maxsize=None)
+def get_signer(purpose):
+    return Signer(purpose, _secrets(), accept_legacy=getattr(settings, 'QR_SIGNING_ACCEPT_LEGACY', True))
+
+
+@receiver(setting_changed)
+def reset_signers(setting, **kwargs):
+    """Re-derive keys when tests override the secrets"""
+    if setting in ('SECRET_KEY', 'SECRET_KEY_FALLBACKS', 'QR_SIGNING_ACCEPT_LEGACY'):
+        get_signer.cache_clear()
+
+
+def sign(purpose, message):
+    return get_signer(purpose).sign(message)
+
+
+def verify(purpose, message, signature):
+    started = time.perf_counter()
+    valid = get_signer(purpose).verify(message, signature)
+    SIGNATURE_CHECK_SECONDS.observe(time.perf_counter() - started, purpose=purpose)
+    SIGNATURE_CHECKS.inc(purpose=purpose, result='valid' if valid else 'invalid')
+    return valid
+
+
+def verify_many(purpose, items):
+    started = time.perf_counter()
+    results = get_signer(purpose).verify_many(items)
+    if results:
+        # timed as a batch; SIGNATURE_CHECK_SECONDS only counts single checks
+        SIGNATURE_BATCH_CHECK_SECONDS.observe(time.perf_counter() - started, purpose=purpose)
+        valid = sum(results)
+        SIGNATURE_CHECKS.inc(valid, purpose=purpose, result='valid')
+        SIGNATURE_CHECKS.inc(len(results) - valid, purpose=purpose, result='invalid')
+    return results
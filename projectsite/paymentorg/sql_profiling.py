@@ -0,0 +1,162 @@
+"""
+Per-request SQL profiling (opt-in with SQL_PROFILING_ENABLED).
+
+SQLProfilingMiddleware wraps the default connection with a QueryRecorder
+that counts every statement, its time, and how often the same statement
+(its fingerprint: the SQL with literals and IN-list lengths folded) ran.
+A statement repeated SQL_PROFILING_N_PLUS_ONE_THRESHOLD times or more in
+one request is reported as a likely N+1, together with the line of app
+code or the template that issued it first.
+
+Each profile goes out in a Server-Timing header (visible in the browser's
+network panel) and into a ring buffer of the last SQL_PROFILING_BUFFER_SIZE
+requests of this worker process, shown to staff at /staff/sql-profile/.
+When profiling is disabled the middleware removes itself at startup, so
+requests pay nothing.
+"""
+import re
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+from django.template.base import Node
+from django.utils import timezone
+
+# quoted literals, numbers outside identifiers, and placeholder lists of any length
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+
+# statements kept per profile, most repeated first
+MAX_REPORTED_STATEMENTS = 10
+MAX_SQL_LENGTH = 300
+
+_this_file = Path(__file__).resolve()
+_app_root = str(Path(settings.BASE_DIR).resolve())
+_skipped_files = {str(_this_file), str(_this_file.with_name('middleware.py'))}
+
+
+def fingerprint(sql):
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    return PLACEHOLDER_LIST.sub('%s, ...', sql)
+
+
+def _query_site():
+    """Where a statement came from: the innermost project code frame, or the template being rendered"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_app_root) and filename not in _skipped_files and 'site-packages' not in filename:
+            return f'{Path(filename).relative_to(_app_root)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        # the template tag or variable being rendered (blocks report their own template, not the base)
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            if isinstance(node, Node) and node.origin is not None:
+                line = f':{node.token.lineno}' if node.token is not None else ''
+                return f'template {node.origin.template_name or node.origin.name}{line}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that tallies statements by fingerprint"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # fingerprint -> [count, seconds, site of the first execution]
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            key = fingerprint(sql)
+            entry = self.statements.get(key)
+            if entry is None:
+                self.statements[key] = [1, elapsed, _query_site()]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def profile(self, request, response, elapsed):
+        threshold = getattr(settings, 'SQL_PROFILING_N_PLUS_ONE_THRESHOLD', 5)
+        repeated = sorted(
+            ((sql, count, seconds, site) for sql, (count, seconds, site) in self.statements.items() if count > 1),
+            key=lambda item: (-item[1], -item[2])
+        )
+        match = getattr(request, 'resolver_match', None)
+        return {
+            'at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path()[:MAX_SQL_LENGTH],
+            'view': match.view_name if match else '',
+            'status': response.status_code,
+            'queries': self.count,
+            'db_ms': round(self.duration * 1000, 2),
+            'total_ms': round(elapsed * 1000, 2),
+            'duplicated_queries': sum(count - 1 for _, count, _, _ in repeated),
+            'n_plus_one': any(count >= threshold for _, count, _, _ in repeated),
+            'repeated': [
+                {
+                    'sql': sql[:MAX_SQL_LENGTH],
+                    'count': count,
+                    'ms': round(seconds * 1000, 2),
+                    'site': site,
+                    'n_plus_one': count >= threshold,
+                }
+                for sql, count, seconds, site in repeated[:MAX_REPORTED_STATEMENTS]
+            ],
+        }
+
+
+def _header_text(text):
+    return text.replace('\\', '/').replace('"', "'").encode('latin-1', 'replace').decode('latin-1')
+
+
+def server_timing(profile):
+    """Server-Timing header value: DB time and count, total time, and the worst N+1 if any"""
+    metrics = [
+        f'db;dur={profile["db_ms"]:.2f};desc="{profile["queries"]} queries, '
+        f'{profile["duplicated_queries"]} duplicated"',
+        f'total;dur={profile["total_ms"]:.2f}',
+    ]
+    worst = next((statement for statement in profile['repeated'] if statement['n_plus_one']), None)
+    if worst:
+        metrics.append(f'nplusone;dur={worst["ms"]:.2f};desc="{worst["count"]}x {_header_text(worst["site"])}"')
+    return ', '.join(metrics)
+
+
+class ProfileBuffer:
+    """Ring buffer of the most recent request profiles in this process"""
+
+    def __init__(self, size):
+        self._lock = threading.Lock()
+        self._profiles = deque(maxlen=size)
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def recent(self, n_plus_one_only=False):
+        with self._lock:
+            profiles = list(self._profiles)
+        profiles.reverse()
+        if n_plus_one_only:
+            profiles = [profile for profile in profiles if profile['n_plus_one']]
+        return profiles
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+profile_buffer = ProfileBuffer(getattr(settings, 'SQL_PROFILING_BUFFER_SIZE', 200))
@@ -0,0 +1,178 @@
+"""
+Push notifications for payment request status changes.
+
+ProcessPaymentRequestView publishes an event when it marks a request PAID;
+students waiting on the QR page receive it over Server-Sent Events (or a
+long-poll) instead of polling the database every two seconds.
+
+Waiters in the publishing process are woken immediately. The event is also
+written to the default cache, which waiters re-check every
+PAYMENT_STATUS_RECHECK_SECONDS, so with a shared cache backend (e.g. Redis)
+events published by other worker processes arrive within that interval.
+Push is only offered under ASGI with PAYMENT_STATUS_PUSH on (see
+push_enabled); SSE streams wait as coroutines and long-polls on the
+request's own sync thread. Nothing here touches the database.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+
+# Published events are terminal (PAID/CANCELLED), so they only need to outlive open streams
+EVENT_CACHE_TIMEOUT = 60 * 60
+
+
+def event_cache_key(request_id):
+    return f'paymentorg:request_status_event:{request_id}'
+
+
+def make_event(status, payment_id=None):
+    event = {'status': status}
+    if payment_id is not None:
+        event['payment_id'] = payment_id
+    return event
+
+
+class PaymentStatusBroker:
+    """In-process fan-out of status events to threads and coroutines waiting on a request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # request_id -> threading.Event / (loop, asyncio.Event) of current waiters
+        self._sync_waiters = {}
+        self._async_waiters = {}
+
+    def publish(self, request_id, event):
+        key = str(request_id)
+        cache.set(event_cache_key(key), event, EVENT_CACHE_TIMEOUT)
+        with self._lock:
+            sync_waiters = self._sync_waiters.pop(key, [])
+            async_waiters = self._async_waiters.pop(key, [])
+        for flag in sync_waiters:
+            flag.set()
+        for loop, flag in async_waiters:
+            loop.call_soon_threadsafe(flag.set)
+        return len(sync_waiters) + len(async_waiters)
+
+    def forget(self, request_id):
+        cache.delete(event_cache_key(request_id))
+
+    def get_event(self, request_id):
+        return cache.get(event_cache_key(request_id))
+
+    def waiter_count(self):
+        with self._lock:
+            return (
+                sum(len(waiters) for waiters in self._sync_waiters.values())
+                + sum(len(waiters) for waiters in self._async_waiters.values())
+            )
+
+    def _discard(self, registry, key, item):
+        with self._lock:
+            waiters = registry.get(key)
+            if waiters and item in waiters:
+                waiters.remove(item)
+                if not waiters:
+                    del registry[key]
+
+    def wait(self, request_id, timeout):
+        """Block until an event is published for `request_id`; returns it, or None on timeout"""
+        key = str(request_id)
+        deadline = time.monotonic() + timeout
+        recheck = settings.PAYMENT_STATUS_RECHECK_SECONDS
+        while True:
+            flag = threading.Event()
+            with self._lock:
+                self._sync_waiters.setdefault(key, []).append(flag)
+            try:
+                # Checked after registering so a publish in between is not missed
+                event = self.get_event(key)
+                if event is not None:
+                    return event
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                flag.wait(min(remaining, recheck))
+            finally:
+                self._discard(self._sync_waiters, key, flag)
+
+    async def await_event(self, request_id, timeout):
+        """Async counterpart of wait() for ASGI streams"""
+        key = str(request_id)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        recheck = settings.PAYMENT_STATUS_RECHECK_SECONDS
+        while True:
+            waiter = (loop, asyncio.Event())
+            with self._lock:
+                self._async_waiters.setdefault(key, []).append(waiter)
+            try:
+                event = await cache.aget(event_cache_key(key))
+                if event is not None:
+                    return event
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return None
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), min(remaining, recheck))
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                self._discard(self._async_waiters, key, waiter)
+
+
+broker = PaymentStatusBroker()
+
+
+def publish_status_on_commit(payment_request, payment_id=None):
+    """Notify waiters once the status change is visible to other connections"""
+    event = make_event(payment_request.status, payment_id)
+    request_id = payment_request.request_id
+    transaction.on_commit(lambda: broker.publish(request_id, event))
+
+
+def push_enabled(request):
+    """True when SSE streams and long-polls may be served for this request"""
+    return settings.PAYMENT_STATUS_PUSH and isinstance(request, ASGIRequest)
+
+
+def status_etag(data):
+    """Strong ETag for a status payload, for conditional polling"""
+    digest = hashlib.md5(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def format_sse(data, event='status'):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode('utf-8')
+
+
+# Sent every so often so proxies do not close an idle stream
+SSE_HEARTBEAT = b': keep-alive\n\n'
+
+
+def _stream_deadline():
+    return time.monotonic() + settings.PAYMENT_STATUS_STREAM_TIMEOUT
+
+
+async def astream_status(request_id, initial_event):
+    """SSE body: open streams cost a coroutine, not a thread"""
+    yield b'retry: 3000\n\n'
+    yield format_sse(initial_event)
+    if initial_event['status'] != 'PENDING':
+        return
+    deadline = _stream_deadline()
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        event = await broker.await_event(request_id, min(remaining, settings.PAYMENT_STATUS_HEARTBEAT_SECONDS))
+        if event is not None:
+            yield format_sse(event)
+            return
+        yield SSE_HEARTBEAT
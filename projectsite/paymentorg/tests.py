@@ -1,3 +1,571 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from smtplib import SMTPException
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, OperationalError, connection, transaction
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    BulkPaymentPosting, College, Course, EmailOutbox, FeeType, Officer, Organization, Payment, PaymentRequest,
+    Receipt, Student, StudentFeeLedger,
+)
+from .or_numbers import ORNumberAllocator
+from .views import create_signature, record_payment, settle_payment_requests
+
+
+def create_college_and_course(program_type='COMPUTER_SCIENCE'):
+    # the initial migrations seed the college and its courses
+    college, _ = College.objects.get_or_create(code='COS', defaults={'name': 'College of Sciences'})
+    course, _ = Course.objects.get_or_create(
+        program_type=program_type, college=college,
+        defaults={'name': f'Bachelor of Science ({program_type})'}
+    )
+    return college, course
+
+
+def create_student(number, course, year_level=1, email=None):
+    user = User.objects.create_user(f'student{number}', password='x', first_name='Ana', last_name=f'Cruz{number}')
+    return Student.objects.create(
+        user=user, student_id_number=f'2025-{number:05d}', first_name='Ana', last_name=f'Cruz{number}',
+        course=course, year_level=year_level, college=course.college,
+        email=email or f'student{number}@example.com'
+    )
+
+
+def create_organization(code='CSS', **fields):
+    fields = {
+        'name': f'{code} Society', 'department': 'College of Sciences', 'fee_tier': 'TIER_1',
+        'program_affiliation': 'COMPUTER_SCIENCE', 'contact_email': f'{code.lower()}@example.com',
+        'booth_location': 'Room 101', **fields,
+    }
+    return Organization.objects.create(code=code, **fields)
+
+
+def create_fee_type(organization, name='Membership Fee', **fields):
+    fields = {'amount': Decimal('150.00'), 'academic_year': '2025-2026', 'semester': '1st Semester', **fields}
+    return FeeType.objects.create(organization=organization, name=name, **fields)
+
+
+def create_officer(organization, username='officer'):
+    user = User.objects.create_user(username, password='x')
+    return Officer.objects.create(user=user, organization=organization, role='Treasurer')
+
+
+def create_payment_request(student, fee_type, status='PENDING'):
+    return PaymentRequest.objects.create(
+        student=student, organization=fee_type.organization, fee_type=fee_type, amount=fee_type.amount,
+        status=status, expires_at=timezone.now() + timedelta(days=1)
+    )
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailOutboxDispatchTests(TestCase):
+    """dispatch_emails / EmailOutbox.dispatch delivering through the locmem backend"""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, course = create_college_and_course()
+        cls.student = create_student(1, course, email='ana@example.com')
+        organization = create_organization()
+        fee_type = create_fee_type(organization)
+        payment_request = PaymentRequest.objects.create(
+            student=cls.student, organization=organization, fee_type=fee_type,
+            amount=fee_type.amount, status='PAID', expires_at=timezone.now()
+        )
+        payment = Payment.objects.create(
+            payment_request=payment_request, student=cls.student, organization=organization,
+            fee_type=fee_type, amount=fee_type.amount, amount_received=fee_type.amount,
+            or_number='OR-CSS-TEST-000001'
+        )
+        cls.receipt = Receipt.objects.create(payment=payment, or_number=payment.or_number)
+
+    def test_queued_receipt_is_rendered_and_sent(self):
+        email = EmailOutbox.queue_receipt(self.receipt)
+        self.assertEqual(email.body_text, '')
+
+        counts = EmailOutbox.dispatch()
+
+        self.assertEqual(counts, {'sent': 1, 'retrying': 0, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['ana@example.com'])
+        self.assertIn('OR-CSS-TEST-000001', message.subject)
+        self.assertTrue(message.body)
+        self.assertEqual(message.alternatives[0][1], 'text/html')
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'SENT')
+        self.receipt.refresh_from_db()
+        self.assertTrue(self.receipt.email_sent)
+
+    def test_command_sends_due_emails_only(self):
+        EmailOutbox.objects.create(to_email='a@example.com', from_email='noreply@example.com', subject='Due', body_text='due')
+        EmailOutbox.objects.create(
+            to_email='b@example.com', from_email='noreply@example.com', subject='Later', body_text='later',
+            next_attempt_at=timezone.now() + timedelta(hours=1)
+        )
+
+        out = StringIO()
+        call_command('dispatch_emails', stdout=out)
+
+        self.assertEqual([message.subject for message in mail.outbox], ['Due'])
+        self.assertIn('1 sent', out.getvalue())
+        self.assertEqual(EmailOutbox.objects.get(subject='Later').status, 'PENDING')
+
+    @override_settings(EMAIL_OUTBOX_RETRY_BASE_SECONDS=60)
+    def test_send_failure_is_retried_with_backoff(self):
+        email = EmailOutbox.queue_receipt(self.receipt)
+
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            side_effect=SMTPException('connection refused')
+        ):
+            counts = EmailOutbox.dispatch()
+
+        self.assertEqual(counts, {'sent': 0, 'retrying': 1, 'failed': 0})
+        self.assertEqual(mail.outbox, [])
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'PENDING')
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('connection refused', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=30))
+        # rendered once; the retry reuses the bodies
+        self.assertTrue(email.body_text)
+
+    def test_email_receipt_button_queues_the_receipt(self):
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('receipt_email', args=[self.receipt.pk])
+
+        # GET is only a preview and queues nothing
+        self.assertEqual(self.client.get(url, secure=True).status_code, 200)
+        self.assertFalse(EmailOutbox.objects.exists())
+
+        response = self.client.post(url, secure=True)
+
+        self.assertRedirects(response, reverse('receipt_detail', args=[self.receipt.pk]), fetch_redirect_response=False)
+        email = EmailOutbox.objects.get()
+        self.assertEqual((email.receipt_id, email.to_email, email.status), (self.receipt.pk, 'ana@example.com', 'PENDING'))
+        self.assertEqual(mail.outbox, [])
+
+
+class BulkPaymentPostingTests(TestCase):
+    """BulkPaymentPosting.post_to_students must never post a fee twice to the same student"""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, course = create_college_and_course()
+        cls.organization = create_organization()
+        cls.students = [create_student(number, course, year_level=number) for number in (1, 2)]
+
+    def post(self, fee_type):
+        return BulkPaymentPosting.post_to_students(
+            Student.objects.filter(pk__in=[student.pk for student in self.students]),
+            organization=self.organization, fee_type=fee_type, amount=fee_type.amount,
+            expires_at=timezone.now() + timedelta(days=30)
+        )
+
+    def assert_one_pending_request_each(self, fee_type):
+        counts = dict(
+            PaymentRequest.objects.filter(fee_type=fee_type, status='PENDING')
+            .values_list('student_id').annotate(n=Count('id'))
+        )
+        self.assertEqual(counts, {student.pk: 1 for student in self.students})
+
+    def test_reposting_skips_students_with_a_pending_request(self):
+        fee_type = create_fee_type(self.organization)
+
+        first, second = self.post(fee_type), self.post(fee_type)
+
+        self.assertEqual((first['created'], first['skipped']), (2, 0))
+        self.assertEqual((second['created'], second['skipped']), (0, 2))
+        self.assert_one_pending_request_each(fee_type)
+
+    def test_reposting_skips_students_who_paid(self):
+        fee_type = create_fee_type(self.organization)
+        self.post(fee_type)
+        payment_request = PaymentRequest.objects.get(fee_type=fee_type, student=self.students[0])
+        payment_request.status = 'PAID'
+        payment_request.save()
+        Payment.objects.create(
+            payment_request=payment_request, student=self.students[0], organization=self.organization,
+            fee_type=fee_type, amount=fee_type.amount, amount_received=fee_type.amount, or_number='OR-CSS-TEST-000002'
+        )
+
+        result = self.post(fee_type)
+
+        self.assertEqual((result['created'], result['skipped']), (0, 2))
+
+    def test_reposting_a_fee_without_ledger_rows_creates_no_duplicates(self):
+        # neither an inactive fee nor one for another year level has StudentFeeLedger rows
+        inactive = create_fee_type(self.organization, name='Inactive Fee', is_active=False)
+        other_year = create_fee_type(self.organization, name='Seniors Fee', applicable_year_levels='4')
+
+        for fee_type in (inactive, other_year):
+            self.post(fee_type)
+            self.assertEqual(self.post(fee_type)['created'], 0)
+            self.assert_one_pending_request_each(fee_type)
+
+    def test_posting_form_reactivates_an_inactive_fee(self):
+        fee_type = create_fee_type(self.organization, is_active=False)
+        self.client.force_login(create_officer(self.organization).user)
+
+        response = self.client.post(reverse('officer_post_bulk_payment'), {
+            'fee_type_name': fee_type.name, 'fee_amount': '200.00', 'semester': fee_type.semester,
+            'academic_year': fee_type.academic_year, 'applicable_year_level': 'All',
+        }, secure=True)
+
+        self.assertRedirects(response, reverse('officer_dashboard'), fetch_redirect_response=False)
+        fee_type.refresh_from_db()
+        self.assertEqual((fee_type.is_active, fee_type.amount), (True, Decimal('200.00')))
+        self.assert_one_pending_request_each(fee_type)
+
+
+class StudentFeeLedgerTests(TestCase):
+    """StudentFeeLedger.rebuild and the signals that keep it in sync"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.college, cls.course = create_college_and_course()
+        _, cls.other_course = create_college_and_course('INFORMATION_TECHNOLOGY')
+        cls.student = create_student(1, cls.course)
+        cls.organization = create_organization()
+        cls.fee_type = create_fee_type(cls.organization)
+
+    def ledger(self, student=None):
+        return dict(
+            StudentFeeLedger.objects.filter(student=student or self.student)
+            .values_list('fee_type_id', 'status')
+        )
+
+    def test_rebuild_tracks_unpaid_pending_and_paid(self):
+        self.assertEqual(self.ledger(), {self.fee_type.pk: 'UNPAID'})
+
+        payment_request = create_payment_request(self.student, self.fee_type)
+        self.assertEqual(self.ledger(), {self.fee_type.pk: 'PENDING'})
+
+        payment_request.status = 'PAID'
+        payment_request.save()
+        payment = Payment.objects.create(
+            payment_request=payment_request, student=self.student, organization=self.organization,
+            fee_type=self.fee_type, amount=self.fee_type.amount, amount_received=self.fee_type.amount,
+            or_number='OR-CSS-TEST-000001'
+        )
+        self.assertEqual(self.ledger(), {self.fee_type.pk: 'PAID'})
+
+        payment.is_void = True
+        payment.save()
+        self.assertEqual(self.ledger(), {self.fee_type.pk: 'UNPAID'})
+
+    def test_rebuild_repairs_a_stale_ledger(self):
+        StudentFeeLedger.objects.all().delete()
+
+        created, updated, deleted = StudentFeeLedger.rebuild()
+
+        self.assertEqual((created, updated, deleted), (1, 0, 0))
+        self.assertEqual(StudentFeeLedger.rebuild(), (0, 0, 0))
+
+    def test_fee_type_changes_add_and_remove_rows(self):
+        self.fee_type.applicable_year_levels = '2'
+        self.fee_type.save()
+        self.assertEqual(self.ledger(), {})
+
+        self.fee_type.applicable_year_levels = 'All'
+        self.fee_type.save()
+        self.assertEqual(self.ledger(), {self.fee_type.pk: 'UNPAID'})
+
+        self.fee_type.is_active = False
+        self.fee_type.save()
+        self.assertEqual(self.ledger(), {})
+
+    def test_student_course_change_resyncs(self):
+        self.student.course = self.other_course
+        self.student.save()
+        self.assertEqual(self.ledger(), {})
+
+    def test_organization_affiliation_and_tier_changes_resync(self):
+        self.organization.program_affiliation = 'INFORMATION_TECHNOLOGY'
+        self.organization.save()
+        self.assertEqual(self.ledger(), {})
+
+        self.organization.fee_tier = 'TIER_2'
+        self.organization.save()
+        self.assertEqual(self.ledger(), {self.fee_type.pk: 'UNPAID'})
+
+    def test_course_program_type_change_resyncs(self):
+        course = Course.objects.create(name='BS Computing', college=self.college, program_type='OTHER')
+        student = create_student(2, course)
+        self.assertEqual(self.ledger(student), {})
+
+        course.program_type = 'COMPUTER_SCIENCE'
+        course.save()
+        self.assertEqual(self.ledger(student), {self.fee_type.pk: 'UNPAID'})
+
+    def test_unrelated_saves_skip_the_rebuild(self):
+        with mock.patch.object(StudentFeeLedger, 'rebuild') as rebuild:
+            self.organization.booth_location = 'Room 102'
+            self.organization.save()
+            self.course.description = 'Updated'
+            self.course.save()
+        rebuild.assert_not_called()
+
+
+class OfflinePaymentSyncTests(TestCase):
+    """OfflinePaymentSyncAPI applying a batch of payments recorded while offline"""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, course = create_college_and_course()
+        organization = create_organization()
+        cls.fee_type = create_fee_type(organization)
+        cls.officer = create_officer(organization)
+        cls.requests = [create_payment_request(create_student(number, course), cls.fee_type) for number in (1, 2, 3)]
+
+    def sync(self, payment_requests):
+        self.client.force_login(self.officer.user)
+        return self.client.post(reverse('api_offline_payment_sync'), {'payments': [
+            {
+                'client_id': index, 'request_id': str(payment_request.request_id),
+                'signature': create_signature(str(payment_request.request_id)),
+                'amount_received': str(payment_request.amount), 'payment_method': 'CASH',
+            }
+            for index, payment_request in enumerate(payment_requests)
+        ]}, content_type='application/json', secure=True).json()
+
+    def test_a_failing_record_does_not_sink_the_batch(self):
+        failing = self.requests[1]
+
+        def flaky_record_payment(payment_request, *args, **kwargs):
+            if payment_request.pk == failing.pk:
+                raise IntegrityError('simulated failure')
+            return record_payment(payment_request, *args, **kwargs)
+
+        with mock.patch('paymentorg.views.record_payment', side_effect=flaky_record_payment), \
+                self.assertLogs('paymentorg.views', 'ERROR'):
+            response = self.sync(self.requests)
+
+        self.assertEqual((response['applied'], response['rejected']), (2, 1))
+        self.assertEqual([result['status'] for result in response['results']], ['applied', 'rejected', 'applied'])
+        self.assertEqual(
+            set(Payment.objects.values_list('payment_request_id', flat=True)),
+            {self.requests[0].pk, self.requests[2].pk}
+        )
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, 'PENDING')
+
+        # the device resends the batch: the failed record applies, the rest are duplicates
+        response = self.sync(self.requests)
+        self.assertEqual([result['status'] for result in response['results']], ['duplicate', 'applied', 'duplicate'])
+
+
+class PaymentClaimTests(TestCase):
+    """record_payment claims a request PENDING -> PAID before creating anything"""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, course = create_college_and_course()
+        organization = create_organization()
+        cls.officer = create_officer(organization)
+        cls.payment_request = create_payment_request(create_student(1, course), create_fee_type(organization))
+
+    def pay_elsewhere(self):
+        """Another booth settles the request behind this instance's back"""
+        PaymentRequest.objects.filter(pk=self.payment_request.pk).update(status='PAID')
+
+    def test_claim_fails_once_the_request_is_no_longer_pending(self):
+        self.pay_elsewhere()
+
+        self.assertFalse(self.payment_request.mark_as_paid())
+        self.assertIsNone(record_payment(self.payment_request, self.officer, Decimal('150.00'), 'CASH'))
+        self.assertFalse(Payment.objects.exists())
+
+    def test_view_reports_already_paid_when_it_loses_the_race(self):
+        real_mark_as_paid = PaymentRequest.mark_as_paid
+
+        def paid_in_between(payment_request, *args, **kwargs):
+            self.pay_elsewhere()
+            return real_mark_as_paid(payment_request, *args, **kwargs)
+
+        self.client.force_login(self.officer.user)
+        request_id = str(self.payment_request.request_id)
+        url = reverse('officer_process_payment', args=[request_id, create_signature(request_id)])
+        with mock.patch.object(PaymentRequest, 'mark_as_paid', paid_in_between):
+            response = self.client.post(url, {'amount_received': '150.00', 'payment_method': 'CASH'}, secure=True)
+
+        self.assertRedirects(response, reverse('officer_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ['This request is already PAID. Cannot be processed.']
+        )
+        self.assertFalse(Payment.objects.exists())
+
+
+class ConcurrentPaymentClaimTests(TransactionTestCase):
+    """Several booths submitting the same QR at once record exactly one payment"""
+
+    def test_only_one_concurrent_claim_records_a_payment(self):
+        _, course = create_college_and_course()
+        organization = create_organization()
+        officer = create_officer(organization)
+        payment_request = create_payment_request(create_student(1, course), create_fee_type(organization))
+        attempts = 4
+        barrier = threading.Barrier(attempts)
+        outcomes = []
+
+        def claim():
+            try:
+                stale = PaymentRequest.objects.select_related('organization', 'student', 'fee_type').get(
+                    pk=payment_request.pk
+                )
+                barrier.wait()
+                while True:
+                    try:
+                        with transaction.atomic():
+                            outcomes.append(record_payment(stale, officer, Decimal('150.00'), 'CASH') is not None)
+                        return
+                    except OperationalError as error:
+                        # the in-memory test database fails lock waits at once instead
+                        # of honouring the busy timeout; wait for the other claim here
+                        if 'locked' not in str(error):
+                            raise
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim) for _ in range(attempts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), [False] * (attempts - 1) + [True])
+        self.assertEqual(Payment.objects.filter(payment_request=payment_request).count(), 1)
+
+
+@override_settings(OR_NUMBER_BLOCK_SIZE=3)
+class ORNumberAllocatorTests(TestCase):
+    """Sequential OR numbers from blocks reserved on ORSequence, and the gaps report"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = create_organization()
+        cls.other_organization = create_organization('MBS', program_affiliation='MARINE_BIOLOGY')
+
+    def allocate(self, allocator, organization=None, count=1, academic_year='2025-2026'):
+        """Serials from one committed allocation, so leftover block serials join the pool"""
+        with self.captureOnCommitCallbacks(execute=True):
+            allocated = allocator.allocate(organization or self.organization, count, academic_year)
+        return [serial for sequence_id, serial, or_number in allocated]
+
+    def test_serials_are_sequential_per_organization_and_academic_year(self):
+        allocator = ORNumberAllocator()
+
+        self.assertEqual(self.allocate(allocator, count=2) + self.allocate(allocator, count=3), [1, 2, 3, 4, 5])
+        self.assertEqual(self.allocate(allocator, self.other_organization, count=2), [1, 2])
+        self.assertEqual(self.allocate(allocator, academic_year='2026-2027'), [1])
+        self.assertEqual(
+            allocator.allocate(self.organization, academic_year='2025-2026')[0][2], 'OR-CSS-2025-2026-000006'
+        )
+
+    def test_two_allocators_never_hand_out_the_same_serial(self):
+        allocators = [ORNumberAllocator(), ORNumberAllocator()]
+
+        # interleaved, each allocator draws from its own blocks of three
+        serials = [serial for _ in range(9) for allocator in allocators for serial in self.allocate(allocator)]
+
+        self.assertEqual(len(set(serials)), len(serials))
+        self.assertEqual(sorted(serials), list(range(1, 19)))
+        self.assertEqual(serials[:4], [1, 4, 2, 5])
+
+    @mock.patch('paymentorg.or_numbers.allocator', new_callable=ORNumberAllocator)
+    def test_gap_report_lists_a_serial_lost_to_a_rollback(self, allocator):
+        _, course = create_college_and_course()
+        fee_type = create_fee_type(self.organization)
+        officer = create_officer(self.organization)
+        first, lost, third = [create_payment_request(create_student(number, course), fee_type) for number in (1, 2, 3)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record_payment(first, officer, fee_type.amount, 'CASH')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            record_payment(lost, officer, fee_type.amount, 'CASH')
+            raise RuntimeError('booth crashed before commit')
+        record_payment(third, officer, fee_type.amount, 'CASH')
+
+        self.assertEqual(sorted(Payment.objects.values_list('or_serial', flat=True)), [1, 3])
+        out = StringIO()
+        call_command('or_gap_report', organization='CSS', stdout=out)
+        self.assertIn('1 missing', out.getvalue())
+        self.assertIn('missing 2  (OR-CSS-', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('or_gap_report', organization='CSS', fail_on_gaps=True, stdout=StringIO())
+
+
+class RapidScanSettlementTests(TestCase):
+    """RapidScanAPI settling a batch of scanned QRs through settle_payment_requests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, course = create_college_and_course()
+        organization = create_organization()
+        other_organization = create_organization('MBS', program_affiliation='MARINE_BIOLOGY')
+        cls.officer = create_officer(organization)
+        fee_type = create_fee_type(organization)
+        cls.pending = create_payment_request(create_student(1, course), fee_type)
+        cls.paid = create_payment_request(create_student(2, course), fee_type, status='PAID')
+        cls.other = create_payment_request(create_student(3, course), create_fee_type(other_organization))
+
+    @staticmethod
+    def payload(payment_request):
+        request_id = str(payment_request.request_id)
+        return f'PAYMENT_REQUEST|{request_id}|{create_signature(request_id)}'
+
+    def test_batch_settles_only_the_valid_scans(self):
+        self.client.force_login(self.officer.user)
+
+        response = self.client.post(reverse('api_rapid_scan'), {
+            'scans': [self.payload(payment_request) for payment_request in (self.pending, self.paid, self.pending, self.other)],
+            'settle': True,
+        }, content_type='application/json', secure=True).json()
+
+        self.assertEqual((response['settled'], response['rejected']), (1, 3))
+        self.assertEqual(
+            [(result['status'], result.get('error')) for result in response['results']],
+            [
+                ('settled', None),
+                ('rejected', 'This request is already PAID.'),
+                ('rejected', 'Scanned twice in this batch.'),
+                ('rejected', 'This payment QR is for MBS Society.'),
+            ]
+        )
+        self.assertEqual(response['total_amount'], '150.00')
+        self.assertEqual(list(Payment.objects.values_list('payment_request_id', flat=True)), [self.pending.pk])
+        self.assertEqual(
+            dict(PaymentRequest.objects.values_list('pk', 'status')),
+            {self.pending.pk: 'PAID', self.paid.pk: 'PAID', self.other.pk: 'PENDING'}
+        )
+
+    def test_settlement_fails_if_a_claimed_request_changes_before_it_is_marked_paid(self):
+        real_now = timezone.now
+        calls = []
+
+        def paid_in_between():
+            # the first timezone.now() call falls between the claim SELECT and the UPDATE
+            if not calls:
+                PaymentRequest.objects.filter(pk=self.pending.pk).update(status='PAID')
+            calls.append(None)
+            return real_now()
+
+        with mock.patch('django.utils.timezone.now', paid_in_between), self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                settle_payment_requests([self.pending], self.officer)
+        self.assertFalse(Payment.objects.exists())
@@ -5,27 +5,29 @@ from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.utils import timezone
-from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.db import DatabaseError, close_old_connections, transaction
 from django.views.generic import View, CreateView, UpdateView, DeleteView, ListView, DetailView, TemplateView
-from django.urls import reverse_lazy
-from django.http import JsonResponse, Http404, HttpResponse
+from django.urls import reverse, reverse_lazy
+from django.http import JsonResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse, FileResponse
 import uuid
-import hmac
-import hashlib
-import csv
 from datetime import timedelta
 from django.conf import settings
+from django.core.files.storage import default_storage
 from decimal import Decimal
-from django.db.models import Sum, Q
+from django.db.models import Count, Sum, Q
 import logging
 import json
+import time
 
 logger = logging.getLogger(__name__)
 
 from .models import (
     Student, Officer, Organization, FeeType,
     PaymentRequest, Payment, Receipt, ActivityLog, AcademicYearConfig,
-    Course, College, UserProfile, BulkPaymentPosting
+    Course, College, UserProfile, BulkPaymentPosting, Job, EmailOutbox, StudentFeeLedger, ORSequence,
+    OrgDailyCollection, StudentSearchTerm, get_bulk_posting_students, get_current_period_cache_stats,
+    normalize_program_affiliation,
 )
 from .forms import (
     StudentPaymentRequestForm, OfficerPaymentProcessForm, OrganizationForm, 
@@ -34,57 +36,208 @@ from .forms import (
     BulkPaymentPostForm, PromoteStudentToOfficerForm, DemoteOfficerToStudentForm,
     CreateOfficerForm, CompleteProfileForm
 )
-from .utils import send_receipt_email
+from .exports import (
+    EXPORT_FORMATS, PAYMENT_EXPORT_FILTERS, PAYMENT_EXPORT_HEADER, get_export_payments_queryset, gzip_stream,
+    iter_payment_export_rows,
+)
+from .utils import render_receipt_email
+from . import signing, status_events
+from .dashboard import DashboardSnapshot, invalidate_dashboard_snapshots
+from .or_numbers import allocate_or_number, allocator as or_number_allocator, current_academic_year
+from .sql_profiling import profile_buffer
+from . import metrics
+from .qr import QR_CACHE_MAX_AGE, QR_FORMATS, get_qr_path, get_qr_url, payment_request_qr_payload
 
 # utility functions
 
 def get_current_period():
-    try:
-        return AcademicYearConfig.objects.get(is_current=True)
-    except AcademicYearConfig.DoesNotExist:
-        return None
-    except AcademicYearConfig.MultipleObjectsReturned:
-        return AcademicYearConfig.objects.filter(is_current=True).order_by('-start_date').first()
+    return AcademicYearConfig.get_current()
 
 def create_signature(message_string):
-    secret_key = getattr(settings, 'SECRET_KEY', 'default-insecure-key').encode('utf-8')
-    message = str(message_string).encode('utf-8')
-    signature = hmac.new(secret_key, message, hashlib.sha256).hexdigest()
-    return signature
+    """Signature for a payment request QR (the request_id); see signing.py"""
+    return signing.sign(signing.PAYMENT_REQUEST, message_string)
 
 def validate_signature(message_string, provided_signature):
-    expected_signature = create_signature(message_string)
-    return hmac.compare_digest(expected_signature, provided_signature)
+    return signing.verify(signing.PAYMENT_REQUEST, message_string, provided_signature)
+
+def count_payments_on_commit(payments, channel):
+    """Payment and receipt counters for the metrics endpoint, added once the transaction commits"""
+    def count():
+        for payment in payments:
+            metrics.PAYMENTS.inc(
+                organization=payment.organization.code, method=payment.payment_method, channel=channel
+            )
+            metrics.RECEIPTS.inc(organization=payment.organization.code)
+    transaction.on_commit(count)
+
+def record_payment(payment_request, officer, amount_received, payment_method, notes='', paid_at=None, channel='booth'):
+    """Mark a pending request PAID and create its Payment and Receipt.
 
-# affiliation helpers
-def normalize_program_affiliation(affiliation):
-    """Map organization program codes (e.g., ESSA, COMSCI, IT) to Course.program_type values.
-    Returns the canonical program_type or None if unknown.
+    Shared by the officer payment form and the offline booth sync (`channel`
+    'offline' in the metrics); the caller provides the transaction. The
+    PENDING -> PAID claim comes first, so when two officers submit the same QR
+    only one gets past it. Returns (payment, receipt), or None when the
+    request was no longer pending.
     """
-    if not affiliation:
+    started = time.perf_counter()
+    if not payment_request.mark_as_paid(paid_at=paid_at):
         return None
-    code = str(affiliation).strip().upper()
-    mapping = {
-        # Environmental Studies & Sciences Association
-        'ESSA': 'ENVIRONMENTAL_SCIENCE',
-        'ENVSCI': 'ENVIRONMENTAL_SCIENCE',
-        'ENVIRONMENTAL_SCIENCE': 'ENVIRONMENTAL_SCIENCE',
-        # Computer Science
-        'COMSCI': 'COMPUTER_SCIENCE',
-        'CS': 'COMPUTER_SCIENCE',
-        'COMPUTER_SCIENCE': 'COMPUTER_SCIENCE',
-        # Information Technology
-        'IT': 'INFORMATION_TECHNOLOGY',
-        
-        'INFORMATION_TECHNOLOGY': 'INFORMATION_TECHNOLOGY',
-        # Marine Biology
-        'MARBIO': 'MARINE_BIOLOGY',
-        'MARINE_BIOLOGY': 'MARINE_BIOLOGY',
-        # Medical Biology
-        'MEDBIO': 'MEDICAL_BIOLOGY',
-        'MEDICAL_BIOLOGY': 'MEDICAL_BIOLOGY',
-    }
-    return mapping.get(code)
+
+    or_sequence_id, or_serial, or_number = allocate_or_number(payment_request.organization)
+    payment = Payment.objects.create(
+        payment_request=payment_request,
+        student=payment_request.student,
+        organization=payment_request.organization,
+        fee_type=payment_request.fee_type,
+        amount=payment_request.amount,
+        amount_received=amount_received,
+        or_number=or_number,
+        or_sequence_id=or_sequence_id,
+        or_serial=or_serial,
+        payment_method=payment_method,
+        processed_by=officer,
+        notes=notes
+    )
+
+    payment_request.cache_status_on_commit()
+    # wake the student's QR page (SSE / long-poll) once this commits
+    status_events.publish_status_on_commit(payment_request, payment_id=payment.id)
+
+    with metrics.RECEIPT_CREATION_SECONDS.time():
+        receipt = Receipt.objects.create(
+            payment=payment,
+            or_number=payment.or_number,
+            verification_signature=signing.sign(signing.RECEIPT, payment.or_number)
+        )
+
+    # queue receipt email in this transaction; the dispatch_emails command delivers it
+    if getattr(settings, 'SENDGRID_API_KEY', ''):
+        EmailOutbox.queue_receipt(receipt)
+    count_payments_on_commit([payment], channel)
+    metrics.PAYMENT_PROCESSING_SECONDS.observe(
+        time.perf_counter() - started, organization=payment.organization.code, channel=channel
+    )
+    return payment, receipt
+
+def settle_payment_requests(payment_requests, officer, payment_method='CASH', amounts_received=None):
+    """Bulk counterpart of record_payment for rapid-scan mode.
+
+    Claims the requests that are still PENDING and creates their Payments and
+    Receipts with bulk_create; the caller provides the transaction.
+    `amounts_received` maps request pk -> amount and defaults to the exact fee.
+    Returns the new payments; requests no longer pending are left out.
+    Raises DatabaseError, for the caller to roll back, if a claimed request
+    stops being PENDING before it is marked PAID.
+    """
+    started = time.perf_counter()
+    amounts_received = amounts_received or {}
+    claimed = set(
+        PaymentRequest.objects.select_for_update()
+        .filter(id__in=[payment_request.id for payment_request in payment_requests], status='PENDING')
+        .values_list('id', flat=True)
+    )
+    if not claimed:
+        return []
+    now = timezone.now()
+    # select_for_update is a no-op on SQLite; the status filter keeps the claim conditional anyway
+    updated = PaymentRequest.objects.filter(id__in=claimed, status='PENDING').update(
+        status='PAID', paid_at=now, updated_at=now
+    )
+    if updated != len(claimed):
+        raise DatabaseError(f'{len(claimed) - updated} of {len(claimed)} claimed payment requests changed while settling')
+    payment_requests = [payment_request for payment_request in payment_requests if payment_request.id in claimed]
+
+    # one allocation per organization in the batch
+    by_organization = {}
+    for payment_request in payment_requests:
+        by_organization.setdefault(payment_request.organization_id, []).append(payment_request)
+    or_numbers = {}
+    for organization_requests in by_organization.values():
+        allocated = or_number_allocator.allocate(organization_requests[0].organization, count=len(organization_requests))
+        or_numbers.update(zip((payment_request.id for payment_request in organization_requests), allocated))
+
+    payments = []
+    for payment_request in payment_requests:
+        payment_request.status = 'PAID'
+        payment_request.paid_at = now
+        or_sequence_id, or_serial, or_number = or_numbers[payment_request.id]
+        amount_received = amounts_received.get(payment_request.id, payment_request.amount)
+        payments.append(Payment(
+            payment_request=payment_request,
+            student=payment_request.student,
+            organization=payment_request.organization,
+            fee_type=payment_request.fee_type,
+            amount=payment_request.amount,
+            amount_received=amount_received,
+            # Payment.save() is bypassed by bulk_create
+            change_given=amount_received - payment_request.amount,
+            or_number=or_number,
+            or_sequence_id=or_sequence_id,
+            or_serial=or_serial,
+            payment_method=payment_method,
+            processed_by=officer
+        ))
+    Payment.objects.bulk_create(payments)
+    with metrics.RECEIPT_CREATION_SECONDS.time():
+        receipts = Receipt.objects.bulk_create([
+            Receipt(
+                payment=payment,
+                or_number=payment.or_number,
+                verification_signature=signing.sign(signing.RECEIPT, payment.or_number)
+            )
+            for payment in payments
+        ])
+
+    # update() and bulk_create skip the post_save handlers; do their work once for the batch
+    StudentFeeLedger.rebuild(
+        student_ids={payment.student_id for payment in payments},
+        fee_type_ids={payment.fee_type_id for payment in payments}
+    )
+    OrgDailyCollection.record(payments)
+    PaymentRequest.cache_statuses_on_commit(payment_requests)
+    invalidate_dashboard_snapshots(by_organization)
+    for payment in payments:
+        status_events.publish_status_on_commit(payment.payment_request, payment_id=payment.id)
+    if getattr(settings, 'SENDGRID_API_KEY', ''):
+        EmailOutbox.queue_receipts(receipts)
+    count_payments_on_commit(payments, 'rapid_scan')
+    elapsed = time.perf_counter() - started
+    for organization_requests in by_organization.values():
+        metrics.PAYMENT_PROCESSING_SECONDS.observe(
+            elapsed, organization=organization_requests[0].organization.code, channel='rapid_scan'
+        )
+    return payments
+
+def ledger_fee_rows(entries):
+    """Build the per-fee status rows for a student from their StudentFeeLedger rows.
+
+    `entries` should select_related fee_type__organization, payment and
+    pending_request so the rows are built from a single query.
+    """
+    fee_rows = []
+    for entry in entries:
+        pending_request = entry.pending_request
+        fee_rows.append({
+            'fee_type': entry.fee_type,
+            'organization': entry.fee_type.organization,
+            'amount': entry.amount,
+            'is_paid': entry.status == 'PAID',
+            'payment': entry.payment,
+            # Expiration disabled: any pending request remains valid
+            'has_pending_request': pending_request is not None,
+            'pending_request': pending_request,
+            'has_qr_generated': bool(pending_request.qr_signature) if pending_request else False,
+        })
+    return fee_rows
+
+def attach_receipt_qr(receipt):
+    """Draw a receipt's verification QR the first time a page shows it"""
+    if receipt is None or receipt.receipt_qr:
+        return
+    try:
+        receipt.attach_qr_image()
+    except Exception:
+        logger.error(f'Could not generate QR for receipt {receipt.or_number}', exc_info=True)
 
 # authentication views
 class CustomLoginView(LoginView):
@@ -1133,15 +1286,15 @@ class StudentDashboardView(StudentRequiredMixin, TemplateView):
         
         # Expiration disabled: do not auto-expire pending requests
         
-        # Two-tiered fee system: Get ALL applicable fees for this student (before any filtering)
-        # This includes the academic year filter already applied by get_applicable_fees()
-        base_applicable_fees = student.get_applicable_fees()
+        # Two-tiered fee system: the student's ledger rows for the current
+        # academic year (before any filtering), with paid/pending status resolved
+        base_ledger = student.get_fee_ledger()
         
         # Get academic year choices from the student's applicable fees only
         academic_year_choices = list(
-            base_applicable_fees.values_list('academic_year', flat=True)
+            base_ledger.values_list('fee_type__academic_year', flat=True)
             .distinct()
-            .order_by('-academic_year')
+            .order_by('-fee_type__academic_year')
         )
         
         # Get filter parameters from request
@@ -1155,16 +1308,18 @@ class StudentDashboardView(StudentRequiredMixin, TemplateView):
         # Get pending payments - will be filtered based on selected filters
         pending_payments = student.payment_requests.filter(status='PENDING').order_by('-created_at')
         
-        # Apply filters to get final applicable fees
-        applicable_fees = base_applicable_fees.order_by('-created_at')  # Most recently posted first
+        # Apply filters to get final ledger rows
+        ledger = base_ledger.select_related(
+            'fee_type__organization', 'payment', 'pending_request'
+        ).order_by('-fee_type__created_at')  # Most recently posted first
         
         # Apply academic year filter
         if selected_academic_year:
-            applicable_fees = applicable_fees.filter(academic_year=selected_academic_year)
+            ledger = ledger.filter(fee_type__academic_year=selected_academic_year)
         
         # Apply semester filter - when empty string is selected, show ALL semesters
         if selected_semester:  # Only filter if a specific semester is selected
-            applicable_fees = applicable_fees.filter(semester=selected_semester)
+            ledger = ledger.filter(fee_type__semester=selected_semester)
         
         # Filter pending payments by the same criteria
         filtered_pending_payments = pending_payments
@@ -1173,78 +1328,46 @@ class StudentDashboardView(StudentRequiredMixin, TemplateView):
         if selected_semester:  # Only filter if a specific semester is selected
             filtered_pending_payments = filtered_pending_payments.filter(fee_type__semester=selected_semester)
         
-       # Calculate statistics based on FILTERED fees
-        completed_payments = student.get_completed_payments()
-
-        # IMPORTANT: Filter completed payments to match the DISPLAYED applicable_fees
-        # Get the fee IDs that are currently displayed (after all filters applied)
-        displayed_fee_ids = list(applicable_fees.values_list('id', flat=True))
-
-        # Only count payments for fees that are CURRENTLY DISPLAYED
-        filtered_completed_payments = completed_payments.filter(fee_type_id__in=displayed_fee_ids)
+        all_fees_with_status = ledger_fee_rows(ledger)
+        fee_ids = [fee_info['fee_type'].id for fee_info in all_fees_with_status]
+        filtered_completed_payments = list(
+            student.get_completed_payments().filter(fee_type_id__in=fee_ids)
+            .select_related('organization', 'fee_type')
+            .order_by('-created_at')
+        )
+        filtered_pending_payments = list(filtered_pending_payments)
+        
+        # Stats only count payments for fees that are CURRENTLY DISPLAYED
+        total_paid = sum(payment.amount for payment in filtered_completed_payments)
+        payments_count = len(filtered_completed_payments)
         
-        # Now calculate stats from ONLY the displayed fees' payments
-        total_paid = filtered_completed_payments.aggregate(Sum('amount'))['amount__sum'] or 0
-        payments_count = filtered_completed_payments.count()
-
-        # Get IDs of fees that have been paid (from the filtered set)
-        paid_fee_ids = filtered_completed_payments.values_list('fee_type_id', flat=True)
-
-        # Calculate UNPAID fees only (fees in applicable_fees but NOT in paid_fee_ids)
-        unpaid_fees = applicable_fees.exclude(id__in=paid_fee_ids)
-        remaining_balance = unpaid_fees.aggregate(Sum('amount'))['amount__sum'] or 0
-
         # Total amount due = sum of all DISPLAYED applicable fees
-        total_amount_due = applicable_fees.aggregate(Sum('amount'))['amount__sum'] or 0
-
-        # Calculate pending total strictly from filtered pending requests
-        pending_total = filtered_pending_payments.aggregate(Sum('amount'))['amount__sum'] or 0
-
-        # Count pending payment requests (waiting for approval)
-        pending_count = filtered_pending_payments.count()
+        total_amount_due = sum(fee_info['amount'] for fee_info in all_fees_with_status)
         
-        # Build a comprehensive list of all fees with their payment status
-        all_fees_with_status = []
+        # Remaining balance = displayed fees with no completed payment
+        remaining_balance = sum(
+            fee_info['amount'] for fee_info in all_fees_with_status if not fee_info['is_paid']
+        )
         
-        for fee in applicable_fees:
-            # Check if student has paid this fee (from filtered payments)
-            payment = filtered_completed_payments.filter(fee_type=fee).first()
-            
-            # Check if student has a pending request for this fee
-            pending_request = filtered_pending_payments.filter(fee_type=fee).first()
-            
-            # Expiration disabled: any pending request remains valid
-            has_valid_pending = bool(pending_request)
-            has_qr_generated = bool(pending_request.qr_signature) if pending_request else False
-            
-            fee_info = {
-                'fee_type': fee,
-                'organization': fee.organization,
-                'amount': fee.amount,
-                'is_paid': payment is not None,
-                'payment': payment,
-                'has_pending_request': has_valid_pending,
-                'pending_request': pending_request,
-                'has_qr_generated': has_qr_generated,  # True if student has clicked "Generate QR"
-            }
-            all_fees_with_status.append(fee_info)
+        # Pending total/count strictly from filtered pending requests (waiting for approval)
+        pending_total = sum(pending_request.amount for pending_request in filtered_pending_payments)
+        pending_count = len(filtered_pending_payments)
         
         # Get student organizations for filter dropdown (from their applicable fees)
         student_organizations = Organization.objects.filter(
-            fee_types__in=student.get_applicable_fees()
-        ).distinct().order_by('name')
+            id__in=base_ledger.values('fee_type__organization_id')
+        ).order_by('name')
         
         context.update({
             'student': student,
             'pending_payments': filtered_pending_payments,
-            'completed_payments': filtered_completed_payments.order_by('-created_at')[:5],
+            'completed_payments': filtered_completed_payments[:5],
             'total_amount_due': total_amount_due,
             'total_paid': total_paid,
             'remaining_balance': remaining_balance,
              'pending_total': pending_total,  # expose pending sum for verification
             'payments_count': payments_count,
             'pending_count': pending_count,  # Payments waiting for approval
-            'applicable_fees': applicable_fees,
             'all_fees_with_status': all_fees_with_status,
             'student_organizations': student_organizations,
             # Filter context
@@ -1335,6 +1458,7 @@ class GenerateQRPaymentView(StudentRequiredMixin, CreateView):
             payment_request=payment_request,
             ip_address=self.request.META.get('REMOTE_ADDR')
         )
+        metrics.QR_GENERATED.inc(organization=fee_type.organization.code)
         
         messages.success(
             self.request, 
@@ -1352,23 +1476,25 @@ class QuickGenerateQRView(StudentRequiredMixin, View):
         try:
             fee_type = get_object_or_404(FeeType, id=fee_id, is_active=True)
             
-            # Verify this fee is applicable to the student
-            applicable_fees = student.get_applicable_fees()
-            if fee_type not in applicable_fees:
+            # Verify this fee is applicable to the student; the ledger row carries its status
+            entry = student.get_fee_ledger().filter(fee_type=fee_type).first()
+            if entry is None:
                 messages.error(request, "This fee is not applicable to you.")
                 return redirect('student_dashboard')
             
-            # Check if already has pending request or completed payment
-            if PaymentRequest.objects.filter(student=student, fee_type=fee_type, status='PENDING').exists():
-                messages.warning(request, f"You already have a pending payment request for {fee_type.name}.")
+            # Check if already has completed payment or pending request
+            if entry.status == 'PAID':
+                messages.info(request, f"You have already paid for {fee_type.name}.")
                 return redirect('student_dashboard')
             
-            if Payment.objects.filter(student=student, fee_type=fee_type, status='COMPLETED').exists():
-                messages.info(request, f"You have already paid for {fee_type.name}.")
+            if entry.status == 'PENDING':
+                messages.warning(request, f"You already have a pending payment request for {fee_type.name}.")
                 return redirect('student_dashboard')
             
-            # Create payment request
+            # Create payment request, signed over its request_id like every other QR
+            request_id = uuid.uuid4()
             payment_request = PaymentRequest.objects.create(
+                request_id=request_id,
                 student=student,
                 organization=fee_type.organization,
                 fee_type=fee_type,
@@ -1376,7 +1502,7 @@ class QuickGenerateQRView(StudentRequiredMixin, View):
                 payment_method='CASH',
                 # Expiration disabled
                 expires_at=timezone.now(),
-                qr_signature=create_signature(uuid.uuid4().hex[:12])
+                qr_signature=create_signature(str(request_id))
             )
             
             ActivityLog.objects.create(
@@ -1386,6 +1512,7 @@ class QuickGenerateQRView(StudentRequiredMixin, View):
                 payment_request=payment_request,
                 ip_address=request.META.get('REMOTE_ADDR')
             )
+            metrics.QR_GENERATED.inc(organization=fee_type.organization.code)
             
             messages.success(
                 request, 
@@ -1451,9 +1578,13 @@ class ViewPaymentRequestQRView(StudentRequiredMixin, View):
             payment_request.qr_signature = create_signature(str(payment_request.request_id))
             payment_request.save(update_fields=['qr_signature'])
         
+        qr_data = payment_request_qr_payload(payment_request)
         context = {
             'payment_request': payment_request,
-            'qr_data': f"PAYMENT_REQUEST|{payment_request.request_id}|{payment_request.qr_signature}",
+            'qr_data': qr_data,
+            'qr_image_url': get_qr_url(qr_data),
+            'qr_svg_url': get_qr_url(qr_data, 'svg'),
+            'status_push': status_events.push_enabled(request),
         }
         return render(request, self.template_name, context)
 
@@ -1477,9 +1608,24 @@ class ShowPaymentQRView(StudentRequiredMixin, TemplateView):
         # Expiration disabled
             
         context['payment_request'] = payment_request
-        context['qr_data'] = f"PAYMENT_REQUEST|{payment_request.request_id}|{payment_request.qr_signature}"
+        context['qr_data'] = payment_request_qr_payload(payment_request)
+        context['qr_image_url'] = get_qr_url(context['qr_data'])
+        context['status_push'] = status_events.push_enabled(self.request)
         return context
 
+class QRImageView(View):
+    """
+    Serve a cached QR image. Names are content hashes, so responses are
+    immutable and the unguessable URL is what grants access.
+    """
+    def get(self, request, shard, digest, fmt):
+        path = get_qr_path(digest, fmt)
+        if shard != digest[:2] or not default_storage.exists(path):
+            raise Http404("QR code not found.")
+        response = FileResponse(default_storage.open(path, 'rb'), content_type=QR_FORMATS[fmt])
+        response['Cache-Control'] = f'public, max-age={QR_CACHE_MAX_AGE}, immutable'
+        return response
+
 # officer views
 class OfficerDashboardView(OfficerRequiredMixin, TemplateView):
     template_name = 'paymentorg/officer_dashboard.html'
@@ -1495,68 +1641,20 @@ class OfficerDashboardView(OfficerRequiredMixin, TemplateView):
                 'is_superuser_only': True,
                 'officer': user,
                 'organization': None,
-                'total_collected_system': Payment.objects.filter(status='COMPLETED', is_void=False).aggregate(total=Sum('amount'))['total'] or Decimal('0.00'),
-                'pending_requests': PaymentRequest.objects.filter(status='PENDING', expires_at__gt=timezone.now()).order_by('created_at')[:5],
-                'posted_requests': BulkPaymentPosting.objects.all().order_by('-created_at')[:20],
-                'recent_payments': Payment.objects.filter(status='COMPLETED', is_void=False).order_by('-created_at')[:5],
             })
+            context.update(DashboardSnapshot.get().as_context())
         
         else:
             officer = user.officer_profile
             organization = officer.organization
-            today = timezone.now().date()
-            current_period = get_current_period()
-            
-            # SPEC: Show pending requests strictly by officer's organization and status
-            pending_requests = PaymentRequest.objects.filter(
-                organization=organization,
-                status='PENDING'
-            ).order_by('created_at')[:10]
-            
-            # Count total pending requests (not just the first 10 displayed)
-            # SPEC: Count pending requests strictly by officer's organization and status
-            pending_requests_count = PaymentRequest.objects.filter(
-                organization=organization,
-                status='PENDING'
-            ).count()
-            
-            # Get posted payment postings (bulk fees posted by this officer or organization)
-            posted_requests = BulkPaymentPosting.objects.filter(
-                organization=organization
-            ).order_by('-created_at')[:20]
-            
-            logger.info(f"Officer Dashboard - Organization: {organization.name}, Posted Requests Count: {posted_requests.count()}, Records: {list(posted_requests.values('fee_type__name', 'amount', 'student_count'))}")
-            
-            # Get recent payments from all officers in this organization (not just today)
-            recent_payments = Payment.objects.filter(
-                organization=organization,
-                status='COMPLETED',
-            ).select_related('student', 'processed_by', 'receipt').order_by('-created_at')[:20]
-            
-            # Get recent activity logs for this organization
-            # Filter by: officers in this org, or payments/requests belonging to this org
-            org_officer_user_ids = Officer.objects.filter(
-                organization=organization
-            ).values_list('user_id', flat=True)
-            
-            recent_activity_logs = ActivityLog.objects.filter(
-                Q(user_id__in=org_officer_user_ids) |
-                Q(payment__organization=organization) |
-                Q(payment_request__organization=organization)
-            ).select_related('user', 'payment', 'payment_request').order_by('-created_at')[:15]
             
+            # SPEC: pending count, postings, payments and activity strictly by officer's organization
             context.update({
                 'is_superuser_only': False,
                 'officer': officer,
                 'organization': organization,
-                'pending_requests': pending_requests,
-                'pending_requests_count': pending_requests_count,
-                'posted_requests': posted_requests,
-                'today_collections': organization.get_today_collection(),
-                'total_collected_system': organization.get_total_collected(),
-                'recent_payments': recent_payments,
-                'recent_activity_logs': recent_activity_logs,
             })
+            context.update(DashboardSnapshot.get(organization).as_context())
         return context
 
 class ProcessPaymentRequestView(OfficerRequiredMixin, View):
@@ -1573,10 +1671,6 @@ class ProcessPaymentRequestView(OfficerRequiredMixin, View):
 
         # Validate signature - it's created from just the request_id
         request_id_str = str(payment_request.request_id)
-        expected_signature = create_signature(request_id_str)
-        
-        logger.info(f"QR Validation - Request ID: {request_id_str}, Provided signature: {signature}, Expected: {expected_signature}")
-        
         if not validate_signature(request_id_str, signature):
             logger.warning(f"Signature mismatch for request {request_id_str}")
             messages.error(self.request, "QR Code signature failed verification.")
@@ -1619,8 +1713,10 @@ class ProcessPaymentRequestView(OfficerRequiredMixin, View):
         if not payment_request:
             return redirect('officer_dashboard')
         
-        # generate or number from request_id (unique transaction id)
-        or_number = f"OR-{str(payment_request.request_id).replace('-', '').upper()[:12]}"
+        # the serial itself is allocated when the payment is confirmed
+        or_number = ORSequence.format_or_number(
+            payment_request.organization.code, current_academic_year(), 0
+        ).replace('000000', '######')
         
         form = OfficerPaymentProcessForm(fee_amount=payment_request.amount)
         
@@ -1647,49 +1743,24 @@ class ProcessPaymentRequestView(OfficerRequiredMixin, View):
         if form.is_valid():
             officer = request.user.officer_profile if hasattr(request.user, 'officer_profile') else None
             
-            # generate or number from request_id (unique transaction id from qr)
-            or_number = f"OR-{str(payment_request.request_id).replace('-', '').upper()[:12]}"
-            
-            # check if or number already exists (shouldn't happen, but safety check)
-            if Payment.objects.filter(or_number=or_number).exists():
-                # if exists, append timestamp
-                or_number = f"OR-{str(payment_request.request_id).replace('-', '').upper()[:12]}-{int(timezone.now().timestamp())}"
-            
-            payment = Payment.objects.create(
-                payment_request=payment_request,
-                student=payment_request.student,
-                organization=payment_request.organization,
-                fee_type=payment_request.fee_type,
-                amount=payment_request.amount,
+            recorded = record_payment(
+                payment_request,
+                officer,
                 amount_received=form.cleaned_data['amount_received'],
-                or_number=or_number,
                 payment_method=form.cleaned_data['payment_method'],
-                processed_by=officer,
                 notes=form.cleaned_data['notes']
             )
-            payment.save() 
-            
-            payment_request.mark_as_paid()
-            
-            receipt = Receipt.objects.create(
-                payment=payment,
-                or_number=payment.or_number,
-                verification_signature=create_signature(payment.or_number) 
-            )
-            
-            # send receipt via email
-            try:
-                from django.conf import settings
-                if getattr(settings, 'SENDGRID_API_KEY', ''):
-                    if send_receipt_email(receipt, payment.student):
-                        messages.info(request, f"✓ Receipt email sent to {payment.student.email}")
-                    else:
-                        messages.warning(request, f"Failed to send receipt email to {payment.student.email}")
-                else:
-                    messages.info(request, "Email service not configured - receipt email not sent")
-            except Exception as e:
-                messages.warning(request, f"Error sending email: {str(e)}")
+            if recorded is None:
+                # another officer processed this QR after the page loaded
+                payment_request.refresh_from_db(fields=['status'])
+                messages.error(request, f"This request is already {payment_request.status}. Cannot be processed.")
+                return redirect('officer_dashboard')
+            payment, receipt = recorded
             
+            if getattr(settings, 'SENDGRID_API_KEY', ''):
+                messages.info(request, f"✓ Receipt email queued for {payment.student.email}")
+            else:
+                messages.info(request, "Email service not configured - receipt email not sent")
             
             ActivityLog.objects.create(
                 user=request.user,
@@ -1709,6 +1780,332 @@ class ProcessPaymentRequestView(OfficerRequiredMixin, View):
         }
         return render(request, self.template_name, context)
 
+class OfficerAPIMixin(OfficerRequiredMixin):
+    """OfficerRequiredMixin for JSON endpoints: 403 instead of a redirect to login"""
+    def handle_no_permission(self):
+        return JsonResponse({'error': 'Officer or Superuser privilege required.'}, status=403)
+
+    def get_accessible_org_ids(self):
+        """Organizations the user may take payments for; None means all (superuser)"""
+        user = self.request.user
+        if user.is_superuser:
+            return None
+        officer = getattr(user, 'officer_profile', None)
+        if officer is None:
+            return set()
+        return set(officer.organization.get_accessible_organization_ids())
+
+class OfflinePaymentSyncAPI(OfficerAPIMixin, View):
+    """
+    Bulk upload of payments a booth recorded while offline.
+
+    POST {"payments": [{"client_id", "request_id", "signature", "amount_received",
+    "payment_method", "notes", "officer", "recorded_at"}, ...]}. Each record is
+    checked like ProcessPaymentRequestView (QR signature, organization scope,
+    amount) and the whole batch is applied in one transaction, each record in
+    its own savepoint so one bad record does not sink the rest. Replaying a
+    record whose request is already paid returns the existing OR as a
+    duplicate, so the device can resend a batch safely until it gets a reply.
+    """
+
+    def post(self, request, *args, **kwargs):
+        try:
+            records = json.loads(request.body)['payments']
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': 'Expected a JSON object with a "payments" list.'}, status=400)
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            return JsonResponse({'error': 'Expected a JSON object with a "payments" list.'}, status=400)
+        if len(records) > settings.OFFLINE_PAYMENT_SYNC_MAX_ITEMS:
+            return JsonResponse(
+                {'error': f'At most {settings.OFFLINE_PAYMENT_SYNC_MAX_ITEMS} payments per batch.'},
+                status=400
+            )
+
+        officer = getattr(request.user, 'officer_profile', None)
+        accessible_org_ids = self.get_accessible_org_ids()
+
+        # one query for every request in the batch
+        request_ids = {self.parse_request_id(record) for record in records} - {None}
+        payment_requests = {
+            str(payment_request.request_id): payment_request
+            for payment_request in PaymentRequest.objects.select_related(
+                'student', 'organization', 'fee_type'
+            ).filter(request_id__in=request_ids)
+        }
+
+        results = []
+        logs = []
+        with transaction.atomic():
+            for record in records:
+                result, payment = self.apply_record(record, payment_requests, officer, accessible_org_ids)
+                results.append(result)
+                if payment is not None:
+                    logs.append(ActivityLog(
+                        user=request.user,
+                        action='payment_processed',
+                        description=(
+                            f'Processed payment OR#{payment.or_number} for '
+                            f'{payment.student.student_id_number} (recorded offline).'
+                        ),
+                        payment=payment,
+                        ip_address=request.META.get('REMOTE_ADDR')
+                    ))
+            ActivityLog.objects.bulk_create(logs)
+
+        summary = {status: 0 for status in ('applied', 'duplicate', 'rejected')}
+        for result in results:
+            summary[result['status']] += 1
+        return JsonResponse({'results': results, **summary})
+
+    @staticmethod
+    def parse_request_id(record):
+        try:
+            return str(uuid.UUID(str(record.get('request_id'))))
+        except ValueError:
+            return None
+
+    def apply_record(self, record, payment_requests, officer, accessible_org_ids):
+        """Returns (result, payment); payment is None unless this record created one"""
+        request_id = self.parse_request_id(record)
+        result = {'client_id': record.get('client_id'), 'request_id': request_id or record.get('request_id')}
+
+        def reject(error):
+            result.update(status='rejected', error=error)
+            return result, None
+
+        def duplicate(payment_request):
+            payment = Payment.objects.filter(payment_request=payment_request).values('id', 'or_number').first()
+            result.update(status='duplicate', payment_id=payment and payment['id'], or_number=payment and payment['or_number'])
+            return result, None
+
+        if request_id is None:
+            return reject('Invalid Payment Request ID format.')
+        if not validate_signature(request_id, str(record.get('signature', ''))):
+            return reject('QR Code signature failed verification.')
+        payment_request = payment_requests.get(request_id)
+        if payment_request is None:
+            return reject('Payment request not found.')
+        if accessible_org_ids is not None and payment_request.organization_id not in accessible_org_ids:
+            return reject(f'This payment QR is for {payment_request.organization.name}.')
+        # a device shared at the booth may sync payments queued under another officer's session
+        recorded_by = record.get('officer')
+        if recorded_by not in (None, '') and str(recorded_by) != str(officer.id if officer else ''):
+            return reject('Recorded by a different officer; sync it from their account.')
+        if payment_request.status == 'PAID':
+            return duplicate(payment_request)
+        if payment_request.status != 'PENDING':
+            return reject(f'This request is already {payment_request.status}. Cannot be processed.')
+
+        form = OfficerPaymentProcessForm(
+            {
+                'amount_received': record.get('amount_received'),
+                'payment_method': record.get('payment_method', 'CASH'),
+                'notes': record.get('notes', ''),
+            },
+            fee_amount=payment_request.amount
+        )
+        if not form.is_valid():
+            return reject(' '.join(error for errors in form.errors.values() for error in errors))
+
+        # the booth's clock, unless it is missing or ahead of ours
+        now = timezone.now()
+        paid_at = parse_datetime(str(record.get('recorded_at') or ''))
+        if paid_at is not None and timezone.is_naive(paid_at):
+            paid_at = timezone.make_aware(paid_at)
+        if paid_at is None or paid_at > now:
+            paid_at = now
+
+        try:
+            with transaction.atomic():
+                recorded = record_payment(
+                    payment_request,
+                    officer,
+                    amount_received=form.cleaned_data['amount_received'],
+                    payment_method=form.cleaned_data['payment_method'],
+                    notes=form.cleaned_data['notes'],
+                    paid_at=paid_at,
+                    channel='offline'
+                )
+        except DatabaseError:
+            # the savepoint is rolled back; keep applying the rest of the batch
+            logger.exception(f'Offline payment sync failed for request {request_id}')
+            return reject('Could not record this payment; please resend it.')
+        if recorded is None:
+            # settled by another booth since the batch was read
+            payment_request.refresh_from_db(fields=['status'])
+            if payment_request.status != 'PAID':
+                return reject(f'This request is already {payment_request.status}. Cannot be processed.')
+            return duplicate(payment_request)
+        payment, receipt = recorded
+
+        result.update(
+            status='applied',
+            payment_id=payment.id,
+            or_number=payment.or_number,
+            change_given=str(payment.change_given),
+        )
+        return result, payment
+
+class RapidScanAPI(OfficerAPIMixin, View):
+    """
+    Rapid-scan booth mode: the scanner collects several student QRs and settles
+    them together instead of opening the payment form once per student.
+
+    POST {"scans": ["PAYMENT_REQUEST|<uuid>|<sig>" or {"payload", "amount_received"}, ...],
+    "payment_method": "CASH", "settle": false|true}. All signatures are checked in
+    one verify_many() pass and the requests fetched with one query. Without
+    "settle" the scans are only verified so the officer can review the list;
+    with it every valid scan is paid in one atomic batch (amount received
+    defaults to the exact fee).
+    """
+    def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body)
+            scans = data['scans']
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': 'Expected a JSON object with a "scans" list.'}, status=400)
+        if not isinstance(scans, list):
+            return JsonResponse({'error': 'Expected a JSON object with a "scans" list.'}, status=400)
+        if len(scans) > settings.RAPID_SCAN_MAX_ITEMS:
+            return JsonResponse({'error': f'At most {settings.RAPID_SCAN_MAX_ITEMS} scans per batch.'}, status=400)
+        payment_method = data.get('payment_method', 'CASH')
+        if payment_method not in dict(Payment._meta.get_field('payment_method').choices):
+            return JsonResponse({'error': f'Unknown payment method {payment_method}.'}, status=400)
+
+        results = [{'index': index} for index in range(len(scans))]
+        parsed = []
+        for result, scan in zip(results, scans):
+            scan = scan if isinstance(scan, dict) else {'payload': scan}
+            request_id, signature, error = self.parse_payload(scan.get('payload'))
+            result['request_id'] = request_id
+            if error:
+                result.update(status='rejected', error=error)
+            else:
+                parsed.append((result, scan, signature))
+
+        # every signature in one pass
+        verified = []
+        checks = signing.verify_many(
+            signing.PAYMENT_REQUEST,
+            [(result['request_id'], signature) for result, scan, signature in parsed]
+        )
+        for (result, scan, signature), valid in zip(parsed, checks):
+            if valid:
+                verified.append((result, scan))
+            else:
+                result.update(status='rejected', error='QR Code signature failed verification.')
+
+        accessible_org_ids = self.get_accessible_org_ids()
+        payment_requests = {
+            str(payment_request.request_id): payment_request
+            for payment_request in PaymentRequest.objects.select_related(
+                'student', 'organization', 'fee_type'
+            ).filter(request_id__in={result['request_id'] for result, scan in verified})
+        }
+
+        matched = {}
+        amounts_received = {}
+        for result, scan in verified:
+            payment_request = payment_requests.get(result['request_id'])
+            error = None
+            if payment_request is None:
+                error = 'Payment request not found.'
+            elif accessible_org_ids is not None and payment_request.organization_id not in accessible_org_ids:
+                error = f'This payment QR is for {payment_request.organization.name}.'
+            elif payment_request.status != 'PENDING':
+                error = f'This request is already {payment_request.status}.'
+            elif payment_request.id in matched:
+                error = 'Scanned twice in this batch.'
+            else:
+                amount_received, error = self.parse_amount(scan.get('amount_received'), payment_request.amount)
+            if payment_request is not None:
+                result.update(
+                    student_id_number=payment_request.student.student_id_number,
+                    student_name=payment_request.student.get_full_name(),
+                    fee=payment_request.fee_type.name,
+                    organization=payment_request.organization.code,
+                    amount=str(payment_request.amount),
+                )
+            if error:
+                result.update(status='rejected', error=error)
+                continue
+            result['status'] = 'ready'
+            matched[payment_request.id] = (result, payment_request)
+            amounts_received[payment_request.id] = amount_received
+
+        if data.get('settle') and matched:
+            try:
+                with transaction.atomic():
+                    payments = settle_payment_requests(
+                        [payment_request for result, payment_request in matched.values()],
+                        getattr(request.user, 'officer_profile', None),
+                        payment_method=payment_method,
+                        amounts_received=amounts_received
+                    )
+                    ActivityLog.objects.bulk_create([
+                        ActivityLog(
+                            user=request.user,
+                            action='payment_processed',
+                            description=f'Processed payment OR#{payment.or_number} for {payment.student.student_id_number} (rapid scan).',
+                            payment=payment,
+                            ip_address=request.META.get('REMOTE_ADDR')
+                        )
+                        for payment in payments
+                    ])
+            except DatabaseError:
+                # nothing was settled; the scanner can resend the same batch
+                logger.exception('Rapid-scan settlement rolled back')
+                return JsonResponse(
+                    {'error': 'Some requests changed while settling; nothing was recorded. Please scan the batch again.'},
+                    status=409
+                )
+            for payment in payments:
+                result = matched.pop(payment.payment_request_id)[0]
+                result.update(
+                    status='settled',
+                    payment_id=payment.id,
+                    or_number=payment.or_number,
+                    change_given=str(payment.change_given),
+                )
+            # paid by someone else between the read above and the claim
+            for result, payment_request in matched.values():
+                result.update(status='rejected', error='This request is already PAID.')
+
+        summary = {status: 0 for status in ('ready', 'settled', 'rejected')}
+        total = Decimal('0.00')
+        for result in results:
+            summary[result['status']] += 1
+            if result['status'] != 'rejected':
+                total += Decimal(result['amount'])
+        return JsonResponse({'results': results, 'total_amount': str(total), **summary})
+
+    @staticmethod
+    def parse_payload(payload):
+        """(request_id, signature, error) for a scanned PAYMENT_REQUEST|<uuid>|<sig> string"""
+        parts = str(payload or '').strip().split('|')
+        if len(parts) != 3 or parts[0] != 'PAYMENT_REQUEST':
+            return None, None, 'Not a payment request QR code.'
+        try:
+            request_id = str(uuid.UUID(parts[1].strip()))
+        except ValueError:
+            return None, None, 'Invalid Payment Request ID format.'
+        return request_id, parts[2].strip(), None
+
+    @staticmethod
+    def parse_amount(value, fee_amount):
+        """(amount_received, error); a missing amount means the exact fee was paid"""
+        if value in (None, ''):
+            return fee_amount, None
+        try:
+            amount_received = Decimal(str(value)).quantize(Decimal('0.01'))
+        except (ArithmeticError, ValueError):
+            return None, 'Invalid amount received.'
+        if amount_received.is_nan():
+            return None, 'Invalid amount received.'
+        if amount_received < fee_amount:
+            return None, f"Amount received (₱{amount_received:.2f}) must be equal to or greater than the fee amount (₱{fee_amount:.2f})."
+        return amount_received, None
+
 class OfficerScanQRView(OfficerRequiredMixin, TemplateView):
     # scan qr codes
     template_name = 'officer_scan_qr.html'
@@ -1769,7 +2166,8 @@ class PostBulkPaymentView(OfficerRequiredMixin, View):
         }
         return render(request, self.template_name, context)
     
-    @transaction.atomic
+    # Not wrapped in a single transaction: post_to_students commits per chunk
+    # so a large posting doesn't hold the SQLite write lock for the whole request
     def post(self, request):
         organization = self.get_organization()
         if not organization:
@@ -1801,61 +2199,14 @@ class PostBulkPaymentView(OfficerRequiredMixin, View):
             )
             
             if not created:
-                # update amount and year level if fee type already exists
+                # update amount and year level if fee type already exists, and
+                # re-activate it: posting a deactivated fee means it's collected again
                 fee_type.amount = fee_amount
                 fee_type.applicable_year_levels = applicable_year_level
+                fee_type.is_active = True
                 fee_type.save()
             
-            # Select eligible students scoped to the organization level
-            # Program-level: only students whose course.program_type matches org.program_affiliation
-            # College-level: students in the same college/department
-            students = Student.objects.filter(is_active=True)
-            if organization.hierarchy_level == 'PROGRAM':
-                if organization.program_affiliation:
-                    program_type = normalize_program_affiliation(organization.program_affiliation)
-                    if program_type:
-                        students = students.filter(course__program_type=program_type)
-                    else:
-                        # If program code is unknown, avoid cross-program posting
-                        students = students.none()
-                else:
-                    # If program affiliation is missing, avoid cross-program posting
-                    students = students.none()
-            elif organization.hierarchy_level == 'COLLEGE':
-                # Match by college name to department string
-                students = students.filter(college__name=organization.department)
-            
-            if applicable_year_level != 'All':
-                students = students.filter(year_level=applicable_year_level)
-            
-            students = students.distinct()
-            
-            # exclude students who already paid this fee
-            paid_students = Payment.objects.filter(
-                fee_type=fee_type,
-                status='COMPLETED',
-                is_void=False
-            ).values_list('student_id', flat=True)
-            
-            # exclude students who already have a pending paymentrequest for this fee
-            pending_requests = PaymentRequest.objects.filter(
-                fee_type=fee_type,
-                status='PENDING'
-            ).values_list('student_id', flat=True)
-            
-            students = students.exclude(id__in=list(paid_students) + list(pending_requests))
-            
-            logger.info(f"Found {students.count()} eligible students for bulk payment in {organization.name}")
-            
-            if not students.exists():
-                messages.warning(request, "No eligible students found in your organization for this fee type.")
-                context = {'form': form, 'organization': organization}
-                return render(request, self.template_name, context)
-            
-            created_count = 0
-            failed_count = 0
-            
-            logger.info(f"Starting bulk payment posting: {len(list(students))} eligible students found")
+            students = get_bulk_posting_students(organization, applicable_year_level)
             
             # Determine expiry date - use payment_deadline if provided, otherwise 30 days
             if payment_deadline:
@@ -1864,59 +2215,58 @@ class PostBulkPaymentView(OfficerRequiredMixin, View):
             else:
                 expires_at = timezone.now() + timedelta(days=30)
             
-            # create paymentrequest objects for each student
-            for student in students:
-                try:
-                    logger.debug(f"Creating payment request for student {student.student_id_number}")
-                    # create paymentrequest with unique request_id
-                    # NOTE: qr_signature is left empty - it will be generated when the student
-                    # explicitly clicks "Generate QR" on their dashboard. This ensures the
-                    # dashboard first shows "Generate QR" instead of "View QR" after posting.
-                    payment_request = PaymentRequest.objects.create(
-                        student=student,
-                        organization=organization,
-                        fee_type=fee_type,
-                        amount=fee_amount,
-                        payment_method='CASH',  # Default, student will select when generating QR
-                        status='PENDING',
-                        expires_at=expires_at,
-                        qr_signature='',  # Will be generated when student clicks "Generate QR"
-                        created_by=request.user,  # Track who posted this bulk payment
-                        notes=notes
-                    )
-                    
-                    created_count += 1
-                    logger.debug(f"Successfully created payment request {payment_request.request_id}")
-                    
-                except Exception as e:
-                    logger.error(f'Error creating payment request for {student.student_id_number}: {str(e)}', exc_info=True)
-                    failed_count += 1
-                    continue
+            # Large postings go to the background job worker instead of blocking this request
+            threshold = getattr(settings, 'BULK_POSTING_BACKGROUND_THRESHOLD', 0)
+            if threshold and (student_count := students.count()) >= threshold:
+                job = Job.enqueue('BULK_POSTING', payload={
+                    'organization_id': organization.id,
+                    'fee_type_id': fee_type.id,
+                    'applicable_year_level': applicable_year_level,
+                    'expires_at': expires_at.isoformat(),
+                    'notes': notes,
+                    'ip_address': request.META.get('REMOTE_ADDR'),
+                }, created_by=request.user)
+                messages.info(
+                    request,
+                    f"Posting {fee_type_name} to up to {student_count} students in the background "
+                    f"(job {job.job_id}). Students will see the fee on their dashboard once it finishes."
+                )
+                return redirect('officer_dashboard')
             
-            ActivityLog.objects.create(
-                user=request.user,
-                action='bulk_payment_posted',
-                description=f'Posted bulk payment request for {fee_type_name} to {created_count} students in {organization.name}.',
+            result = BulkPaymentPosting.post_to_students(
+                students,
+                organization=organization,
+                fee_type=fee_type,
+                amount=fee_amount,
+                expires_at=expires_at,
+                posted_by=request.user,
+                notes=notes,
                 ip_address=request.META.get('REMOTE_ADDR')
             )
+            created_count = result['created']
+            failed_count = result['failed']
+            logger.info(
+                f"Bulk payment for {fee_type_name} in {organization.name}: "
+                f"{created_count} created, {result['skipped']} skipped, {failed_count} failed"
+            )
             
-            # Track the bulk posting
-            if created_count > 0:
-                BulkPaymentPosting.objects.create(
-                    organization=organization,
-                    fee_type=fee_type,
-                    amount=fee_amount,
-                    posted_by=request.user,
-                    student_count=created_count,
-                    notes=notes
-                )
+            if created_count == 0 and failed_count == 0:
+                if result['skipped'] > 0:
+                    messages.warning(request, f"All {result['skipped']} eligible student(s) already paid or have a pending request for this fee type.")
+                else:
+                    messages.warning(request, "No eligible students found in your organization for this fee type.")
+                context = {'form': form, 'organization': organization}
+                return render(request, self.template_name, context)
             
             messages.success(
                 request,
-                f"Payment posted successfully for {fee_type_name}. "
+                f"Payment posted successfully for {fee_type_name} to {created_count} student(s). "
                 f"Students can now generate QR codes from their dashboard to pay."
             )
             
+            if result['skipped'] > 0:
+                messages.info(request, f"{result['skipped']} student(s) already paid or have a pending request for this fee.")
+            
             if failed_count > 0:
                 messages.warning(request, f"{failed_count} payment request(s) failed to create.")
             
@@ -2125,39 +2475,166 @@ class UpdateOfficerProfileView(LoginRequiredMixin, UpdateView):
         else:
             return self.form_invalid(form)
 
-class PaymentRequestStatusAPI(LoginRequiredMixin, View):
+class PaymentRequestStatusAPI(View):
+    """
+    Status polling for the QR pages. Reads the cached status record
+    (PaymentRequest.get_cached_status) and checks it against request.user,
+    so the request row is not loaded.
+    Responses carry an ETag; a matching If-None-Match gets a 304. When push
+    is enabled (status_events.push_enabled), ?wait=<seconds> holds the
+    request open (long-poll) until the status changes or the wait ends.
+    """
     def get(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'status': 'NOT_AUTHENTICATED', 'error': 'Login required'}, status=401)
+        
         request_id = self.kwargs['request_id']
+        record = PaymentRequest.get_cached_status(request_id)
+        if record is None or record['user_id'] != request.user.pk:
+            return JsonResponse({'status': 'NOT_FOUND', 'error': 'Payment request not found'}, status=404)
+
+        data = self.get_status_data(record)
+        etag = status_events.status_etag(data)
+        if request.headers.get('If-None-Match') == etag:
+            wait = self.get_wait_seconds(request) if status_events.push_enabled(request) else 0
+            if wait and record['status'] == 'PENDING':
+                close_old_connections()
+                if status_events.broker.wait(request_id, wait) is not None:
+                    data = self.get_status_data(PaymentRequest.get_cached_status(request_id))
+                    etag = status_events.status_etag(data)
+            if request.headers.get('If-None-Match') == etag:
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                response['Cache-Control'] = 'private, no-cache'
+                return response
+            
+        response = JsonResponse(data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def get_status_data(self, record):
+        # unsaved instance so expiry/time-remaining rules stay on the model
+        payment_request = PaymentRequest(status=record['status'])
+        data = {
+            'status': record['status'],
+            'is_expired': payment_request.is_expired(),
+            'time_remaining': payment_request.get_time_remaining(),
+        }
+        if record['status'] == 'PAID' and record['payment_id']:
+            data['payment_id'] = record['payment_id']
+        return data
+
+    def get_wait_seconds(self, request):
         try:
-            # Check if user has student profile
-            if not hasattr(request.user, 'student_profile'):
-                return JsonResponse({'status': 'NOT_STUDENT', 'error': 'User is not a student'}, status=403)
-            
-            payment_request = PaymentRequest.objects.get(
-                request_id=request_id,
-                student=request.user.student_profile
-            )
-            
-            if payment_request.status == 'PENDING' and payment_request.is_expired():
-                payment_request.status = 'EXPIRED'
-                payment_request.save()
+            wait = float(request.GET.get('wait', 0))
+        except ValueError:
+            return 0
+        return max(0, min(wait, settings.PAYMENT_STATUS_LONGPOLL_MAX_WAIT))
 
-            data = {
-                'status': payment_request.status,
-                'is_expired': payment_request.is_expired(),
-                'time_remaining': payment_request.get_time_remaining(),
-            }
-            if payment_request.status == 'PAID' and hasattr(payment_request, 'payment'):
-                data['payment_id'] = payment_request.payment.id
-                
-            return JsonResponse(data)
-            
-        except PaymentRequest.DoesNotExist:
+
+class PaymentRequestStatusStreamView(LoginRequiredMixin, View):
+    """
+    Server-Sent Events stream that pushes the request's status as soon as it is paid.
+    Answers 204 (which tells EventSource to stop reconnecting) when push is disabled.
+    """
+    def get(self, request, *args, **kwargs):
+        if not status_events.push_enabled(request):
+            return HttpResponse(status=204)
+        if not hasattr(request.user, 'student_profile'):
+            return JsonResponse({'status': 'NOT_STUDENT', 'error': 'User is not a student'}, status=403)
+        
+        row = PaymentRequest.objects.filter(
+            request_id=self.kwargs['request_id'],
+            student=request.user.student_profile
+        ).values_list('status', 'payment__id').first()
+        if row is None:
             return JsonResponse({'status': 'NOT_FOUND', 'error': 'Payment request not found'}, status=404)
-        except AttributeError as e:
-            return JsonResponse({'status': 'ERROR', 'error': str(e)}, status=500)
-        except ValueError:
-            return JsonResponse({'status': 'INVALID_ID'}, status=400)
+        
+        status, payment_id = row
+        event = status_events.make_event(status, payment_id)
+        content = status_events.astream_status(self.kwargs['request_id'], event)
+        response = StreamingHttpResponse(content, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class JobStatusAPI(LoginRequiredMixin, View):
+    """Progress polling for background jobs; visible to the job owner and staff"""
+    def get(self, request, *args, **kwargs):
+        try:
+            job = Job.objects.get(job_id=self.kwargs['job_id'])
+        except Job.DoesNotExist:
+            return JsonResponse({'status': 'NOT_FOUND', 'error': 'Job not found'}, status=404)
+        
+        if job.created_by_id != request.user.id and not request.user.is_staff:
+            return JsonResponse({'status': 'NOT_FOUND', 'error': 'Job not found'}, status=404)
+        
+        data = job.to_dict()
+        if job.status == 'SUCCEEDED' and job.kind == 'PAYMENT_EXPORT':
+            data['download_url'] = reverse('job_download', kwargs={'job_id': job.job_id})
+        return JsonResponse(data)
+
+
+class JobDownloadView(LoginRequiredMixin, View):
+    """Download the file produced by a finished export job"""
+    def get(self, request, *args, **kwargs):
+        from django.http import FileResponse
+        from .jobs import get_job_results_storage
+        
+        job = get_object_or_404(Job, job_id=self.kwargs['job_id'], status='SUCCEEDED')
+        if job.created_by_id != request.user.id and not request.user.is_staff:
+            raise Http404("Job not found")
+        
+        filename = (job.result or {}).get('file')
+        storage = get_job_results_storage()
+        if not filename or not storage.exists(filename):
+            raise Http404("Job output is no longer available")
+        return FileResponse(storage.open(filename, 'rb'), as_attachment=True, filename=filename)
+
+
+class CurrentPeriodCacheStatsAPI(StaffRequiredMixin, View):
+    """Hit/miss counters of the current academic period cache (this worker process)"""
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(get_current_period_cache_stats())
+
+
+class SQLProfileView(StaffRequiredMixin, TemplateView):
+    """Recent request profiles from SQLProfilingMiddleware (this worker process)"""
+    template_name = 'admin/sql_profile.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        n_plus_one_only = self.request.GET.get('n_plus_one') == '1'
+        context['profiling_enabled'] = getattr(settings, 'SQL_PROFILING_ENABLED', False)
+        context['n_plus_one_threshold'] = getattr(settings, 'SQL_PROFILING_N_PLUS_ONE_THRESHOLD', 5)
+        context['n_plus_one_only'] = n_plus_one_only
+        context['profiles'] = profile_buffer.recent(n_plus_one_only=n_plus_one_only)
+        return context
+
+    def post(self, request, *args, **kwargs):
+        profile_buffer.clear()
+        messages.success(request, "SQL profiles cleared.")
+        return redirect('sql_profile')
+
+
+class SQLProfileAPI(StaffRequiredMixin, View):
+    """JSON of the same request profiles, for scripts and load-test runs"""
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({
+            'enabled': getattr(settings, 'SQL_PROFILING_ENABLED', False),
+            'profiles': profile_buffer.recent(n_plus_one_only=request.GET.get('n_plus_one') == '1'),
+        })
+
+
+class MetricsView(View):
+    """Payment lifecycle metrics for Prometheus; staff session or METRICS_TOKEN bearer token"""
+    def get(self, request, *args, **kwargs):
+        if not (request.user.is_staff or metrics.token_matches(request.headers.get('Authorization', ''))):
+            return HttpResponse('Forbidden', status=403, content_type='text/plain')
+        return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
 
 
 class CreateOrganizationView(AllOrgAdminMixin, CreateView):
@@ -2326,9 +2803,12 @@ class FeeTypeDeleteView(SuperOfficerOrStaffMixin, DeleteView):
         
         # Cancel any pending payment requests for this fee type
         pending_requests = PaymentRequest.objects.filter(fee_type=fee_type, status='PENDING')
-        cancelled_count = pending_requests.count()
+        cancelled_ids = list(pending_requests.values_list('request_id', flat=True))
+        cancelled_count = len(cancelled_ids)
         if cancelled_count > 0:
             pending_requests.update(status='CANCELLED')
+            PaymentRequest.forget_cached_statuses(cancelled_ids)
+            invalidate_dashboard_snapshots([fee_type.organization_id])
             ActivityLog.objects.create(
                 user=user,
                 action='payment_requests_cancelled',
@@ -2344,33 +2824,78 @@ class FeeTypeDeleteView(SuperOfficerOrStaffMixin, DeleteView):
 
 # student crud
 class StudentListView(SuperOfficerOrStaffMixin, ListView):
+    """
+    Students in name order (a super officer sees their organization's members).
+    Pages are keyset-paginated: ?after=<id> / ?before=<id> continue from that
+    student's (last_name, first_name, id) through the name index, so a deep
+    page costs the same as the first and no COUNT(*) is needed.
+    """
     model = Student
     template_name = 'admin/student_list.html'
     context_object_name = 'students'
-    paginate_by = 25
+    page_size = 25
     
     def get_queryset(self):
-        queryset = Student.objects.select_related('user').all()
+        queryset = Student.objects.select_related('course__college')
         
         # Filter by organization if super officer
         org = self.get_user_organization()
         if org:
-            # Get all students who have fees in this organization
-            queryset = queryset.filter(applicable_fees__organization=org).distinct()
+            queryset = org.get_member_students(queryset)
         
-        search = self.request.GET.get('search')
+        search = self.request.GET.get('search', '').strip()
         if search:
-            queryset = queryset.filter(
-                Q(student_id_number__icontains=search) |
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(email__icontains=search)
+            queryset = StudentSearchTerm.search(queryset, search)
+        return queryset
+    
+    def get_cursor(self, name):
+        """(last_name, first_name, id) of the student named by ?after= or ?before=, or None"""
+        value = self.request.GET.get(name, '')
+        if not value.isdigit():
+            return None
+        return Student.objects.filter(pk=value).values_list('last_name', 'first_name', 'id').first()
+    
+    @staticmethod
+    def keyset_filter(cursor, lookup):
+        """Rows strictly after (lookup 'gt') or before ('lt') the cursor in name order"""
+        last_name, first_name, pk = cursor
+        return Q(**{f'last_name__{lookup}e': last_name}) & (
+            Q(**{f'last_name__{lookup}': last_name}) |
+            Q(last_name=last_name, **{f'first_name__{lookup}': first_name}) |
+            Q(last_name=last_name, first_name=first_name, **{f'id__{lookup}': pk})
+        )
+    
+    def get_page(self, queryset):
+        """The page of students plus whether there are pages before and after it"""
+        before = self.get_cursor('before')
+        if before:
+            students = list(
+                queryset.filter(self.keyset_filter(before, 'lt'))
+                .order_by('-last_name', '-first_name', '-id')[:self.page_size + 1]
             )
-        return queryset.order_by('last_name', 'first_name')
+            has_previous = len(students) > self.page_size
+            return students[:self.page_size][::-1], has_previous, True
+        after = self.get_cursor('after')
+        if after:
+            queryset = queryset.filter(self.keyset_filter(after, 'gt'))
+        students = list(queryset.order_by('last_name', 'first_name', 'id')[:self.page_size + 1])
+        return students[:self.page_size], after is not None, len(students) > self.page_size
     
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+        students, has_previous, has_next = self.get_page(self.object_list)
+        # one grouped count for the page instead of a query per row
+        pending_counts = dict(
+            PaymentRequest.objects.filter(student__in=students, status='PENDING')
+            .order_by().values_list('student_id').annotate(count=Count('id'))
+        )
+        for student in students:
+            student.pending_payments_count = pending_counts.get(student.id, 0)
+        
+        context = super().get_context_data(object_list=students, **kwargs)
         context['search_query'] = self.request.GET.get('search', '')
+        # ids of the first and last row, the cursors of the neighbouring pages
+        context['previous_cursor'] = students[0].pk if has_previous and students else None
+        context['next_cursor'] = students[-1].pk if has_next and students else None
         context['is_super_officer'] = hasattr(self.request.user, 'officer_profile') and self.request.user.officer_profile.is_super_officer
         if context['is_super_officer']:
             context['organization'] = self.request.user.officer_profile.organization
@@ -2386,8 +2911,8 @@ class StudentDetailView(SuperOfficerOrStaffMixin, DetailView):
         # Check if super officer has access to this student
         org = self.get_user_organization()
         if org:
-            # Verify student has fees in this organization
-            if not student.applicable_fees.filter(organization=org).exists():
+            # Verify student is a member of this organization
+            if not org.has_member(student):
                 raise Http404("Student not found in your organization")
         return student
     
@@ -2412,7 +2937,7 @@ class StudentUpdateView(SuperOfficerOrStaffMixin, UpdateView):
         # Check if super officer has access to this student
         org = self.get_user_organization()
         if org:
-            if not student.applicable_fees.filter(organization=org).exists():
+            if not org.has_member(student):
                 raise Http404("Student not found in your organization")
         return student
     
@@ -2432,7 +2957,7 @@ class StudentDeleteView(SuperOfficerOrStaffMixin, DeleteView):
         # Check if super officer has access to this student
         org = self.get_user_organization()
         if org:
-            if not student.applicable_fees.filter(organization=org).exists():
+            if not org.has_member(student):
                 raise Http404("Student not found in your organization")
         return student
     
@@ -2703,7 +3228,10 @@ class PaymentListView(LoginRequiredMixin, ListView):
 
 
 class ExportPaymentsView(LoginRequiredMixin, View):
-    """Export payments to CSV for officers"""
+    """
+    Stream payments as CSV (default) or XLSX for officers.
+    ?format=xlsx, ?compress=gzip (CSV only), ?background=1 queues it as a job.
+    """
     
     def get(self, request):
         user = request.user
@@ -2712,85 +3240,34 @@ class ExportPaymentsView(LoginRequiredMixin, View):
         if not hasattr(user, 'officer_profile') and not user.is_staff:
             return Http404("Not authorized to export payments")
         
-        # Build queryset with same filters as PaymentListView
-        queryset = Payment.objects.select_related(
-            'student', 'organization', 'fee_type', 'processed_by'
-        ).all()
-        
-        # Filter by organization if officer
-        if hasattr(user, 'officer_profile'):
-            accessible_org_ids = user.officer_profile.organization.get_accessible_organization_ids()
-            queryset = queryset.filter(organization_id__in=accessible_org_ids)
-        
-        # Apply filters
-        status_filter = request.GET.get('status')
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        
-        void_filter = request.GET.get('is_void')
-        if void_filter == 'true':
-            queryset = queryset.filter(is_void=True)
-        elif void_filter == 'false':
-            queryset = queryset.filter(is_void=False)
-        
-        date_from = request.GET.get('date_from')
-        date_to = request.GET.get('date_to')
-        if date_from:
-            queryset = queryset.filter(created_at__date__gte=date_from)
-        if date_to:
-            queryset = queryset.filter(created_at__date__lte=date_to)
-        
-        semester_filter = request.GET.get('semester')
-        if semester_filter:
-            queryset = queryset.filter(fee_type__semester=semester_filter)
-        
-        queryset = queryset.order_by('-created_at')
-        
-        # Create CSV response
-        response = HttpResponse(content_type='text/csv')
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponse(f"Unsupported export format: {export_format}", status=400)
+        compress = request.GET.get('compress') == 'gzip' and export_format == 'csv'
+        
+        if request.GET.get('background') == '1':
+            filters = {key: request.GET.get(key) for key in PAYMENT_EXPORT_FILTERS if request.GET.get(key)}
+            job = Job.enqueue('PAYMENT_EXPORT', payload={
+                'filters': filters,
+                'format': export_format,
+                'compress': compress,
+            }, created_by=user)
+            return JsonResponse({
+                'job_id': str(job.job_id),
+                'status': job.status,
+                'status_url': reverse('api_job_status', kwargs={'job_id': job.job_id}),
+            }, status=202)
+        
+        queryset = get_export_payments_queryset(user, request.GET)
+        writer, content_type, extension = EXPORT_FORMATS[export_format]
+        stream = writer(PAYMENT_EXPORT_HEADER, iter_payment_export_rows(queryset))
+        if compress:
+            stream = gzip_stream(stream)
+            content_type, extension = 'application/gzip', f'{extension}.gz'
+        
+        response = StreamingHttpResponse(stream, content_type=content_type)
         timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-        response['Content-Disposition'] = f'attachment; filename="payments_export_{timestamp}.csv"'
-        
-        writer = csv.writer(response)
-        # Write header
-        writer.writerow([
-            'OR Number',
-            'Date',
-            'Student ID',
-            'Student Name',
-            'Organization',
-            'Fee Type',
-            'Semester',
-            'Academic Year',
-            'Amount',
-            'Amount Received',
-            'Change Given',
-            'Status',
-            'Is Void',
-            'Payment Method',
-            'Processed By',
-        ])
-        
-        # Write data rows
-        for payment in queryset:
-            writer.writerow([
-                payment.or_number,
-                payment.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                payment.student.student_id_number,
-                payment.student.get_full_name(),
-                payment.organization.name,
-                payment.fee_type.name,
-                payment.fee_type.semester,
-                payment.fee_type.academic_year,
-                payment.amount,
-                payment.amount_received,
-                payment.change_given,
-                payment.status,
-                'Yes' if payment.is_void else 'No',
-                payment.get_payment_method_display() if hasattr(payment, 'get_payment_method_display') else payment.payment_method,
-                payment.processed_by.get_full_name() if payment.processed_by else 'N/A',
-            ])
-        
+        response['Content-Disposition'] = f'attachment; filename="payments_export_{timestamp}.{extension}"'
         return response
 
 
@@ -2828,6 +3305,11 @@ class PaymentDetailView(LoginRequiredMixin, DetailView):
             raise Http404("Payment not found")
         
         raise Http404("Payment not found")
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        attach_receipt_qr(getattr(self.object, 'receipt', None))
+        return context
 
 # academic year config crud
 class AcademicYearConfigListView(StaffRequiredMixin, ListView):
@@ -2905,6 +3387,14 @@ class ReceiptDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'receipt'
     
     def get_queryset(self):
+        return self.get_accessible_receipts().select_related(
+            'payment__student__user',
+            'payment__organization',
+            'payment__fee_type',
+            'payment__processed_by__user',
+        )
+    
+    def get_accessible_receipts(self):
         user = self.request.user
         # Superusers and staff can see all receipts
         if user.is_staff or user.is_superuser:
@@ -2924,6 +3414,31 @@ class ReceiptDetailView(LoginRequiredMixin, DetailView):
             # Regular officers can see receipts from their org + children
             return Receipt.objects.filter(payment__organization_id__in=accessible_org_ids)
         return Receipt.objects.none()
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        attach_receipt_qr(self.object)
+        return context
+
+
+class ReceiptEmailView(ReceiptDetailView):
+    """
+    GET previews the receipt exactly as emailed to the student (served from
+    the render cache); POST queues it in the EmailOutbox for dispatch_emails.
+    """
+    def get(self, request, *args, **kwargs):
+        receipt = self.get_object()
+        html_content = render_receipt_email(receipt, prefetched=True)[1]
+        return HttpResponse(html_content)
+    
+    def post(self, request, *args, **kwargs):
+        receipt = self.get_object()
+        if not receipt.payment.student.email:
+            messages.error(request, "This student has no email address on file.")
+        else:
+            EmailOutbox.queue_receipt(receipt)
+            messages.success(request, f"Receipt OR#{receipt.or_number} queued for {receipt.payment.student.email}.")
+        return redirect('receipt_detail', pk=receipt.pk)
 
 # activity log views
 class ActivityLogListView(StaffRequiredMixin, ListView):
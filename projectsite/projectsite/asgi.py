@@ -3,6 +3,11 @@ ASGI config for projectsite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving under ASGI (e.g. ``uvicorn projectsite.asgi:application``) with a
+shared cache enables the payment status SSE streams (/api/request/<id>/events/),
+which wait as coroutines instead of holding one worker thread each; see
+PAYMENT_STATUS_PUSH in settings.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -74,6 +74,7 @@ AUTHENTICATION_BACKENDS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'paymentorg.middleware.SQLProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -81,6 +82,7 @@ MIDDLEWARE = [
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'paymentorg.middleware.CurrentPeriodMiddleware',
 ]
 
 ROOT_URLCONF = 'projectsite.urls'
@@ -113,10 +115,122 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # BEGIN IMMEDIATE takes SQLite's write lock when a transaction starts, so
+        # two booths settling the same QR queue up (for up to `timeout` seconds)
+        # instead of failing with "database is locked" when a read turns into a write
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': int(os.environ.get('SQLITE_TIMEOUT', '20')),
+        },
     }
 }
 
 
+# Cache
+# LocMemCache is per-process (fine for a single worker). When running several
+# workers, point CACHE_BACKEND/CACHE_LOCATION at a shared file or database cache, e.g.
+# django.core.cache.backends.filebased.FileBasedCache + /var/tmp/unipay_cache
+# django.core.cache.backends.db.DatabaseCache + unipay_cache (run createcachetable)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'unipay'),
+    },
+    # Rendered receipt emails keyed by OR number; MAX_ENTRIES bounds memory (oldest entries are culled)
+    'receipts': {
+        'BACKEND': os.environ.get('RECEIPT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('RECEIPT_CACHE_LOCATION', 'unipay-receipts'),
+        'TIMEOUT': int(os.environ.get('RECEIPT_RENDER_CACHE_TIMEOUT', 86400)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('RECEIPT_RENDER_CACHE_SIZE', 500)),
+        },
+    },
+}
+
+# Seconds the current AcademicYearConfig stays cached; also bounds staleness
+# for workers that did not see the invalidation (per-process caches)
+CURRENT_PERIOD_CACHE_TIMEOUT = int(os.environ.get('CURRENT_PERIOD_CACHE_TIMEOUT', 300))
+
+# Seconds an organization's accessible-ids list (self + child orgs) stays cached
+ORG_HIERARCHY_CACHE_TIMEOUT = int(os.environ.get('ORG_HIERARCHY_CACHE_TIMEOUT', 300))
+
+# True when all worker processes see the same default cache (not the per-process LocMemCache)
+CACHE_IS_SHARED = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+
+# cached_db saves the session query on every request (including status polls). It is
+# the default only with a shared cache: with LocMemCache a logout in one worker would
+# leave the session alive in the other workers' cached copies
+SESSION_ENGINE = os.environ.get(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if CACHE_IS_SHARED else 'django.contrib.sessions.backends.db'
+)
+
+# Seconds an organization's officer dashboard snapshot stays cached; payments,
+# requests and postings drop it sooner in this process (and in a shared cache)
+DASHBOARD_SNAPSHOT_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_SNAPSHOT_CACHE_TIMEOUT', 10))
+
+# Seconds a payment request's status record stays cached for the status API once it
+# is PAID/CANCELLED/EXPIRED, and while it is PENDING (short: other workers' caches
+# are not told when the request is settled)
+PAYMENT_REQUEST_STATUS_CACHE_TIMEOUT = int(os.environ.get('PAYMENT_REQUEST_STATUS_CACHE_TIMEOUT', 3600))
+PAYMENT_REQUEST_PENDING_STATUS_CACHE_TIMEOUT = int(os.environ.get('PAYMENT_REQUEST_PENDING_STATUS_CACHE_TIMEOUT', 2))
+
+# Payment status push (SSE / long-poll). Streams close after STREAM_TIMEOUT and the
+# browser reconnects; waiters re-check the shared cache every RECHECK_SECONDS for
+# events published by other worker processes
+PAYMENT_STATUS_STREAM_TIMEOUT = int(os.environ.get('PAYMENT_STATUS_STREAM_TIMEOUT', 55))
+PAYMENT_STATUS_HEARTBEAT_SECONDS = int(os.environ.get('PAYMENT_STATUS_HEARTBEAT_SECONDS', 15))
+PAYMENT_STATUS_RECHECK_SECONDS = float(os.environ.get('PAYMENT_STATUS_RECHECK_SECONDS', 2))
+PAYMENT_STATUS_LONGPOLL_MAX_WAIT = int(os.environ.get('PAYMENT_STATUS_LONGPOLL_MAX_WAIT', 25))
+
+# SSE streams and ?wait= long-polls are only served when this is on and the request
+# came through asgi.py: under WSGI every open stream holds a worker, and with
+# LocMemCache a payment taken by another process is only seen when the stream times
+# out. Otherwise the QR pages fall back to plain ETag/304 polling.
+PAYMENT_STATUS_PUSH = os.environ.get('PAYMENT_STATUS_PUSH', str(CACHE_IS_SHARED)).lower() in ('1', 'true', 'yes')
+
+# QR signatures from before per-purpose keys (bare hex, no key id) stay valid
+# until this is turned off; see paymentorg/signing.py
+QR_SIGNING_ACCEPT_LEGACY = os.environ.get('QR_SIGNING_ACCEPT_LEGACY', 'true').lower() in ('1', 'true', 'yes')
+
+# Payments a booth may upload in one offline sync batch
+OFFLINE_PAYMENT_SYNC_MAX_ITEMS = int(os.environ.get('OFFLINE_PAYMENT_SYNC_MAX_ITEMS', 200))
+
+# Student QRs an officer may settle together in rapid-scan mode
+RAPID_SCAN_MAX_ITEMS = int(os.environ.get('RAPID_SCAN_MAX_ITEMS', 50))
+
+# OR serials each worker reserves at a time from an organization's sequence;
+# larger blocks mean less contention on the sequence row but longer gaps
+# (reserved, never printed) when a worker restarts
+OR_NUMBER_BLOCK_SIZE = int(os.environ.get('OR_NUMBER_BLOCK_SIZE', 20))
+
+# Payment requests inserted per transaction when posting a fee in bulk
+BULK_POSTING_CHUNK_SIZE = int(os.environ.get('BULK_POSTING_CHUNK_SIZE', 500))
+
+# Bulk postings reaching this many students are queued for the `run_jobs` worker
+# instead of running inside the request (0 disables background posting)
+BULK_POSTING_BACKGROUND_THRESHOLD = int(os.environ.get('BULK_POSTING_BACKGROUND_THRESHOLD', 1000))
+
+# Output files written by background jobs (CSV exports)
+JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR', str(BASE_DIR / 'job_results'))
+
+# Per-request SQL profiling: Server-Timing headers (staff users only) and the last
+# BUFFER_SIZE requests per worker at /staff/sql-profile/. Off by default; SAMPLE_RATE profiles a share of
+# requests, and a statement repeated THRESHOLD times in one request is flagged as N+1
+SQL_PROFILING_ENABLED = os.environ.get('SQL_PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+SQL_PROFILING_SAMPLE_RATE = float(os.environ.get('SQL_PROFILING_SAMPLE_RATE', 1.0))
+SQL_PROFILING_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_PROFILING_N_PLUS_ONE_THRESHOLD', 5))
+SQL_PROFILING_BUFFER_SIZE = int(os.environ.get('SQL_PROFILING_BUFFER_SIZE', 200))
+
+# Payment lifecycle metrics at /api/staff/metrics/ (Prometheus text format). A background
+# thread in each worker adds its samples to METRICS_FILE (a SQLite file all workers share)
+# every FLUSH_INTERVAL seconds; empty keeps them per process. A scraper authenticates with "Bearer METRICS_TOKEN"
+METRICS_FILE = os.environ.get('METRICS_FILE', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -161,6 +275,10 @@ STATICFILES_DIRS = [
 # Where static files will be collected for production
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Uploaded and generated files (receipt QR codes, PDFs)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', str(BASE_DIR / 'media'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -208,6 +326,10 @@ else:
 
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'UniPay System <noreply@unipay.com>')
 
+# EmailOutbox retry backoff: base delay doubles per failed attempt, up to the maximum
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = int(os.environ.get('EMAIL_OUTBOX_RETRY_BASE_SECONDS', 60))
+EMAIL_OUTBOX_MAX_RETRY_DELAY = int(os.environ.get('EMAIL_OUTBOX_MAX_RETRY_DELAY', 3600))
+
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
     SESSION_COOKIE_SECURE = True
@@ -268,6 +390,18 @@ PWA_APP_ICONS_APPLE = [
 PWA_APP_DIR = 'ltr'
 PWA_SERVICE_WORKER_PATH = os.path.join(BASE_DIR, 'static/js', 'service-worker.js')
 
+# Service worker precache (see `manage.py build_precache_manifest`). Static files
+# larger than this are left to the runtime cache instead of the install step
+PWA_PRECACHE_MAX_BYTES = int(os.environ.get('PWA_PRECACHE_MAX_BYTES', 256 * 1024))
+# Version-pinned CDN assets used by the booth pages
+PWA_PRECACHE_EXTERNAL_URLS = [
+    'https://unpkg.com/html5-qrcode@2.3.8/html5-qrcode.min.js',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js',
+    'https://cdn.jsdelivr.net/npm/lucide@0.344.0/dist/umd/lucide.min.js',
+    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.2/css/all.min.css',
+]
+
 
     
 SOCIALACCOUNT_LOGIN_ON_GET = True
@@ -14,7 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.contrib import admin
 from django.contrib.auth import views as auth_views
 from paymentorg import views
@@ -52,7 +52,20 @@ urlpatterns = [
     path('student/request/<uuid:request_id>/', views.PaymentRequestDetailView.as_view(), name='payment_request_detail'),
     path('student/request/<uuid:request_id>/view-qr/', views.ViewPaymentRequestQRView.as_view(), name='view_payment_request_qr'),
     path('student/request/<uuid:request_id>/qr/', views.ShowPaymentQRView.as_view(), name='show_payment_qr'),
+    re_path(
+        r'^media/qr/(?P<shard>[0-9a-f]{2})/(?P<digest>[0-9a-f]{64})\.(?P<fmt>png|svg)$',
+        views.QRImageView.as_view(),
+        name='qr_image',
+    ),
     path('api/request/<uuid:request_id>/status/', views.PaymentRequestStatusAPI.as_view(), name='api_request_status'),
+    path('api/request/<uuid:request_id>/events/', views.PaymentRequestStatusStreamView.as_view(), name='api_request_events'),
+    path('api/officer/offline-payments/', views.OfflinePaymentSyncAPI.as_view(), name='api_offline_payment_sync'),
+    path('api/officer/rapid-scan/', views.RapidScanAPI.as_view(), name='api_rapid_scan'),
+    path('api/staff/current-period-cache/', views.CurrentPeriodCacheStatsAPI.as_view(), name='api_current_period_cache_stats'),
+    path('api/staff/sql-profile/', views.SQLProfileAPI.as_view(), name='api_sql_profile'),
+    path('api/staff/metrics/', views.MetricsView.as_view(), name='api_metrics'),
+    path('api/jobs/<uuid:job_id>/status/', views.JobStatusAPI.as_view(), name='api_job_status'),
+    path('jobs/<uuid:job_id>/download/', views.JobDownloadView.as_view(), name='job_download'),
 
     path('officer/dashboard/', views.OfficerDashboardView.as_view(), name='officer_dashboard'),
     path('officer/profile/update/', views.UpdateOfficerProfileView.as_view(), name='officer_profile_update'),
@@ -108,6 +121,7 @@ urlpatterns = [
     
     path('staff/receipts/', views.ReceiptListView.as_view(), name='receipt_list'),
     path('staff/receipts/<int:pk>/', views.ReceiptDetailView.as_view(), name='receipt_detail'),
+    path('staff/receipts/<int:pk>/email/', views.ReceiptEmailView.as_view(), name='receipt_email'),
     
     path('staff/academic-years/', views.AcademicYearConfigListView.as_view(), name='academicyear_list'),
     path('staff/academic-years/create/', views.AcademicYearConfigCreateView.as_view(), name='academicyear_create'),
@@ -115,7 +129,8 @@ urlpatterns = [
     path('staff/academic-years/<int:pk>/delete/', views.AcademicYearConfigDeleteView.as_view(), name='academicyear_delete'),
     
     path('staff/activity-logs/', views.ActivityLogListView.as_view(), name='activitylog_list'),
+    path('staff/sql-profile/', views.SQLProfileView.as_view(), name='sql_profile'),
     path('staff/org/<str:code>/dashboard/', views.AdminOrganizationDashboardView.as_view(), name='admin_org_dashboard'),
     
     path('', include('pwa.urls')),
-]
\ No newline at end of file
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
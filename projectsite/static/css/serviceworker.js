@@ -1,14 +0,0 @@
-// Minimal no-op service worker (development)
-self.addEventListener('install', (event) => {
-  self.skipWaiting();
-});
-
-self.addEventListener('activate', (event) => {
-  event.waitUntil(self.clients.claim());
-});
-
-self.addEventListener('fetch', (event) => {
-  // Passthrough - do not cache in development
-  return;
-});
-
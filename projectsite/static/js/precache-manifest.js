@@ -0,0 +1,54 @@
+// Generated by `python manage.py build_precache_manifest`; do not edit.
+self.UNIPAY_PRECACHE = {
+  "version": "b55f6a7845209615",
+  "entries": [
+    {
+      "url": "/static/Compendium.png",
+      "revision": "944e63eb214a8e68"
+    },
+    {
+      "url": "/static/css/style.css",
+      "revision": "d6288a729f39e60b"
+    },
+    {
+      "url": "/static/css/unipay-design-system.css",
+      "revision": "44dbab1670920b86"
+    },
+    {
+      "url": "/static/img/icon-192.png",
+      "revision": "47106b91397c8905"
+    },
+    {
+      "url": "/static/img/icon-512.png",
+      "revision": "43b8900eacff2ae0"
+    },
+    {
+      "url": "/static/uni.png",
+      "revision": "6a2c88a99a5b754e"
+    },
+    {
+      "url": "/static/unipaylogo.png",
+      "revision": "1dae8a142fde4a6a"
+    },
+    {
+      "url": "https://unpkg.com/html5-qrcode@2.3.8/html5-qrcode.min.js",
+      "revision": null
+    },
+    {
+      "url": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css",
+      "revision": null
+    },
+    {
+      "url": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js",
+      "revision": null
+    },
+    {
+      "url": "https://cdn.jsdelivr.net/npm/lucide@0.344.0/dist/umd/lucide.min.js",
+      "revision": null
+    },
+    {
+      "url": "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.2/css/all.min.css",
+      "revision": null
+    }
+  ]
+};
@@ -1,69 +1,361 @@
 // UniPay Service Worker
-const CACHE_NAME = 'unipay-v1';
-const urlsToCache = [
-  '/',
-  '/static/uni.png',
-];
+// Served at /serviceworker.js (root scope) by django-pwa from PWA_SERVICE_WORKER_PATH.
+//
+//  - Precache: the static files and pinned CDN assets listed in
+//    precache-manifest.js (rebuilt by `python manage.py build_precache_manifest`)
+//    are fetched at install time and served cache-first. Entries whose content
+//    hash did not change are copied from the previous precache, not re-downloaded.
+//  - Dashboards and the QR scanner are served stale-while-revalidate.
+//  - Payment submissions made while offline are queued in IndexedDB and
+//    uploaded in batches to the offline sync API by Background Sync, or when a
+//    page reports the booth is online.
+importScripts('/static/js/precache-manifest.js');
+
+const PRECACHE_PREFIX = 'unipay-precache-';
+const PRECACHE = PRECACHE_PREFIX + self.UNIPAY_PRECACHE.version;
+const RUNTIME_CACHE = 'unipay-runtime-v1';
+const PAGE_CACHE = 'unipay-pages-v1';
+const REVISIONS_KEY = '/__unipay-precache-revisions__';
+const STATIC_PREFIX = '/static/';
+
+const SYNC_TAG = 'unipay-payment-queue';
+const QUEUE_DB = 'unipay-offline';
+const QUEUE_STORE = 'payments';
+const SYNC_URL = '/api/officer/offline-payments/';
+const SYNC_BATCH_SIZE = 100;
+
+// Pages served stale-while-revalidate. They are rendered per user, so the page
+// cache is dropped whenever someone logs in or out.
+const SWR_PAGES = [/^\/officer\/dashboard\/$/, /^\/officer\/scan-qr\/$/, /^\/student\/dashboard\/$/];
+const SESSION_PAGES = [/^\/login\/$/, /^\/logout\/$/, /^\/accounts\//];
+// Payment form posts that are queued instead of failing when the network is down
+const QUEUEABLE_POSTS = [/^\/officer\/process\/[0-9a-f-]+\/[^/]+\/$/];
+
+const precacheRevisions = new Map(
+  self.UNIPAY_PRECACHE.entries.map((entry) => [new URL(entry.url, self.location).href, entry.revision])
+);
+
+// After any form post the next dashboard load must show fresh data (and the
+// flash message for that post), so it goes to the network first
+let pagesDirty = false;
+
+// ---------------------------------------------------------------------------
+// Install / activate
+// ---------------------------------------------------------------------------
+
+async function findPreviousPrecache() {
+  const names = (await caches.keys()).filter((name) => name.startsWith(PRECACHE_PREFIX) && name !== PRECACHE);
+  for (const name of names) {
+    const cache = await caches.open(name);
+    const stored = await cache.match(REVISIONS_KEY);
+    if (stored) {
+      return { cache, revisions: await stored.json() };
+    }
+  }
+  return null;
+}
+
+async function precache() {
+  const cache = await caches.open(PRECACHE);
+  const previous = await findPreviousPrecache();
+
+  await Promise.all(Array.from(precacheRevisions, async ([url, revision]) => {
+    if (previous && url in previous.revisions && previous.revisions[url] === revision) {
+      const cached = await previous.cache.match(url);
+      if (cached) {
+        await cache.put(url, cached);
+        return;
+      }
+    }
+    const external = new URL(url).origin !== self.location.origin;
+    try {
+      const response = await fetch(url, { cache: 'reload', mode: external ? 'cors' : 'same-origin', credentials: 'omit' });
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      await cache.put(url, response);
+    } catch (error) {
+      // A CDN hiccup should not block installing; the asset is cached at runtime instead
+      if (!external) {
+        throw error;
+      }
+      console.warn('Precache skipped', url, error);
+    }
+  }));
+
+  await cache.put(REVISIONS_KEY, new Response(JSON.stringify(Object.fromEntries(precacheRevisions))));
+}
 
-// Install event
 self.addEventListener('install', (event) => {
-  event.waitUntil(
-    caches.open(CACHE_NAME).then((cache) => {
-      return cache.addAll(urlsToCache);
-    })
-  );
-  self.skipWaiting();
+  event.waitUntil(precache().then(() => self.skipWaiting()));
 });
 
-// Activate event
 self.addEventListener('activate', (event) => {
+  const keep = new Set([PRECACHE, RUNTIME_CACHE, PAGE_CACHE]);
   event.waitUntil(
-    caches.keys().then((cacheNames) => {
-      return Promise.all(
-        cacheNames.map((cacheName) => {
-          if (cacheName !== CACHE_NAME) {
-            return caches.delete(cacheName);
-          }
-        })
-      );
-    })
+    caches.keys()
+      .then((names) => Promise.all(names.filter((name) => !keep.has(name)).map((name) => caches.delete(name))))
+      .then(() => self.clients.claim())
+      .then(() => replayQueue().catch(() => {}))
+  );
+});
+
+// ---------------------------------------------------------------------------
+// Caching strategies
+// ---------------------------------------------------------------------------
+
+async function cacheFirst(request, cacheName) {
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(request, { ignoreSearch: true });
+  if (cached) {
+    return cached;
+  }
+  const response = await fetch(request);
+  if (response.ok) {
+    cache.put(request, response.clone());
+  }
+  return response;
+}
+
+function isCacheablePage(response) {
+  // Skip redirects (e.g. to the login page) and error pages
+  return response.type === 'basic' && response.status === 200 && !response.redirected;
+}
+
+async function staleWhileRevalidate(event, cacheName, isPage) {
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(event.request);
+  const network = fetch(event.request).then((response) => {
+    const cacheable = isPage ? isCacheablePage(response) : response.ok || response.type === 'opaque';
+    if (cacheable) {
+      return cache.put(event.request, response.clone()).then(() => response);
+    }
+    if (isPage && response.type === 'opaqueredirect') {
+      // Logged out or lost access: do not keep serving the old page
+      return cache.delete(event.request).then(() => response);
+    }
+    return response;
+  });
+
+  if (cached) {
+    event.waitUntil(network.catch(() => {}));
+    return cached;
+  }
+  return network.catch(() => offlineResponse());
+}
+
+async function networkFirstPage(event) {
+  const cache = await caches.open(PAGE_CACHE);
+  try {
+    const response = await fetch(event.request);
+    if (isCacheablePage(response)) {
+      event.waitUntil(cache.put(event.request, response.clone()));
+    }
+    return response;
+  } catch (error) {
+    return (await cache.match(event.request)) || offlineResponse();
+  }
+}
+
+function offlineResponse() {
+  return new Response(
+    '<!DOCTYPE html><meta name="viewport" content="width=device-width, initial-scale=1">' +
+    '<title>Offline - UniPay</title>' +
+    '<p style="font-family:sans-serif;padding:2rem">You are offline and this page is not available yet. ' +
+    'It will load once the connection is back.</p>',
+    { status: 503, statusText: 'Service Unavailable', headers: { 'Content-Type': 'text/html; charset=utf-8' } }
   );
-  self.clients.claim();
+}
+
+// ---------------------------------------------------------------------------
+// Offline payment queue (IndexedDB + Background Sync)
+// ---------------------------------------------------------------------------
+
+function openQueue() {
+  return new Promise((resolve, reject) => {
+    const open = indexedDB.open(QUEUE_DB, 1);
+    open.onupgradeneeded = () => open.result.createObjectStore(QUEUE_STORE, { keyPath: 'id', autoIncrement: true });
+    open.onsuccess = () => resolve(open.result);
+    open.onerror = () => reject(open.error);
+  });
+}
+
+async function queueRequest(mode, operation) {
+  const db = await openQueue();
+  try {
+    return await new Promise((resolve, reject) => {
+      const transaction = db.transaction(QUEUE_STORE, mode);
+      const request = operation(transaction.objectStore(QUEUE_STORE));
+      transaction.oncomplete = () => resolve(request.result);
+      transaction.onerror = () => reject(transaction.error);
+    });
+  } finally {
+    db.close();
+  }
+}
+
+const enqueuePayment = (item) => queueRequest('readwrite', (store) => store.add(item));
+const queuedPayments = () => queueRequest('readonly', (store) => store.getAll());
+const dequeuePayment = (id) => queueRequest('readwrite', (store) => store.delete(id));
+
+async function notifyClients(message) {
+  const clients = await self.clients.matchAll({ includeUncontrolled: true });
+  clients.forEach((client) => client.postMessage(message));
+}
+
+let replaying = null;
+
+function replayQueue(csrfToken) {
+  // One replay at a time; sync events and "online" messages can overlap
+  if (!replaying) {
+    replaying = replayQueuedPayments(csrfToken).finally(() => { replaying = null; });
+  }
+  return replaying;
+}
+
+function toSyncRecord(item) {
+  // /officer/process/<request_id>/<signature>/ + the urlencoded payment form
+  const [, requestId, signature] = new URL(item.url).pathname.match(/^\/officer\/process\/([^/]+)\/([^/]+)\/$/);
+  const form = new URLSearchParams(item.body);
+  return {
+    client_id: item.id,
+    request_id: requestId,
+    signature: decodeURIComponent(signature),
+    amount_received: form.get('amount_received'),
+    payment_method: form.get('payment_method') || 'CASH',
+    notes: form.get('notes') || '',
+    officer: form.get('officer') || null,
+    recorded_at: new Date(item.queuedAt).toISOString(),
+  };
+}
+
+async function replayQueuedPayments(csrfToken) {
+  const items = await queuedPayments();
+  const summary = { type: 'payment-queue', applied: 0, duplicate: 0, rejected: [], remaining: items.length };
+  // Uploaded in batches to the offline sync API: one round-trip and one transaction per batch
+  for (let start = 0; start < items.length; start += SYNC_BATCH_SIZE) {
+    const batch = items.slice(start, start + SYNC_BATCH_SIZE);
+    const token = csrfToken || new URLSearchParams(batch[batch.length - 1].body).get('csrfmiddlewaretoken');
+    // Throws while still offline, which leaves the batch queued for the next sync
+    const response = await fetch(SYNC_URL, {
+      method: 'POST',
+      body: JSON.stringify({ payments: batch.map(toSyncRecord) }),
+      headers: { 'Content-Type': 'application/json', 'X-CSRFToken': token || '' },
+      credentials: 'same-origin',
+      redirect: 'manual',
+    });
+    if (!response.ok) {
+      // Logged out or stale CSRF token: keep everything until an officer page replays with a fresh token
+      await notifyClients({ ...summary, error: response.status });
+      throw new Error(`Offline payment sync failed with ${response.status}`);
+    }
+    const { results } = await response.json();
+    for (const result of results) {
+      // Applied, already paid, or rejected: settled either way, so it leaves the queue
+      await dequeuePayment(result.client_id);
+      summary.remaining -= 1;
+      if (result.status === 'rejected') {
+        summary.rejected.push({ request_id: result.request_id, error: result.error });
+      } else {
+        summary[result.status] += 1;
+      }
+    }
+  }
+  pagesDirty = true;
+  await notifyClients(summary);
+}
+
+async function postOrQueue(event) {
+  const request = event.request;
+  const body = await request.clone().text();
+  try {
+    return await fetch(request);
+  } catch (error) {
+    await enqueuePayment({
+      url: request.url,
+      body,
+      contentType: request.headers.get('Content-Type') || 'application/x-www-form-urlencoded',
+      queuedAt: Date.now(),
+    });
+    if (self.registration.sync) {
+      await self.registration.sync.register(SYNC_TAG).catch(() => {});
+    }
+    await notifyClients({ type: 'payment-queue', queued: true });
+    return new Response(
+      '<!DOCTYPE html><meta name="viewport" content="width=device-width, initial-scale=1">' +
+      '<title>Payment queued - UniPay</title>' +
+      '<div style="font-family:sans-serif;padding:2rem;max-width:32rem">' +
+      '<h2>Payment saved offline</h2>' +
+      '<p>The booth is offline. This payment was saved on this device and will be submitted ' +
+      'automatically as soon as the connection is back.</p>' +
+      '<p><a href="/officer/scan-qr/">Scan the next student</a></p></div>',
+      { status: 202, headers: { 'Content-Type': 'text/html; charset=utf-8' } }
+    );
+  }
+}
+
+self.addEventListener('sync', (event) => {
+  if (event.tag === SYNC_TAG) {
+    event.waitUntil(replayQueue());
+  }
+});
+
+self.addEventListener('message', (event) => {
+  if (event.data && event.data.type === 'replay-payments') {
+    event.waitUntil(replayQueue(event.data.csrfToken).catch(() => {}));
+  }
 });
 
-// Fetch event - Network first, fallback to cache
+// ---------------------------------------------------------------------------
+// Routing
+// ---------------------------------------------------------------------------
+
 self.addEventListener('fetch', (event) => {
-  // Skip non-GET requests
-  if (event.request.method !== 'GET') {
+  const request = event.request;
+  const url = new URL(request.url);
+  const sameOrigin = url.origin === self.location.origin;
+
+  if (request.method !== 'GET') {
+    pagesDirty = true;
+    if (request.method === 'POST' && sameOrigin && QUEUEABLE_POSTS.some((pattern) => pattern.test(url.pathname))) {
+      event.respondWith(postOrQueue(event));
+    }
     return;
   }
 
-  event.respondWith(
-    fetch(event.request)
-      .then((response) => {
-        // Clone the response
-        const cloneResponse = response.clone();
-        
-        // Cache successful responses
-        if (response.status === 200) {
-          caches.open(CACHE_NAME).then((cache) => {
-            cache.put(event.request, cloneResponse);
-          });
-        }
-        
-        return response;
-      })
-      .catch(() => {
-        // Fall back to cache
-        return caches.match(event.request).then((response) => {
-          return response || new Response('Offline - content not available', {
-            status: 503,
-            statusText: 'Service Unavailable',
-            headers: new Headers({
-              'Content-Type': 'text/plain'
-            })
-          });
-        });
-      })
-  );
+  if (precacheRevisions.has(url.href)) {
+    event.respondWith(cacheFirst(request, PRECACHE));
+    return;
+  }
+
+  if (!sameOrigin) {
+    // Fonts and unpinned CDN scripts/styles (e.g. Tailwind)
+    if (['style', 'script', 'font'].includes(request.destination)) {
+      event.respondWith(staleWhileRevalidate(event, RUNTIME_CACHE, false));
+    }
+    return;
+  }
+
+  if (url.pathname.startsWith(STATIC_PREFIX)) {
+    event.respondWith(staleWhileRevalidate(event, RUNTIME_CACHE, false));
+    return;
+  }
+
+  if (request.mode !== 'navigate') {
+    return;
+  }
+
+  if (SESSION_PAGES.some((pattern) => pattern.test(url.pathname))) {
+    event.waitUntil(caches.delete(PAGE_CACHE));
+    return;
+  }
+
+  if (!url.search && SWR_PAGES.some((pattern) => pattern.test(url.pathname))) {
+    if (pagesDirty) {
+      pagesDirty = false;
+      event.respondWith(networkFirstPage(event));
+    } else {
+      event.respondWith(staleWhileRevalidate(event, PAGE_CACHE, true));
+    }
+  }
 });